@@ -1,6 +1,11 @@
-from flask import Flask, request, jsonify
+import os
+import time
+import threading
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
@@ -14,56 +19,218 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Load SBERT model
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
-# PostgreSQL Connection
+# PostgreSQL Connection, configured from the environment: DATABASE_URL, or
+# the standard PG* variables
+DATABASE_URL = os.getenv("DATABASE_URL")
 DB_CONFIG = {
-    "dbname": "lost_found",
-    "user": "mohammads",
-    "password": "Nivya911",
-    "host": "127.0.0.1",  # ✅ Use IP instead of "localhost"
-    "port": "5432"
+    "dbname": os.getenv("PGDATABASE", "lost_found"),
+    "user": os.getenv("PGUSER", "postgres"),
+    "password": os.getenv("PGPASSWORD", ""),
+    "host": os.getenv("PGHOST", "127.0.0.1"),  # ✅ Use IP instead of "localhost"
+    "port": os.getenv("PGPORT", "5432")
 }
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_PING_SECONDS = float(os.getenv("DB_POOL_PING_SECONDS", "30"))
+
+# Connections are reused across requests instead of opened per call.
+# ThreadedConnectionPool raises when exhausted, so a semaphore makes callers wait.
+db_pool = None
+db_pool_lock = threading.Lock()
+pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+last_used = {}  # id(conn) -> time.monotonic() when it was returned
+
+def connection_is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - last_used.get(id(conn), 0) < DB_POOL_PING_SECONDS:
+        return True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def get_db_pool():
+    """The pool, opened on first use (it connects DB_POOL_MIN times) so the app imports while Postgres is down"""
+    global db_pool
+    with db_pool_lock:
+        if db_pool is None:
+            if DATABASE_URL:
+                db_pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
+            else:
+                db_pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **DB_CONFIG)
+        return db_pool
 
 # Function to connect to PostgreSQL
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    if not pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolError(f"No database connection available after {DB_POOL_TIMEOUT}s")
+    try:
+        # Replace connections the server dropped while they sat in the pool
+        pool = get_db_pool()
+        for _ in range(DB_POOL_MAX + 1):
+            conn = pool.getconn()
+            if connection_is_healthy(conn):
+                return conn
+            print("⚠️ Discarding broken database connection")
+            last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise PoolError("Could not get a healthy database connection")
+    except Exception:
+        pool_slots.release()
+        raise
+
+def release_db_connection(conn):
+    try:
+        broken = conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN
+        if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            # Never hand the next request a half-finished transaction
+            conn.rollback()
+    except psycopg2.Error:
+        broken = True
+    if broken:
+        last_used.pop(id(conn), None)
+    else:
+        last_used[id(conn)] = time.monotonic()
+    db_pool.putconn(conn, close=broken)
+    pool_slots.release()
+
+def get_request_db():
+    """The connection checked out for the current request, returned on teardown"""
+    if "db_conn" not in g:
+        g.db_conn = get_db_connection()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_request_db(exception):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        release_db_connection(conn)
+
+
+# Long-lived FAISS index over found items, keyed by found_items.id. Embeddings
+# are L2-normalized, so inner product is cosine similarity.
+DIMENSION = model.get_sentence_embedding_dimension()
+FOUND_INDEX_PATH = os.getenv("FOUND_INDEX_PATH")  # optional; saved after the first sync
+MATCH_K = 5
+index_lock = threading.Lock()
+found_index = faiss.IndexIDMap(faiss.IndexFlatIP(DIMENSION))
+found_index_max_id = 0
+# Ids in found_index; ids below the high-water mark can still appear late (another
+# worker's insert committing after a higher id), so the last
+# FOUND_INDEX_RESCAN_IDS ids are re-checked against this set on every sync
+found_index_ids = set()
+FOUND_INDEX_RESCAN_IDS = int(os.getenv("FOUND_INDEX_RESCAN_IDS", "1000"))
+# The database is first read on the first sync, so the app imports while Postgres is down
+found_index_ready = False
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def sync_found_index(cursor):
+    """Add found items missing from the index (from this or another process); call with index_lock held"""
+    global found_index_ready
+    added = add_missing_found_items(cursor)
+    if not found_index_ready:
+        # The first sync catches up with everything added since the index was saved
+        found_index_ready = True
+        print(f"✅ Found-item index ready: {found_index.ntotal} items ({added} added)")
+        if FOUND_INDEX_PATH and added:
+            faiss.write_index(found_index, FOUND_INDEX_PATH)
+    return added
+
+def add_missing_found_items(cursor):
+    global found_index_max_id
+    cursor.execute(
+        "SELECT id FROM found_items WHERE id > %s AND embedding IS NOT NULL",
+        (found_index_max_id - FOUND_INDEX_RESCAN_IDS,)
+    )
+    missing = sorted(row[0] for row in cursor.fetchall() if row[0] not in found_index_ids)
+    if not missing:
+        return 0
+
+    cursor.execute("SELECT id, embedding FROM found_items WHERE id = ANY(%s) ORDER BY id", (missing,))
+    added = 0
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        ids = []
+        vectors = []
+        for item_id, embedding in rows:
+            vector = np.frombuffer(embedding, dtype=np.float32)
+            if vector.shape[0] != DIMENSION:
+                print(f"⚠️ Skipping found item {item_id}: embedding has {vector.shape[0]} dimensions")
+                continue
+            ids.append(item_id)
+            vectors.append(vector)
+        if ids:
+            found_index.add_with_ids(normalize(vectors), np.array(ids, dtype=np.int64))
+            found_index_ids.update(ids)
+            found_index_max_id = max(found_index_max_id, ids[-1])
+            added += len(ids)
+    return added
+
+def load_found_index():
+    """Load the saved index if there is one; the first sync catches up with the database"""
+    global found_index, found_index_max_id
+    if not (FOUND_INDEX_PATH and os.path.exists(FOUND_INDEX_PATH)):
+        return
+    with index_lock:
+        try:
+            saved = faiss.read_index(FOUND_INDEX_PATH)
+        except RuntimeError as e:
+            print(f"⚠️ Ignoring unreadable found-item index {FOUND_INDEX_PATH}: {e}")
+            return
+        found_index = saved
+        found_index_ids.update(int(i) for i in faiss.vector_to_array(found_index.id_map))
+        if found_index_ids:
+            found_index_max_id = max(found_index_ids)
 
 
 @app.route('/get_notifications/<int:user_id>', methods=['GET'])
 def fetch_notifications(user_id):
     """Fetch notifications for a user."""
-    conn = get_db_connection()
+    conn = get_request_db()
     cursor = conn.cursor()
 
     cursor.execute("SELECT message, created_at FROM notifications WHERE user_id = %s ORDER BY created_at DESC LIMIT 10;", (user_id,))
     notifications = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify({"notifications": [{"message": row[0], "created_at": row[1].strftime('%Y-%m-%d %H:%M:%S')} for row in notifications]})
 
 
 # Function to add lost or found items
 def add_item(description, table):
-    """Inserts a lost or found item into the database."""
-    conn = psycopg2.connect(
-    dbname="lost_found",
-    user="mohammads",
-    password="Nivya911",
-    host="127.0.0.1",  # ✅ Ensure this is 127.0.0.1 instead of "localhost"
-    port="5432")
-
-    cursor = conn.cursor()
-    
+    """Inserts a lost or found item into the database and returns its id."""
     # Compute SBERT embedding
-    embedding = model.encode(description).astype(np.float32).tobytes()
-
-    query = f"INSERT INTO {table} (description, embedding) VALUES (%s, %s)"
-    cursor.execute(query, (description, embedding))
+    embedding = model.encode(description).astype(np.float32)
 
+    conn = get_request_db()
+    cursor = conn.cursor()
+    query = f"INSERT INTO {table} (description, embedding) VALUES (%s, %s) RETURNING id"
+    cursor.execute(query, (description, embedding.tobytes()))
+    item_id = cursor.fetchone()[0]
     conn.commit()
+
+    # New found items are searchable right away; the sync also picks up any
+    # committed by other workers meanwhile
+    if table == "found_items":
+        with index_lock:
+            sync_found_index(cursor)
     cursor.close()
-    conn.close()
+    return item_id
 
 # API Endpoint: Add Lost or Found Item
 @app.route('/add_item', methods=['POST'])
@@ -76,9 +243,9 @@ def add_lost_found_item():
         return jsonify({"error": "Invalid category. Use 'lost' or 'found'"}), 400
 
     table = "lost_items" if category == "lost" else "found_items"
-    add_item(description, table)
+    item_id = add_item(description, table)
 
-    return jsonify({"message": f"{category.capitalize()} item added successfully."})
+    return jsonify({"message": f"{category.capitalize()} item added successfully.", "id": item_id})
 
 def preprocess_text(text):
     """Simple cleaning (lowercase, stripping spaces)"""
@@ -93,72 +260,68 @@ def preprocess_text(text):
 def match_lost_item():
     data = request.json
     lost_item_description = data.get("lost_item")
+    lost_item_id = data.get("lost_item_id")
+    k = max(1, min(int(data.get("k", MATCH_K)), 50))
 
-    conn = get_db_connection()
+    conn = get_request_db()
     cursor = conn.cursor()
-    
-    # Compute lost item embedding
-    lost_embedding = model.encode(lost_item_description).astype(np.float32)
 
-    # Retrieve all found items and embeddings
-    cursor.execute("SELECT id, user_id, description, embedding FROM found_items")
-    found_items = cursor.fetchall()
+    # Prefer the id returned by /add_item over matching the description text
+    if lost_item_id is not None:
+        cursor.execute("SELECT user_id, description FROM lost_items WHERE id = %s", (lost_item_id,))
+    else:
+        cursor.execute("SELECT user_id, description FROM lost_items WHERE description = %s LIMIT 1", (lost_item_description,))
+    lost_item = cursor.fetchone()
+    if lost_item and not lost_item_description:
+        lost_item_description = lost_item[1]
+    if not lost_item_description:
+        cursor.close()
+        return jsonify({"error": "lost_item or lost_item_id is required"}), 400
 
-    if not found_items:
+    # Compute lost item embedding
+    lost_embedding = normalize(model.encode(lost_item_description))
+
+    # Search the long-lived index, after picking up items added elsewhere
+    with index_lock:
+        sync_found_index(cursor)
+        if found_index.ntotal == 0:
+            cursor.close()
+            return jsonify({"message": "No found items available."})
+        scores, ids = found_index.search(lost_embedding, min(k, found_index.ntotal))
+
+    hits = [(int(item_id), float(score)) for item_id, score in zip(ids[0], scores[0]) if item_id != -1]
+    cursor.execute("SELECT id, user_id, description FROM found_items WHERE id = ANY(%s)", ([i for i, _ in hits],))
+    found_items = {row[0]: row for row in cursor.fetchall()}
+    matches = [
+        {"id": item_id, "user_id": found_items[item_id][1], "description": found_items[item_id][2], "similarity_score": score}
+        for item_id, score in hits if item_id in found_items
+    ]
+    if not matches:
+        cursor.close()
         return jsonify({"message": "No found items available."})
 
-    found_descriptions = []
-    found_embeddings = []
-    found_users = []
-    found_item_ids = []
+    best = matches[0]
+    if lost_item:
+        lost_user_id = lost_item[0]
 
-    for item in found_items:
-        found_item_ids.append(item[0])
-        found_users.append(item[1])  # Found user's ID
-        found_descriptions.append(item[2])
-        found_embeddings.append(np.frombuffer(item[3], dtype=np.float32))
-
-    found_embeddings_np = np.array(found_embeddings)
-
-    if lost_embedding.shape[0] != found_embeddings_np.shape[1]:
-        return jsonify({"error": f"Mismatch: lost={lost_embedding.shape}, stored={found_embeddings_np.shape}"})
-
-    # FAISS similarity search
-    dimension = found_embeddings_np.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(found_embeddings_np)
-
-    D, I = index.search(np.array([lost_embedding]), k=1)
-    best_match_index = I[0][0]
-    best_match = found_descriptions[best_match_index]
-    best_match_user = found_users[best_match_index]
-    similarity_score = float(1 - D[0][0])
-
-    # Fetch the user ID who posted the lost item
-    cursor.execute("SELECT user_id FROM lost_items WHERE description = %s", (lost_item_description,))
-    lost_user = cursor.fetchone()
-
-    if lost_user:
-        lost_user_id = lost_user[0]
-
-        print(f"🔍 Debug: lost_user_id = {lost_user_id}, found_user_id = {best_match_user}")
+        print(f"🔍 Debug: lost_user_id = {lost_user_id}, found_user_id = {best['user_id']}")
 
         # Notifications for both users
-        lost_user_msg = f"🔔 A match found for your lost item: {lost_item_description} → {best_match}"
-        found_user_msg = f"🔔 We found a match for your found item: {best_match} → {lost_item_description}"
+        lost_user_msg = f"🔔 A match found for your lost item: {lost_item_description} → {best['description']}"
+        found_user_msg = f"🔔 We found a match for your found item: {best['description']} → {lost_item_description}"
 
         # Insert notifications into the database
         cursor.execute("INSERT INTO notifications (user_id, message) VALUES (%s, %s)", (lost_user_id, lost_user_msg))
-        cursor.execute("INSERT INTO notifications (user_id, message) VALUES (%s, %s)", (best_match_user, found_user_msg))
+        cursor.execute("INSERT INTO notifications (user_id, message) VALUES (%s, %s)", (best["user_id"], found_user_msg))
         conn.commit()
 
     cursor.close()
-    conn.close()
 
     return jsonify({
         "lost_item": lost_item_description,
-        "best_match": best_match,
-        "similarity_score": similarity_score
+        "best_match": best["description"],
+        "similarity_score": best["similarity_score"],
+        "matches": matches
     })
 
 
@@ -167,7 +330,7 @@ def match_lost_item():
 @app.route('/get_notifications/<int:user_id>', methods=['GET'])
 def get_notifications(user_id):
     """Fetches the latest notifications for a given user."""
-    conn = get_db_connection()
+    conn = get_request_db()
     cursor = conn.cursor()
 
     cursor.execute(
@@ -175,9 +338,8 @@ def get_notifications(user_id):
         (user_id,)
     )
     notifications = cursor.fetchall()
-    
+        
     cursor.close()
-    conn.close()
 
     # ✅ Explicitly set CORS headers
     response = jsonify({
@@ -192,6 +354,21 @@ def get_notifications(user_id):
     return response
 
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness plus a database round trip through the pool."""
+    try:
+        cursor = get_request_db().cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except (psycopg2.Error, PoolError) as e:
+        return jsonify({"status": "error", "database": str(e)}), 503
+    return jsonify({"status": "ok", "pool_max": DB_POOL_MAX, "found_index_items": found_index.ntotal})
+
+
+# Load the saved found-item index once per process; no database access at import
+load_found_index()
+
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -4,11 +4,11 @@ from database import get_db
 from models.user import User
 from models.post import Post
 from models.comment import Comment
+from utils.user_cache import invalidate_user
+from utils.embedding_store import invalidate_post_embedding
+from utils.admin_auth import create_admin_token, verify_admin_token
 from typing import List, Optional, Dict
 import logging
-from datetime import datetime, timedelta
-import jwt
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -22,34 +22,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api")
-security = HTTPBearer()
-
-# JWT settings
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
 
 # Request models
 class AdminLoginRequest(BaseModel):
     username: str
     password: str
 
-def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        is_admin = payload.get("is_admin", False)
-        if not is_admin:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized as admin"
-            )
-        return payload
-    except jwt.JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication token"
-        )
-
 @router.get("/admin/setup-admin")
 def setup_admin(db: Session = Depends(get_db)):
     """Create initial admin user if none exists"""
@@ -96,12 +74,7 @@ async def admin_login(request: AdminLoginRequest, db: Session = Depends(get_db))
         )
     
     # Generate token
-    token_data = {
-        "sub": admin.username,
-        "is_admin": True,
-        "exp": datetime.utcnow() + timedelta(days=1)
-    }
-    token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+    token = create_admin_token(admin.username)
     logger.info(f"Admin login successful for username: {request.username}")
     
     return {"token": token}
@@ -147,6 +120,10 @@ def delete_item(
                 detail=f"{item_type} with id {item_id} not found"
             )
 
+        if item_type == "users":
+            invalidate_user(item)
+        elif item_type == "posts":
+            invalidate_post_embedding(item.id)
         db.delete(item)
         db.commit()
         return {"message": f"{item_type} deleted successfully"}
@@ -170,6 +147,7 @@ async def delete_user_by_email(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        invalidate_user(user)
         db.delete(user)
         db.commit()
         return {"message": "User deleted successfully"}
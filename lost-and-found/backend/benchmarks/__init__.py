@@ -0,0 +1,4 @@
+import os
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_MANIFEST = os.path.join(RESULTS_DIR, "seed-manifest.json")
@@ -0,0 +1,82 @@
+"""
+Compare two benchmarks.run reports and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/<baseline>.json benchmarks/results/<candidate>.json --threshold 10
+
+Runs are matched by scenario and concurrency, routes by name. A route regresses
+when its p95 latency grows, or a run's throughput drops, by more than
+--threshold percent; the exit status is 1 if anything regressed, so this can
+gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def change(old: float, new: float) -> float:
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    base_runs = {(r["scenario"], r["concurrency"]): r for r in baseline["runs"]}
+    rows = []
+    regressions = []
+    for run in candidate["runs"]:
+        key = (run["scenario"], run["concurrency"])
+        base = base_runs.get(key)
+        if base is None:
+            continue
+        label = f"{run['scenario']} c={run['concurrency']}"
+
+        delta = change(base["throughput_rps"], run["throughput_rps"])
+        rows.append((label, "throughput (req/s)", base["throughput_rps"], run["throughput_rps"], delta))
+        if delta < -threshold:
+            regressions.append(f"{label}: throughput {delta:+.1f}%")
+
+        for route, stats in run["routes"].items():
+            base_stats = base["routes"].get(route)
+            if base_stats is None:
+                continue
+            delta = change(base_stats["p95_ms"], stats["p95_ms"])
+            rows.append((label, f"{route} p95 (ms)", base_stats["p95_ms"], stats["p95_ms"], delta))
+            if delta > threshold:
+                regressions.append(f"{label}: {route} p95 {delta:+.1f}%")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    print(f"baseline  {baseline['label']} @ {baseline['git_revision']}  ({baseline['created_at']})")
+    print(f"candidate {candidate['label']} @ {candidate['git_revision']}  ({candidate['created_at']})")
+    if baseline.get("seed_scale") != candidate.get("seed_scale"):
+        print("warning: the two runs used different seed scales")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    width = max((len(r[1]) for r in rows), default=10)
+    for label, metric, old, new, delta in rows:
+        print(f"{label:<16} {metric:<{width}} {old:>10} -> {new:>10}  {delta:+7.1f}%")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
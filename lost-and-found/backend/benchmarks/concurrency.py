@@ -0,0 +1,121 @@
+"""
+Concurrent load test for the read-heavy API routes.
+
+Runs N concurrent clients against a running backend for a fixed duration and
+reports throughput and latency percentiles per route. To compare the sync and
+async database layers, start a single uvicorn worker on each revision and run
+the same command against both:
+
+    uvicorn main:app --workers 1 --port 8000
+    python -m benchmarks.concurrency --base-url http://localhost:8000 \
+        --concurrency 50 --duration 30 --user-id 1 --firebase-uid <uid> --email <email>
+
+With the sync session every query blocks the event loop, so throughput stays
+flat as --concurrency grows; with the async session it should scale with the
+time requests spend waiting on the database.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import defaultdict
+import httpx
+
+
+def build_routes(args):
+    routes = ["/api/posts/", "/api/posts/search?q=bag", "/api/posts/filter?type=lost"]
+    if args.firebase_uid:
+        routes.append(f"/api/notifications/user/{args.firebase_uid}")
+    if args.email:
+        routes.append(f"/api/users/email/{args.email}")
+    if args.user_id:
+        routes.append(f"/api/messages/conversations/{args.user_id}")
+    return routes
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client_loop(client, routes, deadline, latencies, errors, offset):
+    i = offset
+    while time.perf_counter() < deadline:
+        route = routes[i % len(routes)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(route)
+            if response.status_code >= 400:
+                errors[route] += 1
+        except httpx.HTTPError:
+            errors[route] += 1
+        latencies[route].append((time.perf_counter() - start) * 1000)
+
+
+async def run(args):
+    routes = build_routes(args)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        # Warm caches and connection pools before measuring
+        for route in routes:
+            await client.get(route)
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            client_loop(client, routes, deadline, latencies, errors, n)
+            for n in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    report = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "routes": {
+            route: {
+                "requests": len(values),
+                "errors": errors[route],
+                "mean_ms": round(statistics.mean(values), 2) if values else 0.0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+            for route, values in latencies.items()
+        }
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--firebase-uid")
+    parser.add_argument("--email")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
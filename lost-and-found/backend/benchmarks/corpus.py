@@ -0,0 +1,28 @@
+"""Vocabulary for synthetic lost/found posts, shared by the seeder and the matching benchmark"""
+import random
+from datetime import datetime, timedelta, timezone
+
+ITEMS = [
+    "wallet", "keys", "backpack", "phone", "umbrella", "water bottle", "laptop",
+    "student id card", "headphones", "jacket", "calculator", "glasses", "charger", "notebook"
+]
+COLORS = ["black", "blue", "red", "green", "grey", "white", "brown", "pink", "silver"]
+BRANDS = ["Apple", "Samsung", "Nike", "JanSport", "Hydro Flask", "Sony", "North Face", "TI", "Anker"]
+LOCATIONS = [
+    "Albin O. Kuhn Library", "The Commons", "ITE Building", "Engineering Building",
+    "Retriever Activities Center", "Sherman Hall", "Math & Psychology Building",
+    "Fine Arts Building", "Performing Arts and Humanities Building", "University Center",
+    "Sondheim Hall", "Public Policy Building", "Biological Sciences Building", "True Grit's"
+]
+EASTERN = timezone(timedelta(hours=-5))
+BASE_TIME = datetime(2025, 1, 6, 8, 0, tzinfo=EASTERN)
+
+
+def post_text(rng: random.Random):
+    item = rng.choice(ITEMS)
+    color = rng.choice(COLORS)
+    brand = rng.choice(BRANDS)
+    location = rng.choice(LOCATIONS)
+    description = f"{color.capitalize()} {brand} {item}, last seen near the {location}. " \
+                  f"{rng.choice(['Has a sticker on it.', 'Slightly scratched.', 'In a small case.', 'Name written inside.', ''])}"
+    return f"{color} {item}", description.strip(), location
@@ -0,0 +1,299 @@
+"""
+Offline speed and quality benchmark for the post matchers.
+
+Builds corpora of the labelled lost/found pairs in benchmarks/fixtures/
+matching_pairs.json padded with synthetic distractor posts, then runs every
+labelled post as a query through find_matching_posts of each matcher with an
+in-memory fake session (no database or network needed; the SBERT model must
+be available locally). From the backend directory:
+
+    python -m benchmarks.matching --sizes 100 1000 5000 --matcher inmemory db --label baseline
+    python -m benchmarks.matching --sizes 10000 100000 --matcher inmemory hnsw ivf --ivf-nprobe 16
+
+Reported per matcher and corpus size:
+  - query latency (first "cold" query, then p50/p95 of the rest) and queries/s
+  - recall@k and MRR of the labelled counterpart in the full ranking
+  - precision/recall of what each threshold would return (0.7 is production)
+  - bytes held by the embedding cache
+  - for the ANN matchers (hnsw, ivf), the share of the exact top-10 they return
+plus single-text and batched embedding throughput. Results are stored under
+benchmarks/results/ like the load-test reports.
+"""
+import os
+import tempfile
+
+# Keep the harness offline: importing the matchers pulls in the database module
+os.environ["DATABASE_URL"] = "sqlite://"
+# Never load or overwrite the server's saved ANN indexes
+os.environ["MATCHING_INDEX_DIR"] = tempfile.mkdtemp(prefix="ann-bench-")
+# Rank by text alone; the fixtures carry no dates (MATCH_RERANK=1 measures the re-ranked order)
+os.environ.setdefault("MATCH_RERANK", "0")
+
+import argparse
+import importlib
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy.sql import operators
+from benchmarks import RESULTS_DIR
+from benchmarks.concurrency import percentile
+from benchmarks.corpus import post_text
+from benchmarks.run import git_revision
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "matching_pairs.json")
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8)
+RECALL_AT = (1, 3, 5, 10)
+# Scores below any real threshold; asks the matcher for its full ranking
+FULL_RANKING = -1.0
+
+
+class FakeQuery:
+    def __init__(self, posts):
+        self.posts = posts
+
+    def filter(self, *conditions):
+        posts = self.posts
+        for condition in conditions:
+            # Only simple `Post.column <op> value` filters are used by the matchers
+            column, value, op = condition.left.key, condition.right.value, condition.operator
+            if op is operators.in_op:
+                posts = [p for p in posts if getattr(p, column) in value]
+            else:
+                posts = [p for p in posts if op(getattr(p, column), value)]
+        return FakeQuery(posts)
+
+    def all(self):
+        return list(self.posts)
+
+
+class FakeSession:
+    def __init__(self, posts):
+        self.posts = posts
+
+    def query(self, model):
+        return FakeQuery(self.posts)
+
+
+def make_post(post_id, report_type, item_name, description, location):
+    return SimpleNamespace(
+        id=post_id, report_type=report_type, item_name=item_name, description=description,
+        location=location, date=None, time=None, image_path=None, user_id=1, embedding=None
+    )
+
+
+def build_corpus(pairs, size, rng):
+    """Labelled pairs first, then distractors; returns (posts, {query id: expected id})"""
+    posts = []
+    expected = {}
+    for pair in pairs:
+        lost = make_post(len(posts) + 1, "lost", **pair["lost"])
+        found = make_post(len(posts) + 2, "found", **pair["found"])
+        posts.extend([lost, found])
+        expected[lost.id] = found.id
+        expected[found.id] = lost.id
+    while len(posts) < size:
+        item_name, description, location = post_text(rng)
+        posts.append(make_post(len(posts) + 1, rng.choice(["lost", "found"]), item_name, description, location))
+    return posts, expected
+
+
+class InMemoryMatcher:
+    """utils/ai_matching_inmemory.py: embeddings computed lazily into a process cache"""
+    name = "inmemory"
+    module_name = "utils.ai_matching_inmemory"
+    kind = "exact"
+
+    def __init__(self, module):
+        self.module = module
+
+    def prepare(self, posts):
+        self.module.embedding_cache.clear()
+        self.module.MATCHING_INDEX = self.kind
+
+    def cache_bytes(self, posts):
+        return self.module.embedding_cache.nbytes
+
+
+class AnnMatcher(InMemoryMatcher):
+    """utils/ai_matching_inmemory.py with MATCHING_INDEX set; prepare builds the index"""
+
+    def prepare(self, posts):
+        super().prepare(posts)
+        self.module.post_indexes.clear()
+        session = FakeSession(posts)
+        for report_type in ("lost", "found"):
+            self.module.synced_index(session, report_type, self.module.model.get_sentence_embedding_dimension())
+
+    def cache_bytes(self, posts):
+        return super().cache_bytes(posts) + sum(index.nbytes for index in self.module.post_indexes.values())
+
+
+class HnswMatcher(AnnMatcher):
+    name = kind = "hnsw"
+
+
+class IvfMatcher(AnnMatcher):
+    name = kind = "ivf"
+
+
+class StoredEmbeddingMatcher:
+    """utils/ai_matching.py: embeddings stored on each post as float32 bytes"""
+    name = "db"
+    module_name = "utils.ai_matching"
+
+    def __init__(self, module):
+        self.module = module
+
+    def prepare(self, posts):
+        for post in posts:
+            post.embedding = self.module.generate_embedding(f"{post.item_name} {post.description}")
+
+    def cache_bytes(self, posts):
+        return sum(len(p.embedding) for p in posts if p.embedding is not None)
+
+
+MATCHERS = {cls.name: cls for cls in (InMemoryMatcher, HnswMatcher, IvfMatcher, StoredEmbeddingMatcher)}
+
+
+def embedding_throughput(module, texts):
+    start = time.perf_counter()
+    for text in texts:
+        module.generate_embedding(text)
+    single = len(texts) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    module.model.encode(texts, batch_size=32)
+    batched = len(texts) / (time.perf_counter() - start)
+    return {"single_texts_per_s": round(single, 1), "batched_texts_per_s": round(batched, 1)}
+
+
+def evaluate(matcher, posts, expected, query_ids, rankings):
+    """Report for one matcher and corpus; rankings collects each query's top 10 ids"""
+    session = FakeSession(posts)
+    by_id = {p.id: p for p in posts}
+
+    start = time.perf_counter()
+    matcher.prepare(posts)
+    prepare_s = time.perf_counter() - start
+
+    latencies = []
+    ranks = []
+    scored = []  # per query: (score of expected post or None, [all returned scores])
+    for query_id in query_ids:
+        start = time.perf_counter()
+        results = matcher.module.find_matching_posts(session, by_id[query_id], FULL_RANKING)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ids = [p.id for p, _ in results]
+        rankings[query_id] = ids[:10]
+        target = expected[query_id]
+        ranks.append(ids.index(target) + 1 if target in ids else None)
+        target_score = next((float(s) for p, s in results if p.id == target), None)
+        scored.append((target_score, [float(s) for _, s in results]))
+
+    warm = latencies[1:] or latencies
+    report = {
+        "corpus_size": len(posts),
+        "queries": len(query_ids),
+        "prepare_s": round(prepare_s, 3),
+        "cold_query_ms": round(latencies[0], 2),
+        "p50_ms": round(percentile(warm, 50), 2),
+        "p95_ms": round(percentile(warm, 95), 2),
+        "mean_ms": round(statistics.mean(warm), 2),
+        "queries_per_s": round(1000 / statistics.mean(warm), 1),
+        "embedding_bytes": matcher.cache_bytes(posts),
+        "recall_at": {
+            str(k): round(sum(1 for r in ranks if r is not None and r <= k) / len(ranks), 3) for k in RECALL_AT
+        },
+        "mrr": round(sum(1 / r for r in ranks if r) / len(ranks), 3),
+        "thresholds": {}
+    }
+    for threshold in THRESHOLDS:
+        returned = sum(sum(1 for s in scores if s >= threshold) for _, scores in scored)
+        hits = sum(1 for target_score, _ in scored if target_score is not None and target_score >= threshold)
+        report["thresholds"][str(threshold)] = {
+            "avg_returned": round(returned / len(scored), 2),
+            "precision": round(hits / returned, 3) if returned else None,
+            "recall": round(hits / len(scored), 3)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matcher", nargs="+", choices=sorted(MATCHERS), default=sorted(MATCHERS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 5000])
+    parser.add_argument("--queries", type=int, default=80, help="Labelled posts used as queries")
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--label", default="matching")
+    parser.add_argument("--output")
+    parser.add_argument("--hnsw-ef-search", type=int, help="Overrides HNSW_EF_SEARCH")
+    parser.add_argument("--ivf-nprobe", type=int, help="Overrides IVF_NPROBE")
+    args = parser.parse_args()
+    # Run the exact matcher first so the ANN ones can be compared against it
+    args.matcher.sort(key=lambda name: name != "inmemory")
+    if args.hnsw_ef_search:
+        os.environ["HNSW_EF_SEARCH"] = str(args.hnsw_ef_search)
+    if args.ivf_nprobe:
+        os.environ["IVF_NPROBE"] = str(args.ivf_nprobe)
+
+    with open(args.fixture) as f:
+        pairs = json.load(f)
+
+    report = {
+        "label": args.label,
+        "created_at": datetime.utcnow().isoformat(),
+        "git_revision": git_revision(),
+        "fixture_pairs": len(pairs),
+        "index_params": {k: os.environ[k] for k in ("HNSW_EF_SEARCH", "IVF_NPROBE") if k in os.environ},
+        "matchers": {}
+    }
+    exact_rankings = {}
+    for name in args.matcher:
+        cls = MATCHERS[name]
+        start = time.perf_counter()
+        module = importlib.import_module(cls.module_name)
+        matcher = cls(module)
+        rng = random.Random(args.seed)
+        sample_texts = [" ".join(post_text(rng)[:2]) for _ in range(200)]
+        results = {
+            "model_load_s": round(time.perf_counter() - start, 2),
+            "embedding": embedding_throughput(module, sample_texts),
+            "sizes": []
+        }
+        for size in args.sizes:
+            posts, expected = build_corpus(pairs, size, random.Random(args.seed))
+            query_ids = sorted(expected)[:args.queries]
+            rankings = {}
+            result = evaluate(matcher, posts, expected, query_ids, rankings)
+            if isinstance(matcher, AnnMatcher) and size in exact_rankings:
+                exact = exact_rankings[size]
+                result["exact_top10_recall"] = round(statistics.mean(
+                    len(set(rankings[q]) & set(exact[q])) / len(exact[q]) for q in query_ids if exact[q]
+                ), 3)
+            elif name == "inmemory":
+                exact_rankings[size] = rankings
+            results["sizes"].append(result)
+            at_07 = result["thresholds"]["0.7"]
+            print(f"{name:>8} n={result['corpus_size']:<6} cold {result['cold_query_ms']:>9}ms  "
+                  f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  "
+                  f"R@1 {result['recall_at']['1']:<5} R@5 {result['recall_at']['5']:<5} "
+                  f"@0.7 P {at_07['precision']} R {at_07['recall']}  "
+                  f"cache {result['embedding_bytes'] / 1024:.0f}KiB"
+                  + (f"  vs exact {result['exact_top10_recall']}" if "exact_top10_recall" in result else ""))
+        report["matchers"][name] = results
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{args.label}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Time the tiled lost x found scoring used by jobs.rematch on random unit
+vectors (no model or database needed). From the backend directory:
+
+    python -m benchmarks.rematch --lost 50000 --found 50000 --tile-size 1024 2048 4096
+
+Reports seconds and million pairs scored per second for each tile size.
+"""
+import argparse
+import time
+import numpy as np
+from utils.matrix_matching import best_matches
+
+
+def random_unit_vectors(rng, count, dim):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lost", type=int, default=50000)
+    parser.add_argument("--found", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--per-post", type=int, default=3)
+    parser.add_argument("--tile-size", type=int, nargs="+", default=[2048])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    lost = random_unit_vectors(rng, args.lost, args.dim)
+    found = random_unit_vectors(rng, args.found, args.dim)
+    # Offset the ids so lost and found never share one
+    lost_ids = np.arange(args.lost)
+    found_ids = np.arange(args.found) + args.lost
+
+    for tile_size in args.tile_size:
+        start = time.perf_counter()
+        # Random vectors are nearly orthogonal; a low threshold keeps every row's top k
+        best_matches(lost_ids, lost, found_ids, found, k=args.per_post, threshold=-1.0, tile_size=tile_size)
+        elapsed = time.perf_counter() - start
+        pairs = args.lost * args.found
+        print(f"{args.lost} x {args.found} tile {tile_size:>5}: {elapsed:7.1f}s  {pairs / elapsed / 1e6:8.1f}M pairs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Drive the real API routes with concurrent clients and store the results.
+
+Seed first (see benchmarks.seed), start the API against the seeded stores,
+then from the backend directory:
+
+    python -m benchmarks.run --scenario read mixed --concurrency 1 10 50 --duration 30 --label baseline
+
+Every scenario/concurrency pair is run in turn; the report (throughput, error
+counts and latency percentiles per route, plus the git revision) is written to
+benchmarks/results/<timestamp>-<label>.json. Compare two reports with
+benchmarks.compare. Client randomness is seeded, so runs issue the same
+request sequence per client.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+import httpx
+from benchmarks import RESULTS_DIR, DEFAULT_MANIFEST
+from benchmarks.concurrency import percentile
+from benchmarks.scenarios import SCENARIOS, pick
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def client_loop(client, scenario, manifest, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        spec = pick(rng, scenario, manifest)
+        start = time.perf_counter()
+        try:
+            response = await client.request(spec.method, spec.url, **spec.kwargs)
+            if response.status_code >= 400:
+                errors[spec.route] += 1
+        except httpx.HTTPError:
+            errors[spec.route] += 1
+        latencies[spec.route].append((time.perf_counter() - start) * 1000)
+
+
+def summarize(values, error_count):
+    return {
+        "requests": len(values),
+        "errors": error_count,
+        "mean_ms": round(statistics.mean(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(max(values), 2) if values else 0.0,
+    }
+
+
+async def run_one(args, manifest, scenario_name, concurrency):
+    scenario = SCENARIOS[scenario_name]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        # Warm-up: fill caches and connection pools, discarded from the results
+        warmup_deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(
+            client_loop(client, scenario, manifest, warmup_deadline, defaultdict(list), defaultdict(int), -n - 1)
+            for n in range(concurrency)
+        ))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            client_loop(client, scenario, manifest, deadline, latencies, errors, args.seed + n)
+            for n in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    all_values = [v for values in latencies.values() for v in values]
+    return {
+        "scenario": scenario_name,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(len(all_values) / elapsed, 1),
+        "overall": summarize(all_values, sum(errors.values())),
+        "routes": {route: summarize(values, errors[route]) for route, values in sorted(latencies.items())}
+    }
+
+
+async def run(args, manifest):
+    runs = []
+    for scenario_name in args.scenario:
+        for concurrency in args.concurrency:
+            result = await run_one(args, manifest, scenario_name, concurrency)
+            print(f"{scenario_name:>6} c={concurrency:<4} {result['throughput_rps']:>8} req/s  "
+                  f"p50 {result['overall']['p50_ms']}ms  p95 {result['overall']['p95_ms']}ms  "
+                  f"errors {result['overall']['errors']}")
+            runs.append(result)
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["read", "mixed"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<timestamp>-<label>.json)")
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    report = {
+        "label": args.label,
+        "created_at": datetime.utcnow().isoformat(),
+        "git_revision": git_revision(),
+        "base_url": args.base_url,
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "seed_scale": manifest.get("scale"),
+        "runs": asyncio.run(run(args, manifest))
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{args.label}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Request mixes for benchmarks.run. Each scenario is a weighted list of request
+builders that draw ids from the seed manifest; requests are grouped in the
+report by their route template, not the concrete URL.
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+
+@dataclass
+class RequestSpec:
+    route: str  # route template used as the report key
+    method: str
+    url: str
+    kwargs: dict = field(default_factory=dict)
+
+
+@dataclass
+class WeightedRequest:
+    weight: int
+    build: Callable[[random.Random, dict], RequestSpec]
+
+
+def _user(rng, manifest):
+    return rng.choice(manifest["users"])
+
+
+def _conversation(rng, manifest):
+    return rng.choice(manifest["conversations"])
+
+
+def list_posts(rng, m):
+    return RequestSpec("GET /api/posts/", "GET", "/api/posts/")
+
+
+def search_posts(rng, m):
+    return RequestSpec("GET /api/posts/search", "GET", "/api/posts/search", {"params": {"q": rng.choice(m["search_terms"])}})
+
+
+def filter_posts(rng, m):
+    return RequestSpec("GET /api/posts/filter", "GET", "/api/posts/filter", {"params": {"type": rng.choice(["lost", "found"])}})
+
+
+def create_post(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("POST /api/posts/", "POST", "/api/posts/", {"data": {
+        "report_type": rng.choice(["lost", "found"]),
+        "item_name": f"{rng.choice(['black', 'blue', 'red'])} {rng.choice(['wallet', 'umbrella', 'backpack'])}",
+        "description": "Benchmark post; left near the library entrance.",
+        "location": "Albin O. Kuhn Library",
+        "contact_details": "bench@umbc.edu",
+        "date": "2025-03-14",
+        "time": "14:30",
+        "user_id": user["firebase_uid"]
+    }})
+
+
+def conversations(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/messages/conversations/{user_id}", "GET", f"/api/messages/conversations/{user['id']}")
+
+
+def chat(rng, m):
+    a, b = _conversation(rng, m)
+    return RequestSpec("GET /api/messages/chat/{user_id}/{other_user_id}", "GET", f"/api/messages/chat/{a}/{b}")
+
+
+def recent_messages(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/messages/recent", "GET", "/api/messages/recent", {"params": {"userId": user["id"]}})
+
+
+def send_message(rng, m):
+    a, b = _conversation(rng, m)
+    sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+    return RequestSpec("POST /api/messages/create", "POST", "/api/messages/create", {"json": {
+        "message": "Is this still available?",
+        "from": sender,
+        "to": receiver,
+        "postId": rng.choice(m["post_ids"])
+    }})
+
+
+def mark_read(rng, m):
+    a, b = _conversation(rng, m)
+    return RequestSpec("POST /api/messages/mark-read", "POST", "/api/messages/mark-read",
+                       {"json": {"userId": a, "conversationId": b}})
+
+
+def user_claims(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/claims/user/{firebase_uid}", "GET", f"/api/claims/user/{user['firebase_uid']}")
+
+
+def get_claim(rng, m):
+    return RequestSpec("GET /api/claims/{claim_id}", "GET", f"/api/claims/{rng.choice(m['claim_ids'])}")
+
+
+def user_notifications(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/notifications/user/{firebase_uid}", "GET", f"/api/notifications/user/{user['firebase_uid']}")
+
+
+def unread_count(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/notifications/user/{firebase_uid}/unread-count", "GET",
+                       f"/api/notifications/user/{user['firebase_uid']}/unread-count")
+
+
+def welcome_check(rng, m):
+    user = _user(rng, m)
+    return RequestSpec("GET /api/notifications/welcome/{firebase_uid}", "GET", f"/api/notifications/welcome/{user['firebase_uid']}")
+
+
+READS = [
+    WeightedRequest(10, list_posts),
+    WeightedRequest(6, search_posts),
+    WeightedRequest(6, filter_posts),
+    WeightedRequest(6, conversations),
+    WeightedRequest(8, chat),
+    WeightedRequest(8, recent_messages),
+    WeightedRequest(3, user_claims),
+    WeightedRequest(2, get_claim),
+    WeightedRequest(6, user_notifications),
+    WeightedRequest(10, unread_count),
+    WeightedRequest(4, welcome_check),
+]
+
+WRITES = [
+    WeightedRequest(1, create_post),
+    WeightedRequest(10, send_message),
+    WeightedRequest(4, mark_read),
+]
+
+SCENARIOS: Dict[str, List[WeightedRequest]] = {
+    "read": READS,
+    "write": WRITES,
+    # Roughly what the frontend generates: mostly polling and browsing
+    "mixed": READS + [WeightedRequest(w.weight // 2 or 1, w.build) for w in WRITES],
+}
+
+
+def pick(rng: random.Random, scenario: List[WeightedRequest], manifest: dict) -> RequestSpec:
+    request = rng.choices(scenario, weights=[w.weight for w in scenario])[0]
+    return request.build(rng, manifest)
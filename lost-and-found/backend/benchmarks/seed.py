@@ -0,0 +1,263 @@
+"""
+Seed a scratch database and MongoDB with synthetic, reproducible data for the
+benchmark suite, and write a manifest the scenarios draw ids from.
+
+Point DATABASE_URL and MONGODB_URL at throwaway stores (a local SQLite file or
+Postgres database, and a local mongod), then from the backend directory:
+
+    python -m benchmarks.seed --reset --users 500 --posts 5000 --messages 50000
+
+--reset drops every table and the message collections, so against anything
+but SQLite it also needs --yes-drop <database name>, naming the database it is
+about to wipe; the same goes for a MongoDB server that is not on localhost.
+Repeat --yes-drop when both need it.
+
+Start the API with the same settings and cwd (claims live in a JSON file
+relative to it) before running benchmarks.run. Seeded claims replace those of
+earlier seed runs in that file; any other claims in it are kept. The same --seed always
+produces the same data. Post embeddings are computed by the API process
+itself, so the first matching requests of a run pay for encoding.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from pymongo import MongoClient
+from pymongo.uri_parser import parse_uri
+from sqlalchemy import select
+from benchmarks import DEFAULT_MANIFEST
+from benchmarks.corpus import ITEMS, COLORS, BASE_TIME, post_text
+from database import engine, SessionLocal, Base
+from models.user import User
+from models.post import Post
+from models.notification import Notification
+from routes.claim_routes_file import load_claims, save_claims
+from utils.conversations import conversation_key
+from utils.notifications import refresh_unread_counts
+
+INSERT_BATCH_SIZE = 1000
+# Ids and terms recorded in the manifest for the scenarios to sample from
+MANIFEST_SAMPLE_SIZE = 200
+# Ids of seeded claims; a new run replaces only these in the claims file
+BENCH_CLAIM_PREFIX = "bench-claim-"
+# MongoDB hosts whose collections --reset may drop without --yes-drop
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def insert_in_batches(db, table, rows):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.execute(table.insert(), rows[start:start + INSERT_BATCH_SIZE])
+    db.commit()
+
+
+def seed_sql(rng: random.Random, args) -> dict:
+    db = SessionLocal()
+    try:
+        insert_in_batches(db, User.__table__, [{
+            "username": f"bench_user_{i}",
+            "email": f"bench_user_{i}@umbc.edu",
+            "firebase_uid": f"bench-uid-{i}",
+            "is_admin": False
+        } for i in range(args.users)])
+        users = db.execute(
+            select(User.id, User.firebase_uid, User.email, User.username).where(User.firebase_uid.like("bench-uid-%")).order_by(User.id)
+        ).all()
+        user_ids = [u.id for u in users]
+
+        post_rows = []
+        for i in range(args.posts):
+            item_name, description, location = post_text(rng)
+            seen = BASE_TIME + timedelta(minutes=rng.randrange(0, 60 * 24 * 120))
+            post_rows.append({
+                "report_type": rng.choice(["lost", "found"]),
+                "item_name": item_name,
+                "description": description,
+                "location": location,
+                "contact_details": "bench@umbc.edu",
+                "date": seen.strftime("%Y-%m-%d"),
+                "time": seen.strftime("%H:%M"),
+                "user_id": rng.choice(user_ids),
+                "verification_questions": [{"question": "What color is it?"}]
+            })
+        insert_in_batches(db, Post.__table__, post_rows)
+        posts = db.execute(select(Post.id, Post.item_name, Post.user_id).order_by(Post.id)).all()
+
+        notification_rows = []
+        for i in range(args.notifications):
+            notification_rows.append({
+                "user_id": rng.choice(user_ids),
+                "title": "Potential match for your lost item",
+                "message": f"We found a potential match for your item '{rng.choice(ITEMS)}'.",
+                "type": rng.choice(["match_lost", "match_found", "system"]),
+                "is_read": rng.random() < 0.7,
+                "created_at": (BASE_TIME + timedelta(minutes=i)).replace(tzinfo=None),
+                "coalesced_count": 1
+            })
+        insert_in_batches(db, Notification.__table__, notification_rows)
+        for start in range(0, len(user_ids), INSERT_BATCH_SIZE):
+            db.execute(refresh_unread_counts(db.bind, user_ids[start:start + INSERT_BATCH_SIZE]))
+        db.commit()
+    finally:
+        db.close()
+
+    # The live claims route keeps claims in a JSON file; claims not made by the seeder are kept
+    claims = []
+    for i in range(args.claims):
+        post = rng.choice(posts)
+        claimant = rng.choice(users)
+        claims.append({
+            "id": f"{BENCH_CLAIM_PREFIX}{i}",
+            "post_id": post.id,
+            "user_id": claimant.id,
+            "firebase_uid": claimant.firebase_uid,
+            "contact_info": "bench@umbc.edu",
+            "answers": [{"question": "What color is it?", "answer": rng.choice(COLORS)}],
+            "status": rng.choice(["pending", "approved", "rejected"]),
+            "response_message": None,
+            "created_at": (BASE_TIME + timedelta(minutes=i)).isoformat(),
+            "updated_at": (BASE_TIME + timedelta(minutes=i)).isoformat(),
+            "post": {"id": post.id, "item_name": post.item_name, "report_type": "lost", "image_path": None,
+                     "verification_questions": [{"question": "What color is it?"}]},
+            "user": {"id": claimant.id, "username": claimant.username, "email": claimant.email}
+        })
+    save_claims([c for c in load_claims() if not str(c.get("id", "")).startswith(BENCH_CLAIM_PREFIX)] + claims)
+
+    return {
+        "users": [{"id": u.id, "firebase_uid": u.firebase_uid, "email": u.email} for u in users[:MANIFEST_SAMPLE_SIZE]],
+        "post_ids": [p.id for p in posts[:MANIFEST_SAMPLE_SIZE]],
+        "claim_ids": [c["id"] for c in claims[:MANIFEST_SAMPLE_SIZE]],
+        "usernames": {u.id: u.username for u in users}
+    }
+
+
+def is_local_mongo(url: str) -> bool:
+    if not url:
+        return True
+    # SRV records point at a cluster, never at this machine
+    if url.startswith("mongodb+srv://"):
+        return False
+    return all(host in LOCAL_HOSTS for host, _ in parse_uri(url)["nodelist"])
+
+
+def seed_mongo(rng: random.Random, args, usernames: dict, post_ids) -> list:
+    client = MongoClient(os.getenv("MONGODB_URL"))
+    try:
+        db = client.get_default_database()
+    except Exception:
+        db = client["lostfound"]
+    if args.reset:
+        db.messages.drop()
+        db.conversations.drop()
+
+    user_ids = sorted(usernames)
+    # Each user talks to a handful of partners, like real inboxes
+    pairs = set()
+    while len(pairs) < min(args.conversations, len(user_ids) * (len(user_ids) - 1) // 2):
+        a, b = rng.sample(user_ids, 2)
+        pairs.add(tuple(sorted((a, b))))
+    pairs = sorted(pairs)
+    if not pairs:
+        return []
+
+    summaries = {}
+    unread = defaultdict(lambda: defaultdict(int))
+    batch = []
+    for i in range(args.messages):
+        a, b = pairs[rng.randrange(len(pairs))]
+        sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+        key = conversation_key(sender, receiver)
+        read = rng.random() < 0.8
+        timestamp = (BASE_TIME + timedelta(seconds=i * 30)).isoformat()
+        post_id = rng.choice(post_ids) if post_ids else None
+        batch.append({
+            "content": f"Hi, is the {rng.choice(ITEMS)} still available? ({i})",
+            "sender_id": sender,
+            "sender_name": usernames[sender],
+            "receiver_id": receiver,
+            "receiver_name": usernames[receiver],
+            "post_id": post_id,
+            "conversation_key": key,
+            "timestamp": timestamp,
+            "read_status": read
+        })
+        summaries[key] = {
+            "_id": key,
+            "participants": [a, b],
+            "last_message": batch[-1]["content"],
+            "last_sender_id": sender,
+            "timestamp": timestamp,
+            "post_id": post_id,
+            "names": {str(a): usernames[a], str(b): usernames[b]}
+        }
+        if not read:
+            unread[key][str(receiver)] += 1
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.messages.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.messages.insert_many(batch, ordered=False)
+
+    docs = []
+    for key, summary in summaries.items():
+        a, b = summary["participants"]
+        summary["unread"] = {str(a): unread[key][str(a)], str(b): unread[key][str(b)]}
+        docs.append(summary)
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        db.conversations.insert_many(docs[start:start + INSERT_BATCH_SIZE], ordered=False)
+    client.close()
+    return [list(pair) for pair in pairs[:MANIFEST_SAMPLE_SIZE]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--notifications", type=int, default=10000)
+    parser.add_argument("--claims", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables and message collections first")
+    parser.add_argument("--yes-drop", metavar="DBNAME", action="append", default=[],
+                        help="Confirms --reset on a non-SQLite or non-local MongoDB database of this name")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+    if args.reset and engine.dialect.name != "sqlite" and engine.url.database not in args.yes_drop:
+        parser.error(f"--reset would drop every table in {engine.url.render_as_string(hide_password=True)}; "
+                     f"pass --yes-drop {engine.url.database} if that database is disposable")
+    if args.reset and not is_local_mongo(os.getenv("MONGODB_URL")):
+        # Read from the URL; building a client would resolve mongodb+srv:// records first
+        mongo_name = urlsplit(os.getenv("MONGODB_URL")).path.lstrip("/") or "lostfound"
+        if mongo_name not in args.yes_drop:
+            parser.error(f"--reset would drop the messages and conversations in MongoDB database {mongo_name}; "
+                         f"pass --yes-drop {mongo_name} if that database is disposable")
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+
+    sql = seed_sql(rng, args)
+    conversations = seed_mongo(rng, args, sql.pop("usernames"), sql["post_ids"])
+
+    manifest = {
+        "seed": args.seed,
+        "scale": {k: getattr(args, k) for k in ("users", "posts", "notifications", "claims", "messages", "conversations")},
+        "created_at": datetime.utcnow().isoformat(),
+        **sql,
+        "conversations": conversations,
+        "search_terms": [item.split()[-1] for item in ITEMS] + [c for c in COLORS[:4]]
+    }
+    os.makedirs(os.path.dirname(args.manifest), exist_ok=True)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Seeded {manifest['scale']} in {time.perf_counter() - started:.1f}s; manifest at {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
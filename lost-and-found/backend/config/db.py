@@ -1,27 +1,170 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
+import time
+import logging
+import threading
 from dotenv import load_dotenv
+from utils.metrics import instrument_engine
 
 load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
 
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# Single source of database settings; every engine in the process is built here
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./sql_app.db"
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    # Handle special case for Postgres URLs from Render
+    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Async pool serves request handlers; the sync pool only serves worker threads and scripts
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "3"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+class PoolStats:
+    """Checkout wait times and timeouts for one pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+pool_stats = {"sync": PoolStats(), "async": PoolStats()}
+
+
+def _timed_pool(base, stats: PoolStats):
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                waited = time.perf_counter() - start
+                stats.record(waited, timed_out=True)
+                logger.warning(f"Database pool exhausted: no connection after {waited:.1f}s")
+                raise
+            stats.record(time.perf_counter() - start)
+            return connection
+    return TimedPool
+
+
+def get_async_database_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Sync engine (psycopg2 / pysqlite)"""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(
+        url,
+        poolclass=_timed_pool(QueuePool, pool_stats["sync"]),
+        pool_size=DB_SYNC_POOL_SIZE,
+        max_overflow=DB_SYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
     )
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+
+def create_async_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Async engine (asyncpg / aiosqlite)"""
+    url = get_async_database_url(url)
+    if url.startswith("sqlite"):
+        return create_async_engine(url)
+
+    connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    if "sslmode=" in url:
+        # asyncpg doesn't understand libpq's sslmode query parameter
+        base_url, _, query = url.partition("?")
+        params = [p for p in query.split("&") if p and not p.startswith("sslmode=")]
+        url = base_url + ("?" + "&".join(params) if params else "")
+        connect_args["ssl"] = "require"
+
+    return create_async_engine(
+        url,
+        poolclass=_timed_pool(AsyncAdaptedQueuePool, pool_stats["async"]),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False so returned objects stay readable without another (awaited) load
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_status() -> dict:
+    """Snapshot of both pools: size, checked-out and overflow connections, wait times"""
+    status = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        stats = pool_stats[name]
+        entry = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        with stats.lock:
+            entry.update({
+                "checkouts": stats.checkouts,
+                "timeouts": stats.timeouts,
+                "wait_seconds_total": round(stats.wait_seconds_total, 6),
+                "wait_seconds_max": round(stats.wait_seconds_max, 6),
+            })
+        status[name] = entry
+    return status
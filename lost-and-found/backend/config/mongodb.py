@@ -1,6 +1,7 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
+from utils.metrics import MongoMetricsListener
 
 load_dotenv()
 
@@ -10,7 +11,7 @@ if not MONGODB_URL:
     raise ValueError("Missing MONGODB_URL environment variable")
 
 try:
-    client = AsyncIOMotorClient(MONGODB_URL)
+    client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[MongoMetricsListener()])
     db = client.get_default_database()
     if db is None:
         db = client["lostfound"]
@@ -25,3 +26,22 @@ posts = db.posts
 notifications = db.notifications
 comments = db.comments
 claims = db.claims
+conversations = db.conversations
+
+async def ensure_indexes():
+    """Create the indexes the message routes rely on (no-op if they already exist)"""
+    # Chat history: one range scan per conversation, newest first
+    await messages.create_index(
+        [("conversation_key", 1), ("timestamp", -1), ("_id", -1)],
+        name="conversation_history"
+    )
+    # Unread messages for a receiver (recent-messages popup)
+    await messages.create_index(
+        [("receiver_id", 1), ("read_status", 1), ("timestamp", -1)],
+        name="receiver_unread"
+    )
+    # Inbox: a user's conversation summaries, most recent first
+    await conversations.create_index(
+        [("participants", 1), ("timestamp", -1)],
+        name="inbox"
+    )
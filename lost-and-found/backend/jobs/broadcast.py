@@ -0,0 +1,90 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import select, func, literal, exists, false, true
+from database import SessionLocal
+from models.notification import Notification
+from models.post import Post
+from models.user import User
+from utils.notifications import refresh_unread_counts
+from jobs.registry import Job
+
+logger = logging.getLogger(__name__)
+
+# Users per INSERT ... SELECT; each chunk is its own short transaction
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "1000"))
+
+AUDIENCES = ("all", "ids", "post_type")
+
+
+def audience_condition(audience: str, user_ids: Optional[List[int]] = None, post_type: Optional[str] = None):
+    """WHERE clause on users selecting a broadcast audience"""
+    if audience == "all":
+        return true()
+    if audience == "ids":
+        return User.id.in_(user_ids or [])
+    if audience == "post_type":
+        return exists().where(Post.user_id == User.id, func.lower(Post.report_type) == post_type.lower())
+    raise ValueError(f"Unknown audience {audience}")
+
+
+def broadcast_notification(
+    job: Job,
+    title: str,
+    message: str,
+    notification_type: str,
+    audience: str,
+    user_ids: Optional[List[int]] = None,
+    post_type: Optional[str] = None,
+    related_post_id: Optional[int] = None,
+    chunk_size: int = BROADCAST_CHUNK_SIZE
+) -> dict:
+    """
+    Create one notification per audience member with chunked INSERT ... SELECT
+    statements, walking users by id range. Returns the recipient ids when the
+    audience is a subset, so the caller can push to just those users.
+    """
+    condition = audience_condition(audience, user_ids, post_type)
+    created_at = datetime.utcnow()
+    recipients = []
+
+    db = SessionLocal()
+    try:
+        total, low, high = db.execute(
+            select(func.count(User.id), func.min(User.id), func.max(User.id)).where(condition)
+        ).one()
+        job.set_total(total)
+        chunk_starts = range(low, high + 1, chunk_size) if total else range(0)
+        for start in chunk_starts:
+            in_chunk = condition & User.id.between(start, start + chunk_size - 1)
+            chunk_ids = db.execute(select(User.id).where(in_chunk)).scalars().all()
+            if not chunk_ids:
+                continue
+
+            db.execute(
+                Notification.__table__.insert().from_select(
+                    ["user_id", "title", "message", "type", "related_post_id", "is_read", "created_at", "coalesced_count"],
+                    select(
+                        User.id, literal(title), literal(message), literal(notification_type),
+                        literal(related_post_id), false(), literal(created_at), literal(1)
+                    ).where(User.id.in_(chunk_ids))
+                )
+            )
+            db.execute(refresh_unread_counts(db.bind, chunk_ids))
+            db.commit()
+
+            job.advance(len(chunk_ids))
+            if audience != "all":
+                recipients.extend(chunk_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    logger.info(f"Broadcast '{title}' created {job.processed} notifications")
+    result = {"recipients": job.processed, "created_at": created_at.isoformat()}
+    if audience != "all":
+        result["user_ids"] = recipients
+    return result
@@ -0,0 +1,138 @@
+"""
+Moves read notifications older than the retention window into
+notifications_archive so the hot table only holds recent and unread rows.
+
+Each batch copies up to NOTIFICATION_RETENTION_BATCH_SIZE rows and deletes
+them in the same short transaction, so no long locks are held on the table.
+Unread notifications are never archived and the unread counters are unchanged.
+
+Run once from the backend directory:
+
+    python -m jobs.notification_retention --days 90
+
+or set NOTIFICATION_RETENTION_INTERVAL_HOURS to run it from the API process.
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, true, literal
+from database import SessionLocal
+from models.notification import Notification
+from models.notification_archive import NotificationArchive
+from utils.notifications import dialect_insert
+from jobs.scheduler import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "1000"))
+# Pause between batches so the job doesn't monopolise the database
+NOTIFICATION_RETENTION_PAUSE_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_PAUSE_SECONDS", "0.05"))
+# 0 disables the in-process schedule; enable it on one worker only
+NOTIFICATION_RETENTION_INTERVAL_HOURS = float(os.getenv("NOTIFICATION_RETENTION_INTERVAL_HOURS", "0"))
+
+ARCHIVED_COLUMNS = [
+    "id", "user_id", "title", "message", "type", "related_post_id", "actor_id", "coalesced_count",
+    "created_at", "archived_at"
+]
+
+
+def archive_read_notifications(
+    days: int = NOTIFICATION_RETENTION_DAYS,
+    batch_size: int = NOTIFICATION_RETENTION_BATCH_SIZE,
+    dry_run: bool = False
+) -> dict:
+    """Archive and delete read notifications older than `days`; returns run statistics"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    started = time.perf_counter()
+    archived = 0
+    batches = 0
+    last_id = 0
+
+    db = SessionLocal()
+    try:
+        insert = dialect_insert(db.bind)
+        while True:
+            # Walk the primary key so every batch resumes where the last one stopped
+            ids = db.execute(
+                select(Notification.id)
+                .where(
+                    Notification.id > last_id,
+                    Notification.is_read == true(),
+                    Notification.created_at < cutoff
+                )
+                .order_by(Notification.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            if not dry_run:
+                archived_at = datetime.utcnow()
+                db.execute(
+                    insert(NotificationArchive).from_select(
+                        ARCHIVED_COLUMNS,
+                        select(
+                            Notification.id, Notification.user_id, Notification.title,
+                            Notification.message, Notification.type, Notification.related_post_id,
+                            Notification.actor_id, Notification.coalesced_count,
+                            Notification.created_at, literal(archived_at)
+                        ).where(Notification.id.in_(ids))
+                    ).on_conflict_do_nothing(index_elements=[NotificationArchive.id])
+                )
+                db.execute(
+                    delete(Notification)
+                    .where(Notification.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+
+            archived += len(ids)
+            batches += 1
+            if NOTIFICATION_RETENTION_PAUSE_SECONDS:
+                time.sleep(NOTIFICATION_RETENTION_PAUSE_SECONDS)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "cutoff": cutoff.isoformat(),
+        "archived": archived,
+        "batches": batches,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_second": round(archived / elapsed, 1) if elapsed else 0.0,
+        "dry_run": dry_run
+    }
+    logger.info(
+        f"Notification retention {'(dry run) ' if dry_run else ''}archived {archived} rows "
+        f"in {batches} batches, {stats['rows_per_second']} rows/s"
+    )
+    return stats
+
+
+retention_job = PeriodicJob(
+    "notification_retention",
+    archive_read_notifications,
+    NOTIFICATION_RETENTION_INTERVAL_HOURS * 3600
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=NOTIFICATION_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=NOTIFICATION_RETENTION_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Count eligible rows without moving them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(archive_read_notifications(args.days, args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple, Union
+import numpy as np
+from database import SessionLocal
+from models.post import Post
+from utils.ai_matching_inmemory import (
+    build_match_notifications, candidate_embeddings, embedding_cache, generate_embeddings
+)
+from utils.match_ranking import MATCH_RERANK, MATCH_RERANK_CANDIDATES, rerank_pairs
+from utils.matrix_matching import best_matches
+from utils.notifications import refresh_unread_counts, record_post_matches, lost_found_pair
+from utils.realtime import notification_event
+from utils.user_cache import get_user_identities
+from jobs.registry import Job
+
+logger = logging.getLogger(__name__)
+
+# Rows per embedding batch and multi-row INSERT
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+# Rows whose errors are listed in the job result; later ones are only counted
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = ("csv", "ndjson")
+TEXT_FIELDS = ("item_name", "description", "location", "contact_details", "date", "time")
+
+
+def detect_format(filename: str, content_type: str = None) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    raise ValueError("Upload a .csv or .ndjson file")
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Union[Dict[str, Any], str]]:
+    """Rows one at a time without loading the file: dicts for CSV, raw lines for NDJSON"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def count_rows(path: str, fmt: str) -> int:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+        return sum(1 for line in f if line.strip())
+
+
+def clean_row(raw: Union[Dict[str, Any], str], default_report_type: str) -> Dict[str, Any]:
+    """Post column values from one uploaded row; raises ValueError for unusable rows"""
+    row = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    values = {field: str(row.get(field) or "").strip() for field in TEXT_FIELDS}
+    if not values["item_name"]:
+        raise ValueError("item_name is required")
+    report_type = str(row.get("report_type") or default_report_type).lower().strip()
+    if report_type not in ("lost", "found"):
+        raise ValueError(f"report_type must be 'lost' or 'found', not '{report_type}'")
+    values["report_type"] = report_type
+    return values
+
+
+def insert_batch(db, rows: List[Dict[str, Any]], user_id: int) -> List[int]:
+    """
+    One multi-row INSERT on PostgreSQL, where VALUES rows are inserted, and
+    returned, in order; SQLAlchemy can't compile multi-row RETURNING for other
+    databases (SQLite), which insert row by row in the same transaction
+    """
+    table = Post.__table__
+    values = [dict(row, user_id=user_id) for row in rows]
+    if db.bind.dialect.name == "postgresql":
+        ids = db.execute(table.insert().values(values).returning(table.c.id)).scalars().all()
+    else:
+        ids = [db.execute(table.insert().values(**row)).inserted_primary_key[0] for row in values]
+    db.commit()
+    return ids
+
+
+def import_posts(
+    job: Job,
+    path: str,
+    fmt: str,
+    user_id: int,
+    default_report_type: str = "found",
+    match: bool = True,
+    threshold: float = 0.7,
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> dict:
+    """
+    Stream posts from an uploaded CSV/NDJSON file into the posts table: rows
+    are validated one at a time, embedded in batches and inserted with one
+    multi-row INSERT per batch, then the whole import is matched against the
+    opposite report type at once (see match_imported). Each batch commits on
+    its own, so a failed import keeps the rows before the failure. Deletes
+    the file when done.
+    """
+    job.set_total(count_rows(path, fmt))
+    imported: Dict[str, Tuple[List[int], List[np.ndarray]]] = {"lost": ([], []), "found": ([], [])}
+    errors = []
+    error_count = 0
+
+    db = SessionLocal()
+    try:
+        batch = []
+
+        def flush():
+            ids = insert_batch(db, batch, user_id)
+            embeddings = generate_embeddings([f"{row['item_name']} {row['description']}" for row in batch])
+            if embeddings is not None:
+                embedding_cache.put_many(ids, embeddings)
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                norms[norms == 0] = 1
+                for row, post_id, vector in zip(batch, ids, embeddings / norms):
+                    imported[row["report_type"]][0].append(post_id)
+                    imported[row["report_type"]][1].append(vector)
+            job.advance(len(batch))
+            batch.clear()
+
+        for row_number, raw in enumerate(read_rows(path, fmt), start=1):
+            try:
+                batch.append(clean_row(raw, default_report_type))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_number, "error": str(e)})
+                job.advance(1)
+                continue
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        created = sum(len(ids) for ids, _ in imported.values())
+        logger.info(f"Imported {created} posts ({error_count} rows rejected)")
+        result = {"imported": created, "rejected": error_count, "errors": errors, "matches": 0, "events": []}
+        if match:
+            result.update(match_imported(db, imported, threshold))
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def match_imported(db, imported: Dict[str, Tuple[List[int], List[np.ndarray]]], threshold: float) -> dict:
+    """
+    Best match per imported post, scored as tiles of (imported x opposite type)
+    matrix products and, with MATCH_RERANK, re-scored with location and time;
+    and the match notifications for both owners in one transaction
+    """
+    pairs = {}
+    columns = (Post.id, Post.report_type, Post.item_name, Post.description, Post.location, Post.date, Post.time)
+    for report_type, (ids, vectors) in imported.items():
+        if not ids:
+            continue
+        search_type = "found" if report_type == "lost" else "lost"
+        candidates = db.query(*columns).filter(Post.report_type == search_type).all()
+        candidate_ids, candidate_vectors = candidate_embeddings(candidates)
+        matches = best_matches(ids, np.vstack(vectors), candidate_ids, candidate_vectors,
+                               k=MATCH_RERANK_CANDIDATES if MATCH_RERANK else 1, threshold=threshold)
+        best = [(post_id, matched_id, score) for post_id, found in matches.items() for matched_id, score in found]
+        if MATCH_RERANK and best:
+            rows = {row.id: row for row in candidates}
+            query_ids = list(matches)
+            for start in range(0, len(query_ids), 500):
+                rows.update((row.id, row) for row in db.query(*columns).filter(Post.id.in_(query_ids[start:start + 500])))
+            best = rerank_pairs(best, rows)
+        for post_id, matched_id, score in best:
+            # An imported lost and found pair would otherwise be notified twice
+            key = frozenset((post_id, matched_id))
+            if key not in pairs or pairs[key][2] < score:
+                pairs[key] = (post_id, matched_id, score)
+    if not pairs:
+        return {"matches": 0, "events": []}
+
+    post_ids = list({post_id for pair in pairs.values() for post_id in pair[:2]})
+    posts = {}
+    for start in range(0, len(post_ids), 500):
+        for post in db.query(Post).filter(Post.id.in_(post_ids[start:start + 500])).all():
+            posts[post.id] = post
+    users = get_user_identities(db, {post.user_id for post in posts.values()})
+
+    notifications = []
+    notified = []
+    created_at = datetime.utcnow()
+    for post_id, matched_id, score in pairs.values():
+        post, matched = posts.get(post_id), posts.get(matched_id)
+        if post is None or matched is None or post.user_id not in users or matched.user_id not in users:
+            continue
+        for notification in build_match_notifications(post, matched, score, post.user_id, matched.user_id):
+            notification.created_at = created_at
+            notifications.append(notification)
+        notified.append((*lost_found_pair(post, matched), score))
+    if not notifications:
+        return {"matches": len(pairs), "events": []}
+
+    db.add_all(notifications)
+    db.flush()
+    db.execute(refresh_unread_counts(db.bind, list({n.user_id for n in notifications})))
+    for stmt in record_post_matches(db.bind, notified):
+        db.execute(stmt)
+    events = [(n.user_id, notification_event(n)) for n in notifications]
+    db.commit()
+    logger.info(f"Import matching found {len(pairs)} matches, created {len(notifications)} notifications")
+    return {"matches": len(pairs), "events": events}
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are forgotten oldest-first beyond this many
+MAX_TRACKED_JOBS = 200
+# Progress of a running job is written to background_jobs at most this often
+JOB_SAVE_SECONDS = float(os.getenv("JOB_SAVE_SECONDS", "2"))
+
+STORED_FIELDS = ("kind", "params", "status", "total", "processed", "result", "error",
+                 "created_at", "started_at", "finished_at")
+
+
+class Job:
+    """Progress of one background job; updated from worker threads, read by status endpoints"""
+
+    def __init__(self, kind: str, params: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = "pending"
+        self.total: Optional[int] = None
+        self.processed = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    @classmethod
+    def from_record(cls, record: BackgroundJob) -> "Job":
+        job = cls(record.kind, record.params)
+        job.id = record.id
+        for field in STORED_FIELDS:
+            setattr(job, field, getattr(record, field))
+        return job
+
+    def set_total(self, total: int) -> None:
+        with self._lock:
+            self.total = total
+        self.save()
+
+    def advance(self, count: int) -> None:
+        with self._lock:
+            self.processed += count
+            due = time.monotonic() - self._saved_at >= JOB_SAVE_SECONDS
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        """Write the job's state to background_jobs; blocking, so call it off the event loop"""
+        with self._lock:
+            self._saved_at = time.monotonic()
+            values = {field: getattr(self, field) for field in STORED_FIELDS}
+        values["result"] = jsonable_encoder(values["result"])
+        db = SessionLocal()
+        try:
+            db.merge(BackgroundJob(id=self.id, **values))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving job {self.kind} {self.id}: {str(e)}")
+        finally:
+            db.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = None
+            if self.started_at:
+                elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "params": self.params,
+                "status": self.status,
+                "total": self.total,
+                "processed": self.processed,
+                "progress": round(self.processed / self.total, 4) if self.total else None,
+                "rows_per_second": round(self.processed / elapsed, 1) if elapsed else None,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None
+            }
+
+
+class JobRegistry:
+    """
+    Registry of background jobs, so long-running work can report progress.
+    Jobs run in the worker that started them; their state is also saved to
+    background_jobs, so lookup() answers on every worker.
+    """
+
+    def __init__(self, max_jobs: int = MAX_TRACKED_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks = set()
+
+    def create(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        job = Job(kind, params)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ("pending", "running"):
+                break
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job started by this worker"""
+        return self._jobs.get(job_id)
+
+    async def lookup(self, job_id: str) -> Optional[Job]:
+        """A job started by any worker; others' jobs are read from their last saved state"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await run_in_threadpool(self._load, job_id)
+
+    @staticmethod
+    def _load(job_id: str) -> Optional[Job]:
+        db = SessionLocal()
+        try:
+            record = db.get(BackgroundJob, job_id)
+            return Job.from_record(record) if record is not None else None
+        finally:
+            db.close()
+
+    def start(self, job: Job, func: Callable[..., Any], *args, on_done: Callable = None, **kwargs) -> None:
+        """
+        Run a blocking `func(job, *args, **kwargs)` in the threadpool. Its return
+        value becomes the job result; `on_done(job)` is awaited afterwards when given.
+        """
+        task = asyncio.create_task(self._run(job, func, args, kwargs, on_done))
+        # Keep a reference so the task isn't garbage collected mid-run
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: Job, func, args, kwargs, on_done) -> None:
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        await run_in_threadpool(job.save)
+        try:
+            job.result = await run_in_threadpool(func, job, *args, **kwargs)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Job {job.kind} {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+        if on_done is not None and job.status == "completed":
+            try:
+                await on_done(job)
+            except Exception as e:
+                logger.error(f"Job {job.kind} {job.id} completion hook failed: {str(e)}")
+        # After the hook, which takes what it needs out of the result
+        await run_in_threadpool(job.save)
+
+
+job_registry = JobRegistry()
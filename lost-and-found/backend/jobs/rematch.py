@@ -0,0 +1,177 @@
+"""
+Re-evaluates every lost/found pair, e.g. after the matching threshold, model
+or text preprocessing changed, and notifies the owners of pairs that now
+match but were never notified (tracked in post_matches). With MATCH_RERANK
+the best text matches are re-scored with location and time first.
+
+All lost and found embeddings are loaded (encoding any missing ones in
+batches), lost x found similarity is computed as matrix products over
+MATRIX_TILE_SIZE x MATRIX_TILE_SIZE tiles so memory stays bounded, and the
+new pairs are written in chunks of REMATCH_NOTIFY_BATCH_SIZE, each with its
+notifications, post_matches rows and unread counters in one transaction.
+
+Every post's embedding is needed, so the private embedding cache is first
+raised to hold the whole corpus (about 1.5 KB per post at 384 float32
+dimensions, e.g. 150 MB for 50k lost and 50k found posts); a cache smaller
+than that would evict embeddings while they load and re-encode the corpus on
+every run. The raised cap stays for the life of the process, so later runs
+and live matching find the embeddings cached. On large deployments set
+EMBEDDING_SHARED_PATH instead: the shared matrix has no cap and keeps
+embeddings across restarts and command-line runs.
+
+Run from the backend directory:
+
+    python -m jobs.rematch --threshold 0.7 --per-post 3 --dry-run
+
+or start it from the admin API (POST /api/admin/rematch).
+"""
+import argparse
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from database import SessionLocal
+from models.post import Post
+from models.post_match import PostMatch
+from utils.ai_matching_inmemory import build_match_notifications, candidate_embeddings, embedding_cache, model
+from utils.match_ranking import MATCH_RERANK, MATCH_RERANK_CANDIDATES, rerank_pairs
+from utils.matrix_matching import best_matches
+from utils.notifications import refresh_unread_counts, record_post_matches
+from utils.realtime import notification_event
+from utils.user_cache import get_user_identities
+from jobs.registry import Job
+
+logger = logging.getLogger(__name__)
+
+REMATCH_THRESHOLD = float(os.getenv("REMATCH_THRESHOLD", "0.7"))
+# New matches notified per lost post and run; the best ones first
+REMATCH_PER_POST = int(os.getenv("REMATCH_PER_POST", "3"))
+REMATCH_NOTIFY_BATCH_SIZE = int(os.getenv("REMATCH_NOTIFY_BATCH_SIZE", "500"))
+
+
+def notified_pairs(db) -> Dict[int, Set[int]]:
+    """lost post id -> found post ids already notified"""
+    pairs = defaultdict(set)
+    for lost_id, found_id in db.query(PostMatch.lost_post_id, PostMatch.found_post_id).yield_per(10000):
+        pairs[lost_id].add(found_id)
+    return pairs
+
+
+def find_new_matches(
+    db,
+    threshold: float,
+    per_post: int,
+    job: Optional[Job] = None
+) -> List[Tuple[int, int, float]]:
+    """(lost id, found id, score) pairs at or above threshold that were never notified, best first"""
+    started = time.perf_counter()
+    columns = (Post.id, Post.report_type, Post.item_name, Post.description, Post.location, Post.date, Post.time)
+    lost = db.query(*columns).filter(Post.report_type == "lost").all()
+    found = db.query(*columns).filter(Post.report_type == "found").all()
+    if model is not None:
+        embedding_cache.ensure_capacity(len(lost) + len(found), model.get_sentence_embedding_dimension())
+    lost_ids, lost_vectors = candidate_embeddings(lost)
+    found_ids, found_vectors = candidate_embeddings(found)
+    logger.info(f"Loaded {len(lost_ids)} lost and {len(found_ids)} found embeddings "
+                f"in {time.perf_counter() - started:.1f}s")
+    if job is not None:
+        job.set_total(len(lost_ids))
+
+    started = time.perf_counter()
+    matches = best_matches(
+        lost_ids, lost_vectors, found_ids, found_vectors,
+        # Re-ranking picks per_post of the best text matches, so it needs more of them
+        k=max(per_post, MATCH_RERANK_CANDIDATES) if MATCH_RERANK else per_post,
+        threshold=threshold, exclude=notified_pairs(db),
+        progress=job.advance if job is not None else None
+    )
+    pairs = [(lost_id, found_id, score) for lost_id, found in matches.items() for found_id, score in found]
+    if MATCH_RERANK:
+        pairs = rerank_pairs(pairs, {row.id: row for row in lost + found}, per_post)
+    else:
+        pairs.sort(key=lambda pair: pair[2], reverse=True)
+    logger.info(f"Scored {len(lost_ids)} x {len(found_ids)} pairs in {time.perf_counter() - started:.1f}s, "
+                f"{len(pairs)} new matches")
+    return pairs
+
+
+def notify_matches(db, pairs: List[Tuple[int, int, float]], batch_size: int) -> List[Tuple[int, dict]]:
+    """Write notifications for both owners of each pair; returns the realtime events"""
+    events = []
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        post_ids = {post_id for lost_id, found_id, _ in chunk for post_id in (lost_id, found_id)}
+        posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(post_ids)).all()}
+        users = get_user_identities(db, {post.user_id for post in posts.values()})
+
+        notifications = []
+        recorded = []
+        created_at = datetime.utcnow()
+        for lost_id, found_id, score in chunk:
+            lost, found = posts.get(lost_id), posts.get(found_id)
+            if lost is None or found is None or lost.user_id not in users or found.user_id not in users:
+                continue
+            for notification in build_match_notifications(lost, found, score, lost.user_id, found.user_id):
+                notification.created_at = created_at
+                notifications.append(notification)
+            recorded.append((lost_id, found_id, score))
+        if not recorded:
+            continue
+
+        db.add_all(notifications)
+        db.flush()
+        db.execute(refresh_unread_counts(db.bind, {n.user_id for n in notifications}))
+        for stmt in record_post_matches(db.bind, recorded):
+            db.execute(stmt)
+        events.extend((n.user_id, notification_event(n)) for n in notifications)
+        db.commit()
+    return events
+
+
+def rematch_posts(
+    job: Optional[Job] = None,
+    threshold: float = REMATCH_THRESHOLD,
+    per_post: int = REMATCH_PER_POST,
+    dry_run: bool = False,
+    batch_size: int = REMATCH_NOTIFY_BATCH_SIZE
+) -> dict:
+    db = SessionLocal()
+    try:
+        pairs = find_new_matches(db, threshold, per_post, job)
+        result = {"threshold": threshold, "new_matches": len(pairs), "dry_run": dry_run, "events": []}
+        if dry_run:
+            result["sample"] = [
+                {"lost_post_id": lost_id, "found_post_id": found_id, "score": round(score, 3)}
+                for lost_id, found_id, score in pairs[:20]
+            ]
+            return result
+        result["events"] = notify_matches(db, pairs, batch_size)
+        result["notifications"] = len(result["events"])
+        logger.info(f"Re-matching notified {len(pairs)} new pairs")
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=REMATCH_THRESHOLD)
+    parser.add_argument("--per-post", type=int, default=REMATCH_PER_POST)
+    parser.add_argument("--batch-size", type=int, default=REMATCH_NOTIFY_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Report new matches without notifying")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = rematch_posts(None, args.threshold, args.per_post, args.dry_run, args.batch_size)
+    # Nobody is subscribed to realtime events from the command line; the rows are what matter
+    result.pop("events")
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
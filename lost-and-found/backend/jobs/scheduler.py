@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from typing import Callable
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs a blocking job in the threadpool every `interval` seconds while the app is up"""
+
+    def __init__(self, name: str, func: Callable[[], object], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._task = None
+
+    def start(self) -> None:
+        if self.interval <= 0:
+            logger.info(f"Periodic job {self.name} is disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.func)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Periodic job {self.name} failed: {str(e)}")
@@ -4,13 +4,19 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from middleware.cors_middleware import CustomCORSMiddleware
-from routes import user_routes, post_routes, message_routes, notification_routes, admin_routes
+from middleware.metrics_middleware import MetricsMiddleware
+from middleware.profiling_middleware import ProfilingMiddleware
+from routes import user_routes, post_routes, message_routes, notification_routes, admin_routes, realtime_routes, job_routes, metrics_routes
 from routes import claim_routes_file as claim_routes
 from app import claim_routes as app_claim_routes
 from config.db import engine, Base
 from models.user import User
 from models.post import Post
-from config.mongodb import client
+from config.mongodb import client, ensure_indexes
+from utils.realtime import hub
+from utils.outbox import message_outbox
+from utils.image_embeddings import image_embedder
+from jobs.notification_retention import retention_job
 
 app = FastAPI()
 
@@ -31,6 +37,12 @@ app.add_middleware(
 # Add custom CORS middleware to ensure all responses have CORS headers
 app.add_middleware(CustomCORSMiddleware)
 
+# Opt-in per-request sampling profiles (X-Profile header, PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so its timings cover the whole middleware stack
+app.add_middleware(MetricsMiddleware)
+
 # Add CORS preflight handler
 @app.options("/{rest_of_path:path}")
 async def preflight_handler(request: Request, rest_of_path: str):
@@ -48,16 +60,31 @@ app.include_router(message_routes.router, prefix="/api")
 app.include_router(notification_routes.router, prefix="/api")
 app.include_router(admin_routes.router, prefix="/api")
 app.include_router(claim_routes.router, prefix="/api")
+app.include_router(realtime_routes.router, prefix="/api")
+app.include_router(job_routes.router, prefix="/api")
 app.include_router(app_claim_routes.router)
+app.include_router(metrics_routes.router)
 
 @app.on_event("startup")
 async def startup_event():
     try:
         await client.admin.command('ping')
         print("Successfully connected to MongoDB")
+        await ensure_indexes()
     except Exception as e:
         print(f"Could not connect to MongoDB: {e}")
         raise e
+    await hub.start()
+    await message_outbox.start()
+    await image_embedder.start()
+    retention_job.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await retention_job.stop()
+    await image_embedder.stop()
+    await message_outbox.stop()
+    await hub.stop()
 
 if __name__ == "__main__":
     # Get port from environment variable for Render compatibility
@@ -0,0 +1,50 @@
+import time
+from starlette.datastructures import MutableHeaders
+from utils.metrics import (
+    RequestStats, current_request, HTTP_REQUEST_SECONDS,
+    DB_QUERIES_PER_REQUEST, DB_SECONDS_PER_REQUEST,
+    MONGO_COMMANDS_PER_REQUEST, MONGO_SECONDS_PER_REQUEST
+)
+
+class MetricsMiddleware:
+    """
+    Records latency per route template plus the SQL and Mongo work each request
+    did, and reports the breakdown to the client in a Server-Timing header.
+    Plain ASGI rather than BaseHTTPMiddleware so streamed (SSE) responses pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            # Label by route template, not raw path, to keep the series count bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=route, status=status_code
+            )
+            DB_QUERIES_PER_REQUEST.observe(stats.db_queries, route=route)
+            DB_SECONDS_PER_REQUEST.observe(stats.db_seconds, route=route)
+            MONGO_COMMANDS_PER_REQUEST.observe(stats.mongo_commands, route=route)
+            MONGO_SECONDS_PER_REQUEST.observe(stats.mongo_seconds, route=route)
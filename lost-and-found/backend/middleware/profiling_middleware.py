@@ -0,0 +1,43 @@
+import random
+from starlette.datastructures import Headers, MutableHeaders
+from utils.profiler import (
+    SamplingProfiler, PROFILE_SAMPLE_RATE, request_profiles, new_profile_id
+)
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that opt in with an `X-Profile: 1` header, for a
+    PROFILE_SAMPLE_RATE fraction of them. The sampler covers the whole worker
+    while the request is in flight, so it shows what the event loop and
+    threadpool were doing on the request's behalf (and alongside it). The
+    profile id comes back in X-Profile-Id; admins fetch it from /api/admin/profiles.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or PROFILE_SAMPLE_RATE <= 0
+            or Headers(scope=scope).get("x-profile") != "1"
+            or random.random() >= PROFILE_SAMPLE_RATE
+            or not request_profiles.try_acquire()
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = new_profile_id()
+        profiler = SamplingProfiler()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            request_profiles.add(profile_id, scope["method"], scope["path"], profiler)
@@ -0,0 +1,26 @@
+from sqlalchemy import inspect, text
+from database import engine
+
+def run_migration():
+    try:
+        # Archived message notifications keep their sender and coalesced count; SQLite has
+        # no ADD COLUMN IF NOT EXISTS, so existing columns are looked up first
+        existing = {column["name"] for column in inspect(engine).get_columns("notifications_archive")}
+        with engine.begin() as connection:
+            if "actor_id" not in existing:
+                connection.execute(text("""
+                    ALTER TABLE notifications_archive
+                    ADD COLUMN actor_id INTEGER
+                """))
+            if "coalesced_count" not in existing:
+                connection.execute(text("""
+                    ALTER TABLE notifications_archive
+                    ADD COLUMN coalesced_count INTEGER NOT NULL DEFAULT 1
+                """))
+        print("✅ Successfully added coalescing columns to notifications_archive")
+    except Exception as e:
+        print(f"❌ Error adding coalescing columns to notifications_archive: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
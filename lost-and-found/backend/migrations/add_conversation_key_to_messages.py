@@ -0,0 +1,48 @@
+"""
+Migration script to backfill conversation_key on messages stored before it existed
+"""
+import os
+import logging
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BATCH_SIZE = 1000
+
+def run_migration():
+    mongodb_url = os.getenv("MONGODB_URL")
+    if not mongodb_url:
+        raise ValueError("MONGODB_URL environment variable not set")
+
+    client = MongoClient(mongodb_url)
+    try:
+        db = client.get_default_database()
+    except Exception:
+        db = client["lostfound"]
+
+    try:
+        cursor = db.messages.find(
+            {"conversation_key": {"$exists": False}},
+            {"sender_id": 1, "receiver_id": 1}
+        )
+        batch = []
+        updated = 0
+        for msg in cursor:
+            low, high = sorted((int(msg["sender_id"]), int(msg["receiver_id"])))
+            batch.append(UpdateOne({"_id": msg["_id"]}, {"$set": {"conversation_key": f"{low}:{high}"}}))
+            if len(batch) >= BATCH_SIZE:
+                updated += db.messages.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += db.messages.bulk_write(batch, ordered=False).modified_count
+
+        logger.info(f"Backfilled conversation_key on {updated} messages")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,32 @@
+from sqlalchemy import inspect, text
+from database import engine
+
+def run_migration():
+    try:
+        # Columns for per-sender coalescing of message notifications; SQLite has no
+        # ADD COLUMN IF NOT EXISTS, so existing columns are looked up first
+        existing = {column["name"] for column in inspect(engine).get_columns("notifications")}
+        with engine.begin() as connection:
+            if "actor_id" not in existing:
+                connection.execute(text("""
+                    ALTER TABLE notifications
+                    ADD COLUMN actor_id INTEGER
+                """))
+            if "coalesced_count" not in existing:
+                connection.execute(text("""
+                    ALTER TABLE notifications
+                    ADD COLUMN coalesced_count INTEGER NOT NULL DEFAULT 1
+                """))
+            # Existing rows have no actor_id, so they never conflict with the upsert target
+            connection.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_notifications_unread_message
+                ON notifications (user_id, actor_id)
+                WHERE type = 'message' AND is_read = false
+            """))
+        print("✅ Successfully added notification coalescing columns")
+    except Exception as e:
+        print(f"❌ Error adding notification coalescing columns: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
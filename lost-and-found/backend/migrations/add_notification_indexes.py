@@ -0,0 +1,37 @@
+from sqlalchemy import text, select
+from database import engine
+from models.notification_state import UserNotificationState
+from models.user import User
+from utils.notifications import refresh_unread_counts
+
+BATCH_SIZE = 1000
+
+def run_migration():
+    try:
+        with engine.begin() as connection:
+            # Inbox pages and unread counts for a user
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_notifications_user_created
+                ON notifications (user_id, created_at, id)
+            """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_notifications_user_unread
+                ON notifications (user_id) WHERE is_read = false
+            """))
+        print("✅ Successfully created notification indexes")
+
+        UserNotificationState.__table__.create(bind=engine, checkfirst=True)
+
+        # Backfill the unread counters in batches of users, one transaction per batch
+        with engine.connect() as connection:
+            user_ids = [row[0] for row in connection.execute(select(User.id).order_by(User.id))]
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            with engine.begin() as connection:
+                connection.execute(refresh_unread_counts(engine, user_ids[start:start + BATCH_SIZE]))
+        print(f"✅ Successfully backfilled unread counters for {len(user_ids)} users")
+    except Exception as e:
+        print(f"❌ Error creating notification indexes: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,51 @@
+from sqlalchemy import inspect, text, select, distinct
+from database import engine
+from models.notification import Notification
+from models.notification_state import UserNotificationState
+from utils.notifications import refresh_unread_counts
+
+BATCH_SIZE = 1000
+
+def run_migration():
+    try:
+        UserNotificationState.__table__.create(bind=engine, checkfirst=True)
+        # SQLite has no ADD COLUMN IF NOT EXISTS, so the column is looked up first
+        existing = {column["name"] for column in inspect(engine).get_columns("user_notification_state")}
+        if "welcomed_at" not in existing:
+            with engine.begin() as connection:
+                connection.execute(text("""
+                    ALTER TABLE user_notification_state
+                    ADD COLUMN welcomed_at TIMESTAMP
+                """))
+
+        # Every user who already got a welcome notification needs a state row and the flag
+        with engine.connect() as connection:
+            user_ids = [row[0] for row in connection.execute(
+                select(distinct(Notification.user_id)).where(Notification.type == 'welcome')
+            )]
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            with engine.begin() as connection:
+                connection.execute(refresh_unread_counts(engine, user_ids[start:start + BATCH_SIZE]))
+
+        # Correlated subquery rather than UPDATE ... FROM, which older SQLite lacks
+        with engine.begin() as connection:
+            connection.execute(text("""
+                UPDATE user_notification_state
+                SET welcomed_at = (
+                    SELECT MIN(n.created_at)
+                    FROM notifications AS n
+                    WHERE n.type = 'welcome' AND n.user_id = user_notification_state.user_id
+                )
+                WHERE welcomed_at IS NULL AND EXISTS (
+                    SELECT 1
+                    FROM notifications AS n
+                    WHERE n.type = 'welcome' AND n.user_id = user_notification_state.user_id
+                )
+            """))
+        print(f"✅ Successfully backfilled welcomed_at for {len(user_ids)} users")
+    except Exception as e:
+        print(f"❌ Error backfilling welcomed_at: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,13 @@
+from database import engine
+from models.background_job import BackgroundJob
+
+def run_migration():
+    try:
+        BackgroundJob.__table__.create(bind=engine, checkfirst=True)
+        print("✅ Successfully created background_jobs table")
+    except Exception as e:
+        print(f"❌ Error creating background_jobs table: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,82 @@
+"""
+Migration script to build the conversations collection from existing messages.
+Run after add_conversation_key_to_messages.
+"""
+import os
+import logging
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReplaceOne
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BATCH_SIZE = 500
+
+def run_migration():
+    mongodb_url = os.getenv("MONGODB_URL")
+    if not mongodb_url:
+        raise ValueError("MONGODB_URL environment variable not set")
+
+    client = MongoClient(mongodb_url)
+    try:
+        db = client.get_default_database()
+    except Exception:
+        db = client["lostfound"]
+
+    try:
+        pipeline = [
+            {"$sort": {"timestamp": -1}},
+            {"$group": {
+                "_id": "$conversation_key",
+                "last_message": {"$first": "$content"},
+                "last_sender_id": {"$first": "$sender_id"},
+                "timestamp": {"$first": "$timestamp"},
+                "post_id": {"$first": "$post_id"},
+                "senders": {"$addToSet": {"id": "$sender_id", "name": "$sender_name"}},
+                "receivers": {"$addToSet": {"id": "$receiver_id", "name": "$receiver_name"}},
+                "unread_for": {"$push": {"$cond": [
+                    {"$eq": ["$read_status", False]}, "$receiver_id", None
+                ]}}
+            }}
+        ]
+
+        batch = []
+        written = 0
+        for group in db.messages.aggregate(pipeline, allowDiskUse=True):
+            if group["_id"] is None:
+                continue
+            participants = sorted(int(p) for p in group["_id"].split(":"))
+            names = {}
+            for entry in group["senders"] + group["receivers"]:
+                if entry.get("name"):
+                    names[str(entry["id"])] = entry["name"]
+            unread = {str(p): 0 for p in participants}
+            for receiver_id in group["unread_for"]:
+                if receiver_id is not None:
+                    unread[str(receiver_id)] = unread.get(str(receiver_id), 0) + 1
+
+            batch.append(ReplaceOne({"_id": group["_id"]}, {
+                "participants": participants,
+                "names": names,
+                "last_message": group["last_message"],
+                "last_sender_id": group["last_sender_id"],
+                "timestamp": group["timestamp"],
+                "post_id": group["post_id"],
+                "unread": unread,
+            }, upsert=True))
+            if len(batch) >= BATCH_SIZE:
+                db.conversations.bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if batch:
+            db.conversations.bulk_write(batch, ordered=False)
+            written += len(batch)
+
+        logger.info(f"Wrote {written} conversation summaries")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from database import engine
+
+def run_migration():
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE TABLE IF NOT EXISTS post_matches (
+                    lost_post_id INTEGER NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+                    found_post_id INTEGER NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+                    score FLOAT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (lost_post_id, found_post_id)
+                )
+            """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_post_matches_found ON post_matches (found_post_id)
+            """))
+            # Match notifications only name the other post; a lost-item owner who was told
+            # about a found post counts as notified for each of their lost posts
+            connection.execute(text("""
+                INSERT INTO post_matches (lost_post_id, found_post_id, created_at)
+                SELECT lost.id, found.id, MIN(n.created_at)
+                FROM notifications n
+                JOIN posts found ON found.id = n.related_post_id AND LOWER(found.report_type) = 'found'
+                JOIN posts lost ON lost.user_id = n.user_id AND LOWER(lost.report_type) = 'lost'
+                WHERE n.type = 'match_lost'
+                GROUP BY lost.id, found.id
+                ON CONFLICT DO NOTHING
+            """))
+        print("✅ Successfully created post_matches table")
+    except Exception as e:
+        print(f"❌ Error creating post_matches table: {str(e)}")
+        raise e
+
+if __name__ == "__main__":
+    run_migration()
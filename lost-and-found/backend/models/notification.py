@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, false
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -14,7 +14,27 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)  # Changed from 'read' to 'is_read'
     created_at = Column(DateTime, default=datetime.utcnow)
     related_post_id = Column(Integer, ForeignKey("posts.id"), nullable=True)
+    # Message notifications are coalesced per sender while unread
+    actor_id = Column(Integer, nullable=True)
+    coalesced_count = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     user = relationship("User", back_populates="notifications")
     related_post = relationship("Post", back_populates="notifications")
+
+    __table_args__ = (
+        # Inbox pages: a user's notifications newest first
+        Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+        # Unread counts only touch unread rows
+        Index(
+            "ix_notifications_user_unread", "user_id",
+            postgresql_where=(is_read == false()),
+            sqlite_where=(is_read == false())
+        ),
+        # At most one unread message notification per (receiver, sender); the upsert target
+        Index(
+            "ux_notifications_unread_message", "user_id", "actor_id", unique=True,
+            postgresql_where=((type == "message") & (is_read == false())),
+            sqlite_where=((type == "message") & (is_read == false()))
+        ),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from database import Base
+
+class NotificationArchive(Base):
+    """Read notifications moved out of the hot table by the retention job"""
+    __tablename__ = "notifications_archive"
+
+    # Keeps the original notification id; no foreign keys so archived rows outlive their posts
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)
+    title = Column(String)
+    message = Column(String)
+    type = Column(String)
+    related_post_id = Column(Integer, nullable=True)
+    # Coalescing state of message notifications, as on the notifications table
+    actor_id = Column(Integer, nullable=True)
+    coalesced_count = Column(Integer, nullable=False, default=1, server_default="1")
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_notifications_archive_user_created", "user_id", "created_at"),
+    )
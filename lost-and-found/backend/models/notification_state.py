@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from database import Base
+
+class UserNotificationState(Base):
+    """Per-user notification bookkeeping, so the bell reads one row instead of counting"""
+    __tablename__ = "user_notification_state"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    # Set once the welcome notification has been sent; checked on every app load
+    welcomed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from datetime import datetime
+from database import Base
+
+class PostMatch(Base):
+    """Lost/found pairs whose owners have been notified, so re-matching never repeats them"""
+    __tablename__ = "post_matches"
+
+    lost_post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    found_post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_post_matches_found", "found_post_id"),
+    )
@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
+from pydantic import BaseModel
 from database import get_db
+from config.db import pool_status
 from models import User
 from utils import get_password_hash
+from utils.user_cache import invalidate_user
+from utils.admin_auth import create_admin_token, verify_admin_token
+from utils.profiler import profile_process, request_profiles, PROFILE_MAX_SECONDS
+from utils.realtime import hub
+from jobs.registry import job_registry
+from jobs.rematch import rematch_posts, REMATCH_THRESHOLD, REMATCH_PER_POST
+from datetime import datetime
 import os
+import secrets
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -37,6 +49,7 @@ async def setup_admin(
     user.is_admin = True
     db.commit()
     db.refresh(user)
+    invalidate_user(user)
 
     return {
         "message": "Admin user created successfully",
@@ -47,15 +60,20 @@ async def setup_admin(
         }
     }
 
+class AdminLoginRequest(BaseModel):
+    username: str
+    password: str
+
 @router.post("/login")
 async def admin_login(
-    username: str,
-    password: str,
+    request: AdminLoginRequest,
     db: Session = Depends(get_db)
 ):
-    # Verify against environment variables
-    if username != os.getenv("ADMIN_USERNAME") or \
-       password != os.getenv("ADMIN_PASSWORD"):
+    # Verify against environment variables; unset ones never match
+    admin_username, admin_password = os.getenv("ADMIN_USERNAME"), os.getenv("ADMIN_PASSWORD")
+    if not admin_username or not admin_password or \
+       not secrets.compare_digest(request.username, admin_username) or \
+       not secrets.compare_digest(request.password, admin_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
@@ -69,8 +87,9 @@ async def admin_login(
             detail="No admin user found"
         )
 
-    # Return admin info
+    # Return a token for the admin endpoints and the admin info
     return {
+        "token": create_admin_token(admin.username),
         "user": {
             "id": admin.id,
             "username": admin.username,
@@ -106,6 +125,58 @@ async def delete_user(
             detail="User not found"
         )
     
+    invalidate_user(user)
     db.delete(user)
     db.commit()
     return {"message": "User deleted successfully"}
+
+@router.get("/db-pool")
+async def get_db_pool_status(_: dict = Depends(verify_admin_token)):
+    """Connection pool usage: checked-out and overflow connections, checkout wait times"""
+    return pool_status()
+
+def collapsed_response(text: str, name: str) -> PlainTextResponse:
+    return PlainTextResponse(text, headers={"Content-Disposition": f'attachment; filename="{name}.collapsed"'})
+
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=100),
+    _: dict = Depends(verify_admin_token)
+):
+    """Sample this worker's stacks for a while; returns collapsed stacks for flamegraph.pl or speedscope"""
+    try:
+        profiler = await run_in_threadpool(profile_process, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    name = f"profile-{os.getpid()}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+    return collapsed_response(profiler.collapsed(), name)
+
+@router.get("/profiles")
+async def list_request_profiles(_: dict = Depends(verify_admin_token)):
+    """Per-request profiles captured through the X-Profile header, newest first"""
+    return request_profiles.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, _: dict = Depends(verify_admin_token)):
+    profile = request_profiles.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return collapsed_response(profile["collapsed"], f"request-{profile_id}")
+
+@router.post("/rematch", status_code=202)
+async def rematch(
+    threshold: float = Query(REMATCH_THRESHOLD, gt=0, le=1),
+    per_post: int = Query(REMATCH_PER_POST, ge=1, le=20),
+    dry_run: bool = False,
+    _: dict = Depends(verify_admin_token)
+):
+    """Re-score all lost/found pairs and notify new matches; poll /api/jobs/{job_id} for progress"""
+    async def push(job):
+        # Match events are only needed here; keep them out of the job status
+        for user_id, event in job.result.pop("events", []):
+            await hub.publish(user_id, "notification.new", event)
+
+    job = job_registry.create("post_rematch", {"threshold": threshold, "per_post": per_post, "dry_run": dry_run})
+    job_registry.start(job, rematch_posts, threshold, per_post, dry_run, on_done=push)
+    return {"job_id": job.id, "status": job.status}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from models.post import Post
 from models.user import User
 from pydantic import BaseModel
@@ -23,13 +23,6 @@ router = APIRouter(
 CLAIMS_FILE = "backend/data/claims.json"
 os.makedirs(os.path.dirname(CLAIMS_FILE), exist_ok=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_cors_headers(request: Request):
     return {
         "Access-Control-Allow-Origin": "*",
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from models.post import Post
 from models.user import User
 from pydantic import BaseModel
@@ -11,6 +11,7 @@ import json
 import os
 from datetime import datetime
 import uuid
+from utils.user_cache import get_user_identity_by_firebase_uid
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +24,6 @@ router = APIRouter(
 CLAIMS_FILE = "backend/data/claims.json"
 os.makedirs(os.path.dirname(CLAIMS_FILE), exist_ok=True)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_cors_headers(request: Request):
     return {
         "Access-Control-Allow-Origin": "*",
@@ -72,7 +66,7 @@ class ClaimUpdate(BaseModel):
 async def create_claim(claim: ClaimCreate, db: Session = Depends(get_db), request: Request = None):
     try:
         # Find user by Firebase UID
-        user = db.query(User).filter(User.firebase_uid == claim.user_id).first()
+        user = get_user_identity_by_firebase_uid(db, claim.user_id)
         if not user:
             logger.error(f"User not found with firebase_uid: {claim.user_id}")
             return JSONResponse(status_code=404, content={"detail": "User not found"}, headers=get_cors_headers(request))
@@ -129,7 +123,7 @@ async def create_claim(claim: ClaimCreate, db: Session = Depends(get_db), reques
 async def get_user_claims(firebase_uid: str, db: Session = Depends(get_db), request: Request = None):
     try:
         # Find user by Firebase UID
-        user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
+        user = get_user_identity_by_firebase_uid(db, firebase_uid)
         if not user:
             logger.error(f"User not found with firebase_uid: {firebase_uid}")
             return JSONResponse(status_code=404, content={"detail": "User not found"}, headers=get_cors_headers(request))
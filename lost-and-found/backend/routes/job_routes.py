@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends, HTTPException
+from jobs.registry import job_registry
+from utils.admin_auth import verify_admin_token
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, _: dict = Depends(verify_admin_token)):
+    """Status and progress of a background job, whichever worker runs it"""
+    job = await job_registry.lookup(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
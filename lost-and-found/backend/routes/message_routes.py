@@ -1,30 +1,36 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Depends, Response, Query
 from datetime import datetime
 from pytz import timezone
-from config.mongodb import messages
-from typing import List
+from config.mongodb import messages, conversations
+from typing import List, Optional
 import logging
 from models.user import User
-from sqlalchemy.orm import Session
-from config.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from bson import ObjectId
 from schemas import CreateMessageRequest
-from models.notification import Notification  # <-- Added for notification
+from utils.conversations import (
+    conversation_key, encode_cursor, decode_cursor,
+    record_message, mark_conversation_read, summary_for
+)
+from utils.realtime import hub
+from utils.outbox import message_outbox
+from utils.user_cache import aget_user_identities
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
-def get_user_info(db: Session, user_id: int):
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail=f"User {user_id} not found")
-        return {"id": user.id, "username": user.username}
-    except Exception as e:
-        logging.error(f"Error getting user info for ID {user_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving user information: {str(e)}")
+# Chat history page size
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Outbox bookkeeping is internal to the dispatcher
+OUTBOX_FIELDS = {"outbox": 0, "outbox_pending": 0, "outbox_lease": 0, "outbox_token": 0}
+
+# Names are denormalized onto every message for the inbox; the chat view doesn't need them
+CHAT_PROJECTION = {"sender_name": 0, "receiver_name": 0, "conversation_key": 0, **OUTBOX_FIELDS}
 
 @router.post("/create")
-async def create_message(payload: CreateMessageRequest, db: Session = Depends(get_db)):
+async def create_message(payload: CreateMessageRequest, db: AsyncSession = Depends(get_async_db)):
     try:
         sender_id = payload.from_
         receiver_id = payload.to
@@ -32,10 +38,16 @@ async def create_message(payload: CreateMessageRequest, db: Session = Depends(ge
         if sender_id == receiver_id:
             raise HTTPException(status_code=400, detail="Cannot send message to yourself")
 
-        sender = get_user_info(db, sender_id)
-        receiver = get_user_info(db, receiver_id)
+        # Both participants in one (usually cached) lookup
+        users = await aget_user_identities(db, [sender_id, receiver_id])
+        for user_id in (sender_id, receiver_id):
+            if user_id not in users:
+                raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+        sender = {"id": users[sender_id].id, "username": users[sender_id].username}
+        receiver = {"id": users[receiver_id].id, "username": users[receiver_id].username}
 
         eastern = timezone("America/New_York")
+        timestamp = datetime.now(eastern).isoformat()
         message_data = {
             "content": payload.message,
             "sender_id": sender["id"],
@@ -43,26 +55,44 @@ async def create_message(payload: CreateMessageRequest, db: Session = Depends(ge
             "receiver_id": receiver["id"],
             "receiver_name": receiver["username"],
             "post_id": payload.postId,
-            "timestamp": datetime.now(eastern).isoformat(),
+            "conversation_key": conversation_key(sender["id"], receiver["id"]),
+            "timestamp": timestamp,
             "read_status": False
         }
 
-        result = await messages.insert_one(message_data)
+        # The receiver's notification rides along on the message document and is
+        # written to SQL in batches by the outbox dispatcher
+        message_doc = {
+            **message_data,
+            "outbox": [{
+                "type": "notification",
+                "user_id": receiver["id"],
+                "title": "New Message",
+                "message": f"You received a new message from {sender['username']}",
+                "notification_type": "message",
+                "related_post_id": payload.postId,
+                "actor_id": sender["id"],
+                "actor_name": sender["username"],
+                "created_at": timestamp
+            }],
+            "outbox_pending": True
+        }
+
+        result = await messages.insert_one(message_doc)
         if not result.inserted_id:
             raise HTTPException(status_code=500, detail="Failed to save message to database")
+        message_outbox.notify()
 
-        # ✅ Send New Message Notification
-        db_notification = Notification(
-            user_id=receiver["id"],
-            title="New Message",
-            message=f"You received a new message from {sender['username']}",
-            type="message",
-            related_post_id=payload.postId,
-            is_read=False,
-            created_at=datetime.now(eastern)
-        )
-        db.add(db_notification)
-        db.commit()
+        # The summary only ever names a stored message; the message itself is already sent
+        try:
+            await record_message(conversations, message_data)
+        except Exception as e:
+            logging.error(f"Error updating conversation summary: {str(e)}")
+
+        message_data["_id"] = str(result.inserted_id)
+        message_data.pop("conversation_key", None)
+        for user_id in (receiver["id"], sender["id"]):
+            await hub.publish(user_id, "message.new", message_data)
 
         return {"success": True, "message": "Message sent successfully", "message_id": str(result.inserted_id)}
 
@@ -73,69 +103,70 @@ async def create_message(payload: CreateMessageRequest, db: Session = Depends(ge
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/chat/{user_id}/{other_user_id}")
-async def get_chat_messages(user_id: int, other_user_id: int, db: Session = Depends(get_db)):
+async def get_chat_messages(
+    user_id: int,
+    other_user_id: int,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Return one page of the chat between two users, oldest first.
+    Without a cursor this is the latest page; pass `before` (or `after`) with a
+    cursor of the form "<timestamp>|<message id>" to page backwards (or forwards).
+    """
     try:
-        cursor = messages.find({
-            "$or": [
-                {"sender_id": user_id, "receiver_id": other_user_id},
-                {"sender_id": other_user_id, "receiver_id": user_id}
+        query = {"conversation_key": conversation_key(user_id, other_user_id)}
+        cursor_value = before or after
+        if cursor_value:
+            decoded = decode_cursor(cursor_value)
+            if decoded is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            timestamp, message_id = decoded
+            op = "$lt" if before else "$gt"
+            query["$or"] = [
+                {"timestamp": {op: timestamp}},
+                {"timestamp": timestamp, "_id": {op: message_id}}
             ]
-        }).sort("timestamp", 1)
+
+        # Walk the index newest-first unless paging forward from a cursor
+        direction = 1 if after and not before else -1
+        cursor = messages.find(query, CHAT_PROJECTION).sort(
+            [("timestamp", direction), ("_id", direction)]
+        ).limit(limit + 1)
 
         chat_messages = []
         async for msg in cursor:
             msg["_id"] = str(msg["_id"])
             chat_messages.append(msg)
+
+        has_more = len(chat_messages) > limit
+        chat_messages = chat_messages[:limit]
+        if direction == -1:
+            chat_messages.reverse()
+
+        if has_more and chat_messages:
+            edge = chat_messages[0] if direction == -1 else chat_messages[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor(edge)
         return chat_messages
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error getting chat messages: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/conversations/{user_id}")
-async def get_conversations(user_id: int, db: Session = Depends(get_db)):
+async def get_conversations(user_id: int):
     try:
-        pipeline = [
-            {"$match": {
-                "$or": [
-                    {"sender_id": user_id},
-                    {"receiver_id": user_id}
-                ]
-            }},
-            {"$sort": {"timestamp": -1}},
-            {"$group": {
-                "_id": {"$cond": [
-                    {"$eq": ["$sender_id", user_id]},
-                    "$receiver_id",
-                    "$sender_id"
-                ]},
-                "last_message": {"$first": "$content"},
-                "timestamp": {"$first": "$timestamp"},
-                "username": {"$first": {"$cond": [
-                    {"$eq": ["$sender_id", user_id]},
-                    "$receiver_name",
-                    "$sender_name"
-                ]}},
-                "userId": {"$first": {"$cond": [
-                    {"$eq": ["$sender_id", user_id]},
-                    "$receiver_id",
-                    "$sender_id"
-                ]}},
-                "postId": {"$first": "$post_id"},
-                "unread": {"$sum": {"$cond": [
-                    {"$and": [
-                        {"$eq": ["$receiver_id", user_id]},
-                        {"$eq": ["$read_status", False]}
-                    ]}, 1, 0
-                ]}}
-            }}
-        ]
-
-        conversations = []
-        async for conv in messages.aggregate(pipeline):
-            conv["_id"] = str(conv["_id"])
-            conversations.append(conv)
-        return conversations
+        # Summaries are maintained on send/mark-read, so the inbox is one indexed find
+        cursor = conversations.find({"participants": user_id}).sort("timestamp", -1)
+
+        inbox = []
+        async for conv in cursor:
+            inbox.append(summary_for(conv, user_id))
+        return inbox
 
     except Exception as e:
         logging.error(f"Error getting conversations: {str(e)}")
@@ -148,7 +179,7 @@ async def get_recent_messages(userId: int):
         cursor = messages.find({
             "receiver_id": userId,
             "read_status": False
-        }).sort("timestamp", -1).limit(10)
+        }, OUTBOX_FIELDS).sort("timestamp", -1).limit(10)
 
         async for msg in cursor:
             msg["_id"] = str(msg["_id"])
@@ -156,7 +187,7 @@ async def get_recent_messages(userId: int):
 
         return {
             "messages": recent_msgs,
-            "typing": []
+            "typing": hub.typing_for(userId)
         }
 
     except Exception as e:
@@ -164,7 +195,7 @@ async def get_recent_messages(userId: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mark-read")
-async def mark_messages_as_read(payload: dict, db: Session = Depends(get_db)):
+async def mark_messages_as_read(payload: dict):
     try:
         user_id = payload.get("userId")
         conversation_id = payload.get("conversationId")
@@ -174,12 +205,21 @@ async def mark_messages_as_read(payload: dict, db: Session = Depends(get_db)):
 
         result = await messages.update_many(
             {
+                "conversation_key": conversation_key(user_id, conversation_id),
                 "receiver_id": user_id,
                 "sender_id": int(conversation_id),
                 "read_status": False
             },
             {"$set": {"read_status": True}}
         )
+        await mark_conversation_read(conversations, int(user_id), int(conversation_id), result.modified_count)
+        if result.modified_count:
+            # Read receipt for the other side of the conversation
+            await hub.publish(int(conversation_id), "message.read", {
+                "reader_id": int(user_id),
+                "conversation_id": int(user_id),
+                "count": result.modified_count
+            })
 
         return {
             "success": True,
@@ -0,0 +1,43 @@
+import os
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from config.db import pool_status
+from utils.metrics import registry
+from utils.realtime import hub
+from utils.user_cache import user_cache
+from utils.embedding_store import post_embeddings, post_image_embeddings
+from utils.image_embeddings import image_embedder
+
+router = APIRouter(tags=["metrics"])
+
+# Optional shared secret for the scraper; unset leaves /metrics open
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+POOL_FIELDS = ("size", "checked_out", "checked_in", "overflow", "checkouts", "timeouts", "wait_seconds_total", "wait_seconds_max")
+
+def collect_pool_stats():
+    samples = []
+    for pool, entry in pool_status().items():
+        for field in POOL_FIELDS:
+            if field in entry:
+                samples.append(({"pool": pool, "field": field}, entry[field]))
+    return samples
+
+registry.gauge("db_pool", "SQLAlchemy connection pool state", ("pool", "field"), collect_pool_stats)
+registry.gauge("realtime_connections", "Open WebSocket/SSE subscriptions in this process", (),
+               lambda: [({}, hub.connection_count())])
+registry.gauge("user_cache_lookups", "User identity cache hits and misses", ("result",),
+               lambda: [({"result": "hit"}, user_cache.hits), ({"result": "miss"}, user_cache.misses)])
+registry.gauge("embedding_cache", "Post embedding slab state", ("field",),
+               lambda: [({"field": k}, v) for k, v in post_embeddings.stats().items() if k != "dtype"])
+registry.gauge("image_embedding_cache", "Post photo embedding slab state", ("field",),
+               lambda: [({"field": k}, v) for k, v in post_image_embeddings.stats().items() if k != "dtype"])
+registry.gauge("image_embedder", "Photos queued for embedding and embedded or failed so far", ("field",),
+               lambda: [({"field": k}, v) for k, v in image_embedder.stats().items()])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(authorization: str = Header(None)):
+    """Prometheus text exposition of this process's metrics"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, update, delete, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
-from database import get_db
+from database import get_async_db
 from models.notification import Notification
+from models.notification_state import UserNotificationState
 from models.user import User
 from pydantic import BaseModel
+from utils.notifications import (
+    refresh_unread_counts, mark_welcomed, welcomed_users, encode_cursor, decode_cursor
+)
+from utils.realtime import hub, notification_event
+from utils.admin_auth import verify_admin_token
+from jobs.registry import job_registry
+from jobs.broadcast import AUDIENCES, broadcast_notification
+from utils.user_cache import aget_user_identity_by_firebase_uid
 
 router = APIRouter(
     prefix="/notifications",
@@ -27,21 +37,60 @@ class NotificationResponse(BaseModel):
     is_read: bool
     created_at: datetime
     related_post_id: int = None
+    coalesced_count: int = 1
 
     class Config:
         from_attributes = True
 
+class BroadcastRequest(BaseModel):
+    title: str
+    message: str
+    type: str = "system"
+    audience: str = "all"  # 'all', 'ids' or 'post_type'
+    user_ids: Optional[List[int]] = None  # database user ids, for audience 'ids'
+    post_type: Optional[str] = None  # 'lost' or 'found', for audience 'post_type'
+    related_post_id: int = None
+
+class NotificationIds(BaseModel):
+    ids: Optional[List[int]] = None  # None means every notification of the user
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 @router.get("/user/{firebase_uid}", response_model=List[NotificationResponse])
-async def get_user_notifications(firebase_uid: str, db: Session = Depends(get_db)):
+async def get_user_notifications(
+    firebase_uid: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Newest notifications first; pass X-Next-Cursor back as `before` for the next page"""
     try:
         # Get the database user ID from Firebase UID
-        user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
+        user = await aget_user_identity_by_firebase_uid(db, firebase_uid)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        notifications = db.query(Notification).filter(
-            Notification.user_id == user.id
-        ).order_by(Notification.created_at.desc()).all()
+        query = select(Notification).where(Notification.user_id == user.id)
+        if before:
+            cursor = decode_cursor(before)
+            if cursor is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            created_at, notification_id = cursor
+            query = query.where(or_(
+                Notification.created_at < created_at,
+                and_(Notification.created_at == created_at, Notification.id < notification_id)
+            ))
+
+        # Served by ix_notifications_user_created; one extra row tells us if there's a next page
+        result = await db.execute(
+            query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1)
+        )
+        notifications = result.scalars().all()
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(notifications[-1])
         
         return [NotificationResponse(**{
             'id': n.id,
@@ -50,19 +99,101 @@ async def get_user_notifications(firebase_uid: str, db: Session = Depends(get_db
             'type': n.type,
             'is_read': n.is_read,
             'created_at': n.created_at,
-            'related_post_id': n.related_post_id
+            'related_post_id': n.related_post_id,
+            'coalesced_count': n.coalesced_count or 1
         }) for n in notifications]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/user/{firebase_uid}/unread-count")
+async def get_unread_count(firebase_uid: str, db: AsyncSession = Depends(get_async_db)):
+    """Stored counter for the bell icon; a primary-key read instead of a COUNT"""
+    try:
+        user = await aget_user_identity_by_firebase_uid(db, firebase_uid)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        state = await db.get(UserNotificationState, user.id)
+        if state is None:
+            # First read for this user: build the counter once
+            await db.execute(refresh_unread_counts(db.bind, [user.id]))
+            await db.commit()
+            state = await db.get(UserNotificationState, user.id)
+
+        return {"unread_count": state.unread_count if state else 0}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/user/{firebase_uid}/read")
+async def bulk_mark_as_read(firebase_uid: str, body: NotificationIds = None, db: AsyncSession = Depends(get_async_db)):
+    """Mark the given notifications (or all of them) read in one UPDATE"""
+    try:
+        user = await aget_user_identity_by_firebase_uid(db, firebase_uid)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        stmt = update(Notification).where(
+            Notification.user_id == user.id,
+            Notification.is_read == False
+        )
+        if body is not None and body.ids is not None:
+            stmt = stmt.where(Notification.id.in_(body.ids))
+        result = await db.execute(stmt.values(is_read=True).execution_options(synchronize_session=False))
+        await db.execute(refresh_unread_counts(db.bind, [user.id]))
+        await db.commit()
+        return {"status": "success", "updated": result.rowcount}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/user/{firebase_uid}/bulk-delete")
+async def bulk_delete_notifications(firebase_uid: str, body: NotificationIds = None, db: AsyncSession = Depends(get_async_db)):
+    """Delete the given notifications (or all of them) in one DELETE"""
+    try:
+        user = await aget_user_identity_by_firebase_uid(db, firebase_uid)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        stmt = delete(Notification).where(Notification.user_id == user.id)
+        if body is not None and body.ids is not None:
+            stmt = stmt.where(Notification.id.in_(body.ids))
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        await db.execute(refresh_unread_counts(db.bind, [user.id]))
+        await db.commit()
+        return {"status": "success", "deleted": result.rowcount}
+    except HTTPException:
+        raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/create", response_model=NotificationResponse)
-async def create_notification(notification: NotificationCreate, db: Session = Depends(get_db)):
+async def create_notification(notification: NotificationCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         # Get the database user ID from Firebase UID
-        user = db.query(User).filter(User.firebase_uid == notification.user_id).first()
+        user = await aget_user_identity_by_firebase_uid(db, notification.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        is_welcome = notification.type == 'welcome'
+        if is_welcome:
+            if user.id in welcomed_users:
+                raise HTTPException(status_code=409, detail="Welcome notification already sent")
+            # Claim the flag before inserting; of two concurrent requests only one updates the row
+            await db.execute(refresh_unread_counts(db.bind, [user.id]))
+            claimed = await db.execute(mark_welcomed(user.id))
+            if claimed.rowcount == 0:
+                await db.rollback()
+                welcomed_users.add(user.id)
+                raise HTTPException(status_code=409, detail="Welcome notification already sent")
+
         db_notification = Notification(
             user_id=user.id,
             title=notification.title,
@@ -72,8 +203,13 @@ async def create_notification(notification: NotificationCreate, db: Session = De
             is_read=False
         )
         db.add(db_notification)
-        db.commit()
-        db.refresh(db_notification)
+        await db.flush()
+        await db.execute(refresh_unread_counts(db.bind, [user.id]))
+        await db.commit()
+        if is_welcome:
+            welcomed_users.add(user.id)
+        await db.refresh(db_notification)
+        await hub.publish(user.id, "notification.new", notification_event(db_notification))
         
         return NotificationResponse(**{
             'id': db_notification.id,
@@ -84,52 +220,107 @@ async def create_notification(notification: NotificationCreate, db: Session = De
             'created_at': db_notification.created_at,
             'related_post_id': db_notification.related_post_id
         })
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/broadcast", status_code=202)
+async def broadcast(request: BroadcastRequest, _: dict = Depends(verify_admin_token)):
+    """Notify an audience of users from a background job; poll /api/jobs/{job_id} for progress"""
+    if request.audience not in AUDIENCES:
+        raise HTTPException(status_code=400, detail=f"audience must be one of {', '.join(AUDIENCES)}")
+    if request.audience == "ids" and not request.user_ids:
+        raise HTTPException(status_code=400, detail="user_ids is required for audience 'ids'")
+    if request.audience == "post_type" and (request.post_type or "").lower() not in ("lost", "found"):
+        raise HTTPException(status_code=400, detail="post_type must be 'lost' or 'found'")
+
+    async def push(job):
+        event = {
+            "id": None,
+            "title": request.title,
+            "message": request.message,
+            "type": request.type,
+            "is_read": False,
+            "created_at": job.result["created_at"],
+            "related_post_id": request.related_post_id
+        }
+        if request.audience == "all":
+            await hub.broadcast("notification.broadcast", event)
+        else:
+            # Recipient ids are only needed here; keep them out of the job status
+            for user_id in job.result.pop("user_ids", []):
+                await hub.publish(user_id, "notification.broadcast", event)
+
+    job = job_registry.create("notification_broadcast", {
+        "title": request.title,
+        "audience": request.audience,
+        "post_type": request.post_type
+    })
+    job_registry.start(
+        job, broadcast_notification,
+        request.title, request.message, request.type, request.audience,
+        user_ids=request.user_ids,
+        post_type=request.post_type,
+        related_post_id=request.related_post_id,
+        on_done=push
+    )
+    return {"job_id": job.id, "status": job.status}
+
 @router.put("/{notification_id}/read")
-async def mark_as_read(notification_id: int, db: Session = Depends(get_db)):
+async def mark_as_read(notification_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        notification = db.query(Notification).filter(Notification.id == notification_id).first()
+        notification = await db.get(Notification, notification_id)
         if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
         
         notification.is_read = True
-        db.commit()
+        await db.flush()
+        await db.execute(refresh_unread_counts(db.bind, [notification.user_id]))
+        await db.commit()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{notification_id}")
-async def delete_notification(notification_id: int, db: Session = Depends(get_db)):
+async def delete_notification(notification_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        notification = db.query(Notification).filter(Notification.id == notification_id).first()
+        notification = await db.get(Notification, notification_id)
         if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
         
-        db.delete(notification)
-        db.commit()
+        user_id = notification.user_id
+        await db.delete(notification)
+        await db.flush()
+        await db.execute(refresh_unread_counts(db.bind, [user_id]))
+        await db.commit()
         return {"status": "success"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+async def is_welcomed(db: AsyncSession, user_id: int) -> bool:
+    if user_id in welcomed_users:
+        return True
+    state = await db.get(UserNotificationState, user_id)
+    if state is not None and state.welcomed_at is not None:
+        welcomed_users.add(user_id)
+        return True
+    return False
+
 @router.get("/welcome/{firebase_uid}")
-async def check_welcome_notification(firebase_uid: str, db: Session = Depends(get_db)):
+async def check_welcome_notification(firebase_uid: str, db: AsyncSession = Depends(get_async_db)):
+    """Called on every app load: a cache hit, or one primary-key read of the onboarding flag"""
     try:
         # Get the database user ID from Firebase UID
-        user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
+        user = await aget_user_identity_by_firebase_uid(db, firebase_uid)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Check if welcome notification exists
-        notification = db.query(Notification).filter(
-            Notification.user_id == user.id,
-            Notification.type == 'welcome'
-        ).first()
-
-        return {"exists": notification is not None}
+        return {"exists": await is_welcomed(db, user.id)}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
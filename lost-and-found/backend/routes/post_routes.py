@@ -2,12 +2,16 @@ from datetime import datetime
 import os
 import shutil
 import json
+import tempfile
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func
-from database import SessionLocal
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, func, select
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, get_async_db
 import models
 from models.post import Post
+from models.post_match import PostMatch
 from models.user import User
 from fastapi.responses import JSONResponse
 import logging
@@ -18,6 +22,13 @@ import os
 # Add the parent directory to sys.path to allow absolute imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.ai_matching_inmemory import find_matching_posts, create_match_notifications
+from utils.realtime import hub, notification_event
+from utils.user_cache import aget_user_identity_by_firebase_uid
+from utils.admin_auth import verify_admin_token
+from utils.image_embeddings import image_embedder
+from utils.notifications import lost_found_pair
+from jobs.registry import job_registry
+from jobs.post_import import FORMATS, detect_format, import_posts
 
 logger = logging.getLogger(__name__)
 
@@ -29,13 +40,42 @@ router = APIRouter(
 UPLOAD_DIR = "backend/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def get_db():
+def match_new_post(post_id: int):
+    """
+    Run AI matching for a freshly created post and create notifications for the top match.
+    Embedding is CPU-bound and the matcher uses a sync session, so this runs in a
+    worker thread; returns the realtime payloads for the created notifications.
+    """
     db = SessionLocal()
     try:
-        yield db
+        post = db.query(Post).filter(Post.id == post_id).first()
+        if post is None:
+            return []
+        matches = find_matching_posts(db, post, threshold=0.7)
+        if not matches:
+            return []
+
+        logger.info(f"Found {len(matches)} potential matches")
+        # Create notifications for the top match
+        top_match, score = matches[0]
+        # Posts with a photo are matched again once it is embedded; notify each pair once
+        lost_id, found_id = lost_found_pair(post, top_match)
+        if db.query(PostMatch).filter(PostMatch.lost_post_id == lost_id, PostMatch.found_post_id == found_id).first():
+            return []
+        events = []
+        for notification in create_match_notifications(db, post, top_match, score):
+            if notification is not None:
+                events.append((notification.user_id, notification_event(notification)))
+        logger.info(f"Created match notifications with match score: {score:.2f}")
+        return events
     finally:
         db.close()
 
+async def match_post_photo(post_id: int):
+    """Match a post again once its photo is embedded, now with photo similarity"""
+    for user_id_to_notify, event in await run_in_threadpool(match_new_post, post_id):
+        await hub.publish(user_id_to_notify, "notification.new", event)
+
 def get_cors_headers(request: Request):
     return {
         "Access-Control-Allow-Origin": "*",
@@ -44,10 +84,11 @@ def get_cors_headers(request: Request):
     }
 
 @router.get("/")
-async def get_posts(request: Request, db: Session = Depends(get_db)):
+async def get_posts(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         logger.info("Fetching posts with user information...")
-        posts = db.query(Post).options(joinedload(Post.user)).all()
+        result = await db.execute(select(Post).options(joinedload(Post.user)))
+        posts = result.scalars().all()
         response_data = [{
             "id": post.id,
             "report_type": post.report_type.lower().strip() if post.report_type else None,
@@ -73,16 +114,19 @@ async def get_posts(request: Request, db: Session = Depends(get_db)):
         return JSONResponse(status_code=500, content={"detail": f"Database error: {str(e)}"}, headers=get_cors_headers(request))
 
 @router.get("/search")
-async def search_posts(q: str, db: Session = Depends(get_db), request: Request = None):
+async def search_posts(q: str, db: AsyncSession = Depends(get_async_db), request: Request = None):
     try:
         search_term = f"%{q.lower()}%"
-        posts = db.query(Post).options(joinedload(Post.user)).filter(
-            or_(
-                Post.item_name.ilike(search_term),
-                Post.description.ilike(search_term),
-                Post.location.ilike(search_term)
+        result = await db.execute(
+            select(Post).options(joinedload(Post.user)).where(
+                or_(
+                    Post.item_name.ilike(search_term),
+                    Post.description.ilike(search_term),
+                    Post.location.ilike(search_term)
+                )
             )
-        ).all()
+        )
+        posts = result.scalars().all()
         response_data = [{
             "id": post.id,
             "type": post.report_type.lower().strip() if post.report_type else None,
@@ -114,13 +158,13 @@ async def create_post(
     user_id: str = Form(...),
     verification_questions: str = Form(None),
     image: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     request: Request = None,
 ):
     try:
         logger.info(f"Received report_type: {report_type}")
         # Look up user by Firebase UID instead of email
-        user = db.query(User).filter(User.firebase_uid == user_id).first()
+        user = await aget_user_identity_by_firebase_uid(db, user_id)
         if not user:
             logger.error(f"User not found with firebase_uid: {user_id}")
             return JSONResponse(status_code=404, content={"detail": "User not found"}, headers=get_cors_headers(request))
@@ -158,19 +202,17 @@ async def create_post(
             user_id=user.id,
         )
         db.add(new_post)
-        db.commit()
-        db.refresh(new_post)
+        await db.commit()
+        await db.refresh(new_post)
+
+        if image_path:
+            # Embedded in a worker process, never on this request
+            image_embedder.submit(new_post.id, image_path, normalized_report_type, on_embedded=match_post_photo)
 
         # Find matching posts and create notifications using in-memory AI matching
         logger.info(f"Looking for matching posts for new {normalized_report_type} post...")
-        matches = find_matching_posts(db, new_post, threshold=0.7)
-        
-        if matches:
-            logger.info(f"Found {len(matches)} potential matches")
-            # Create notifications for the top match
-            top_match, similarity = matches[0]
-            create_match_notifications(db, new_post, top_match, similarity)
-            logger.info(f"Created match notifications with similarity score: {similarity:.2f}")
+        for user_id_to_notify, event in await run_in_threadpool(match_new_post, new_post.id):
+            await hub.publish(user_id_to_notify, "notification.new", event)
 
         logger.info(f"Post created successfully by user {user_id} with report_type: {new_post.report_type}")
         return JSONResponse(content={
@@ -196,30 +238,84 @@ async def create_post(
 
     except Exception as e:
         logger.error(f"Error creating post: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return JSONResponse(status_code=500, content={"detail": f"Error creating post: {str(e)}"}, headers=get_cors_headers(request))
 
+@router.post("/import", status_code=202)
+async def import_posts_file(
+    file: UploadFile = File(...),
+    user_id: str = Form(...),
+    report_type: str = Form("found"),
+    format: str = Form(None),
+    match: bool = Form(True),
+    db: AsyncSession = Depends(get_async_db),
+    request: Request = None,
+    _: dict = Depends(verify_admin_token),
+):
+    """
+    Bulk-create posts from a CSV or NDJSON upload (columns: item_name, description,
+    location, contact_details, date, time and optionally report_type), filed under
+    the user with Firebase UID `user_id`. Runs as a background job; poll
+    /api/jobs/{job_id} for progress and the import summary.
+    """
+    try:
+        fmt = (format or detect_format(file.filename, file.content_type)).lower()
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)}, headers=get_cors_headers(request))
+    if fmt not in FORMATS:
+        return JSONResponse(status_code=400, content={"detail": f"format must be one of {', '.join(FORMATS)}"},
+                            headers=get_cors_headers(request))
+    default_report_type = report_type.lower().strip()
+    if default_report_type not in ("lost", "found"):
+        return JSONResponse(status_code=400, content={"detail": "report_type must be 'lost' or 'found'"},
+                            headers=get_cors_headers(request))
+
+    user = await aget_user_identity_by_firebase_uid(db, user_id)
+    if not user:
+        return JSONResponse(status_code=404, content={"detail": "User not found"}, headers=get_cors_headers(request))
+
+    # Copy the upload out in chunks; the job parses it from disk row by row
+    handle, path = tempfile.mkstemp(prefix="post-import-", suffix=f".{fmt}")
+    with os.fdopen(handle, "wb") as buffer:
+        await run_in_threadpool(shutil.copyfileobj, file.file, buffer, 1024 * 1024)
+
+    async def push(job):
+        # Match events are only needed here; keep them out of the job status
+        for user_id_to_notify, event in job.result.pop("events", []):
+            await hub.publish(user_id_to_notify, "notification.new", event)
+
+    job = job_registry.create("post_import", {
+        "filename": file.filename,
+        "format": fmt,
+        "user_id": user.id,
+        "report_type": default_report_type,
+        "match": match
+    })
+    job_registry.start(job, import_posts, path, fmt, user.id, default_report_type, match, on_done=push)
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status},
+                        headers=get_cors_headers(request))
+
 @router.get("/filter")
 async def filter_posts(
     keyword: str = None,
     date: str = None,
     location: str = None,
     type: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     request: Request = None
 ):
     try:
-        query = db.query(Post).options(joinedload(Post.user))
+        query = select(Post).options(joinedload(Post.user))
         if type:
-            query = query.filter(Post.report_type.ilike(type))
+            query = query.where(Post.report_type.ilike(type))
         if keyword:
             keyword_like = f"%{keyword.lower()}%"
-            query = query.filter(or_(
+            query = query.where(or_(
                 Post.item_name.ilike(keyword_like),
                 Post.description.ilike(keyword_like)
             ))
         if location:
-            query = query.filter(Post.location.ilike(f"%{location.lower()}%"))
+            query = query.where(Post.location.ilike(f"%{location.lower()}%"))
         if date and date.strip():
             try:
                 parsed_date_strs = set()
@@ -232,11 +328,11 @@ async def filter_posts(
                     except ValueError:
                         continue
                 if parsed_date_strs:
-                    query = query.filter(or_(*(Post.date == d for d in parsed_date_strs)))
+                    query = query.where(or_(*(Post.date == d for d in parsed_date_strs)))
             except Exception as e:
                 logger.warning(f"Date parse failed: {e}")
 
-        posts = query.all()
+        posts = (await db.execute(query)).scalars().all()
         logger.info(f"Filter params - keyword: {keyword}, date: {date}, location: {location}, type: {type}")
         logger.info(f"Found {len(posts)} posts")
 
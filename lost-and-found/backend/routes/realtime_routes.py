@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from utils.realtime import hub
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/realtime",
+    tags=["realtime"]
+)
+
+# Keep idle connections alive through proxies (Render drops them after ~60s)
+HEARTBEAT_SECONDS = 25
+
+class TypingRequest(BaseModel):
+    from_: int = Field(..., alias="from")
+    to: int
+
+    class Config:
+        allow_population_by_field_name = True
+
+async def _handle_client_event(user_id: int, payload: dict) -> None:
+    """Events a client may send upstream over its WebSocket"""
+    if payload.get("type") == "typing" and payload.get("to") is not None:
+        await hub.publish(int(payload["to"]), "typing", {"from": user_id})
+
+@router.websocket("/ws/{user_id}")
+async def websocket_events(websocket: WebSocket, user_id: int):
+    await websocket.accept()
+    subscription = hub.subscribe(user_id)
+    logger.info(f"WebSocket connected for user {user_id} ({hub.connection_count()} open)")
+
+    async def pump_events():
+        while True:
+            event = await subscription.next_event(timeout=HEARTBEAT_SECONDS)
+            await websocket.send_json(event or {"type": "ping"})
+
+    sender = asyncio.create_task(pump_events())
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                await _handle_client_event(user_id, json.loads(message))
+            except ValueError:
+                logger.warning(f"Ignoring malformed WebSocket frame from user {user_id}")
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error for user {user_id}: {str(e)}")
+    finally:
+        sender.cancel()
+        hub.unsubscribe(subscription)
+        logger.info(f"WebSocket closed for user {user_id}")
+
+@router.get("/events/{user_id}")
+async def sse_events(request: Request, user_id: int):
+    """Server-Sent Events fallback for clients that can't open a WebSocket"""
+    subscription = hub.subscribe(user_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next_event(timeout=HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/typing")
+async def send_typing(payload: TypingRequest):
+    """Typing indicator for SSE clients (WebSocket clients send it in-band)"""
+    await hub.publish(payload.to, "typing", {"from": payload.from_})
+    return {"success": True}
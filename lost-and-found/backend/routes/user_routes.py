@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, Request
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models.user import User
 from models.post import Post
+from utils.user_cache import aget_user_identity_by_email, invalidate_user
 
 from pydantic import BaseModel
 import logging
@@ -49,11 +51,11 @@ async def options_list_users(request: Request):
     )
 
 @router.get("/")
-async def list_users(request: Request, db: Session = Depends(get_db)):
+async def list_users(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all users"""
     logger.info("Fetching all users")
     try:
-        users = db.query(User).all()
+        users = (await db.execute(select(User))).scalars().all()
         return JSONResponse(
             content=[{
                 "id": user.id,
@@ -80,11 +82,11 @@ async def options_user_by_email(request: Request, email: str):
     )
 
 @router.get("/email/{email}")
-async def get_user_by_email(request: Request, email: str, db: Session = Depends(get_db)):
+async def get_user_by_email(request: Request, email: str, db: AsyncSession = Depends(get_async_db)):
     """Get user by email"""
     logger.info(f"Fetching user with email: {email}")
     try:
-        user = db.query(User).filter(User.email == email).first()
+        user = await aget_user_identity_by_email(db, email)
         if not user:
             logger.warning(f"User not found: {email}")
             return JSONResponse(
@@ -99,7 +101,8 @@ async def get_user_by_email(request: Request, email: str, db: Session = Depends(
                 "email": user.email,
                 "username": user.username,
                 "firebase_uid": user.firebase_uid,
-                "is_admin": user.is_admin
+                # Read fresh: the identity cache doesn't hold the admin flag
+                "is_admin": bool(await db.scalar(select(User.is_admin).where(User.id == user.id)))
             },
             headers=get_cors_headers(request)
         )
@@ -119,12 +122,12 @@ async def options_create_user(request: Request):
     )
 
 @router.post("/")
-async def create_user(request: Request, user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(request: Request, user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new user"""
     logger.info(f"Creating user with email: {user.email}")
     try:
         # Check if user with email already exists
-        existing_user = db.query(User).filter(User.email == user.email).first()
+        existing_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
         if existing_user:
             logger.warning(f"User with email already exists: {user.email}")
             return JSONResponse(
@@ -140,8 +143,8 @@ async def create_user(request: Request, user: UserCreate, db: Session = Depends(
             firebase_uid=user.firebase_uid
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         logger.info(f"User created successfully: {user.email}")
         return JSONResponse(
@@ -155,7 +158,7 @@ async def create_user(request: Request, user: UserCreate, db: Session = Depends(
             headers=get_cors_headers(request)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating user: {str(e)}")
         return JSONResponse(
             status_code=500,
@@ -164,11 +167,11 @@ async def create_user(request: Request, user: UserCreate, db: Session = Depends(
         )
 
 @router.delete("/by-email/{email}")
-async def delete_user_by_email(request: Request, email: str, db: Session = Depends(get_db)):
+async def delete_user_by_email(request: Request, email: str, db: AsyncSession = Depends(get_async_db)):
     """Delete user by email"""
     logger.info(f"Attempting to delete user with email: {email}")
     try:
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
         if not user:
             logger.warning(f"User not found for deletion: {email}")
             return JSONResponse(
@@ -177,15 +180,16 @@ async def delete_user_by_email(request: Request, email: str, db: Session = Depen
                 headers=get_cors_headers(request)
             )
         
-        db.delete(user)
-        db.commit()
+        invalidate_user(user)
+        await db.delete(user)
+        await db.commit()
         logger.info(f"User deleted successfully: {email}")
         return JSONResponse(
             content={"message": "User deleted successfully"},
             headers=get_cors_headers(request)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error deleting user: {str(e)}")
         return JSONResponse(
             status_code=500,
@@ -194,12 +198,12 @@ async def delete_user_by_email(request: Request, email: str, db: Session = Depen
         )
 
 @router.get("/search/{email}")
-async def search_user_activity(request: Request, email: str, db: Session = Depends(get_db)):
+async def search_user_activity(request: Request, email: str, db: AsyncSession = Depends(get_async_db)):
     """Search for all activity related to a user's email"""
     logger.info(f"Searching for all activity for email: {email}")
     try:
         # Find user
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
         user_data = None
         if user:
             user_data = {
@@ -213,7 +217,7 @@ async def search_user_activity(request: Request, email: str, db: Session = Depen
         # Find posts by user
         posts = []
         if user:
-            user_posts = db.query(Post).filter(Post.user_id == user.id).all()
+            user_posts = (await db.execute(select(Post).where(Post.user_id == user.id))).scalars().all()
             posts = [
                 {
                     "id": post.id,
@@ -232,7 +236,7 @@ async def search_user_activity(request: Request, email: str, db: Session = Depen
         # Find comments by user
         comments = []
         if user:
-            user_comments = db.query(Comment).filter(Comment.user_id == user.id).all()
+            user_comments = (await db.execute(select(Comment).where(Comment.user_id == user.id))).scalars().all()
             comments = [
                 {
                     "id": comment.id,
@@ -266,12 +270,12 @@ async def options_update_profile(request: Request, email: str):
     )
 
 @router.put("/{email}/profile")
-async def update_user_profile(request: Request, email: str, profile_data: UserProfileUpdate, db: Session = Depends(get_db)):
+async def update_user_profile(request: Request, email: str, profile_data: UserProfileUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update user profile"""
     logger.info(f"Updating profile for user with email: {email}")
     try:
         # Find user by email
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
         if not user:
             logger.warning(f"User not found for profile update: {email}")
             return JSONResponse(
@@ -288,8 +292,8 @@ async def update_user_profile(request: Request, email: str, profile_data: UserPr
         if not hasattr(user, 'photo_url') and profile_data.photoURL is not None:
             # Add column if it doesn't exist in the table
             try:
-                db.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS photo_url VARCHAR(255)")
-                db.commit()
+                await db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS photo_url VARCHAR(255)"))
+                await db.commit()
             except Exception as e:
                 logger.warning(f"Failed to add photo_url column: {str(e)}")
                 
@@ -300,8 +304,8 @@ async def update_user_profile(request: Request, email: str, profile_data: UserPr
             
         if not hasattr(user, 'bio') and profile_data.bio is not None:
             try:
-                db.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT")
-                db.commit()
+                await db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT"))
+                await db.commit()
             except Exception as e:
                 logger.warning(f"Failed to add bio column: {str(e)}")
                 
@@ -311,8 +315,8 @@ async def update_user_profile(request: Request, email: str, profile_data: UserPr
             
         if not hasattr(user, 'phone') and profile_data.phoneNumber is not None:
             try:
-                db.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS phone VARCHAR(20)")
-                db.commit()
+                await db.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS phone VARCHAR(20)"))
+                await db.commit()
             except Exception as e:
                 logger.warning(f"Failed to add phone column: {str(e)}")
                 
@@ -321,8 +325,9 @@ async def update_user_profile(request: Request, email: str, profile_data: UserPr
             user.phone = profile_data.phoneNumber
         
         # Save changes
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user(user)
         
         # Create response with all user fields
         response_data = {
@@ -0,0 +1,57 @@
+import os
+import logging
+from datetime import datetime, timedelta
+import jwt
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+security = HTTPBearer()
+
+# JWT settings; there is deliberately no default, a public one would let anyone mint admin tokens
+SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+ALGORITHM = "HS256"
+ADMIN_TOKEN_HOURS = float(os.getenv("ADMIN_TOKEN_HOURS", "24"))
+
+if not SECRET_KEY:
+    logger.warning("JWT_SECRET_KEY is not set; admin login and admin endpoints are disabled")
+
+
+def _require_secret() -> str:
+    if not SECRET_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Admin authentication is not configured"
+        )
+    return SECRET_KEY
+
+
+def create_admin_token(subject: str) -> str:
+    """Signed admin JWT for the given username"""
+    token_data = {
+        "sub": subject,
+        "is_admin": True,
+        "exp": datetime.utcnow() + timedelta(hours=ADMIN_TOKEN_HOURS)
+    }
+    return jwt.encode(token_data, _require_secret(), algorithm=ALGORITHM)
+
+
+def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    secret = _require_secret()
+    try:
+        payload = jwt.decode(credentials.credentials, secret, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token"
+        )
+    if not payload.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized as admin"
+        )
+    return payload
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from models.post import Post
 from models.user import User
 from models.notification import Notification
+from utils.metrics import timed, EMBEDDING_SECONDS, MATCHING_SECONDS
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,8 @@ def generate_embedding(text: str) -> bytes:
             return None
         
         # Combine item name and description for better matching
-        embedding = model.encode(text).astype(np.float32)
+        with timed(EMBEDDING_SECONDS, "embedding_seconds"):
+            embedding = model.encode(text).astype(np.float32)
         return embedding.tobytes()
     except Exception as e:
         logger.error(f"Error generating embedding: {str(e)}")
@@ -60,6 +62,7 @@ def calculate_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> floa
         logger.error(f"Error calculating similarity: {str(e)}")
         return 0.0
 
+@timed(MATCHING_SECONDS, "matching_seconds")
 def find_matching_posts(
     db: Session, 
     post: Post, 
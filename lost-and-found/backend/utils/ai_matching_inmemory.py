@@ -1,24 +1,49 @@
+import os
+import time
+import threading
 import numpy as np
 import logging
 from sentence_transformers import SentenceTransformer
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterable
 from sqlalchemy.orm import Session
 from models.post import Post
 from models.user import User
 from models.notification import Notification
+from utils.notifications import refresh_unread_counts, record_post_matches, lost_found_pair
+from utils.user_cache import get_user_identities
+from utils.metrics import timed, EMBEDDING_SECONDS, MATCHING_SECONDS
+from utils.embedding_store import post_embeddings, post_image_embeddings, on_post_invalidated, EMBEDDING_MODEL_NAME
+from utils.image_embeddings import image_embedder, IMAGE_MATCH_WEIGHT
+from utils.match_ranking import MATCH_RERANK, rerank
+from utils.ann_index import (
+    AnnIndex, MATCHING_INDEX, MATCHING_INDEX_DIR, MATCHING_ANN_CANDIDATES, MATCHING_INDEX_SAVE_SECONDS,
+    MATCHING_INDEX_RESCAN_IDS,
+    create_index, index_kind, load_index
+)
 
 logger = logging.getLogger(__name__)
 
 # Initialize the SBERT model
 try:
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
     logger.info("SBERT model loaded successfully")
 except Exception as e:
     logger.error(f"Error loading SBERT model: {str(e)}")
     model = None
 
-# In-memory cache for embeddings (post_id -> embedding)
-embedding_cache = {}
+# Normalized post embeddings: a bounded slab per process, or a matrix shared
+# by all workers when EMBEDDING_SHARED_PATH is set (see utils/embedding_store.py)
+embedding_cache = post_embeddings
+
+# Per report type ANN index when MATCHING_INDEX is "hnsw" or "ivf"; loaded from
+# MATCHING_INDEX_DIR on first use and caught up with newer posts on every query
+post_indexes: Dict[str, AnnIndex] = {}
+# The same per report type for photo embeddings (see synced_image_index)
+image_indexes: Dict[str, AnnIndex] = {}
+# Image indexes changed since they were last saved
+_image_index_dirty = set()
+_index_saved_at: Dict[str, float] = {}
+_index_lock = threading.Lock()
 
 def generate_embedding(text: str) -> np.ndarray:
     """Generate embedding for a text using SBERT model"""
@@ -27,7 +52,8 @@ def generate_embedding(text: str) -> np.ndarray:
             logger.error("SBERT model not loaded")
             return None
         
-        embedding = model.encode(text).astype(np.float32)
+        with timed(EMBEDDING_SECONDS, "embedding_seconds"):
+            embedding = model.encode(text).astype(np.float32)
         return embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {str(e)}")
@@ -52,23 +78,193 @@ def calculate_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> floa
         logger.error(f"Error calculating similarity: {str(e)}")
         return 0.0
 
+def generate_embeddings(texts: List[str]) -> np.ndarray:
+    """Encode several texts in one batched model call"""
+    try:
+        if model is None:
+            logger.error("SBERT model not loaded")
+            return None
+
+        with timed(EMBEDDING_SECONDS, "embedding_seconds"):
+            embeddings = model.encode(texts, batch_size=32).astype(np.float32)
+        return embeddings
+    except Exception as e:
+        logger.error(f"Error generating embeddings: {str(e)}")
+        return None
+
 def cache_post_embedding(post_id: int, text: str) -> None:
     """Generate and cache embedding for a post"""
     embedding = generate_embedding(text)
     if embedding is not None:
-        embedding_cache[post_id] = embedding
+        embedding_cache.put(post_id, embedding)
         logger.info(f"Cached embedding for post {post_id}")
 
+def candidate_embeddings(posts: List[Post]) -> Tuple[List[int], np.ndarray]:
+    """
+    Normalized embeddings of posts as (ids, matrix); posts missing from the
+    cache are encoded in one batch and scored from the fresh vectors in case
+    the cache evicts them again
+    """
+    missing = [p for p in posts if p.id not in embedding_cache]
+    missing_ids = {p.id for p in missing}
+    fresh = None
+    fresh_ids = []
+    if missing:
+        embeddings = generate_embeddings([f"{p.item_name} {p.description}" for p in missing])
+        if embeddings is not None:
+            embedding_cache.put_many([p.id for p in missing], embeddings)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            keep = norms[:, 0] > 0
+            fresh = embeddings[keep] / norms[keep]
+            fresh_ids = [p.id for p, k in zip(missing, keep) if k]
+
+    cached_ids, cached = embedding_cache.get_many(p.id for p in posts if p.id not in missing_ids)
+    if fresh is None or not fresh_ids:
+        return cached_ids, cached
+    if not cached_ids:
+        return fresh_ids, fresh
+    return cached_ids + fresh_ids, np.vstack([cached, fresh])
+
+def image_similarities(post: Post, candidates: Iterable[Post]) -> Dict[int, float]:
+    """
+    Photo cosine similarity of post against the candidates with photos, by
+    exact scan (the ANN matcher uses synced_image_index instead). Empty
+    until the post's own photo is embedded; candidates whose photo embedding
+    is missing are queued for embedding and scored on text alone meanwhile.
+    """
+    if not post.image_path:
+        return {}
+    query = post_image_embeddings.get(post.id)
+    if query is None:
+        image_embedder.submit(post.id, post.image_path, post.report_type)
+        return {}
+    candidates = [c for c in candidates if c.image_path and c.id != post.id]
+    ids, matrix = post_image_embeddings.get_many(c.id for c in candidates)
+    present = set(ids)
+    for c in candidates:
+        if c.id not in present:
+            image_embedder.submit(c.id, c.image_path, c.report_type)
+    if not ids:
+        return {}
+    return dict(zip(ids, (matrix @ query).tolist()))
+
+def fuse_image_scores(ids: List[int], text_scores: np.ndarray, image_scores: Dict[int, float]) -> np.ndarray:
+    """Text scores blended with photo scores (IMAGE_MATCH_WEIGHT) where both posts have a photo"""
+    if not image_scores:
+        return text_scores
+    image = np.array([image_scores.get(post_id, np.nan) for post_id in ids], dtype=np.float32)
+    fused = (1 - IMAGE_MATCH_WEIGHT) * text_scores + IMAGE_MATCH_WEIGHT * np.nan_to_num(image)
+    return np.where(np.isnan(image), text_scores, fused)
+
+def index_path(report_type: str, kind: str) -> str:
+    return os.path.join(MATCHING_INDEX_DIR, f"{report_type}-{kind}.npz")
+
+def synced_index(db: Session, report_type: str, dim: int) -> AnnIndex:
+    """
+    The ANN index of report_type posts, caught up with posts created by any
+    worker: every sync re-checks the ids from MATCHING_INDEX_RESCAN_IDS below
+    the highest indexed one and adds the posts the index doesn't hold
+    """
+    with _index_lock:
+        index = post_indexes.get(report_type)
+        if index is None:
+            kind = index_kind(MATCHING_INDEX)
+            index = load_index(index_path(report_type, kind), kind, dim) or create_index(kind, dim)
+            post_indexes[report_type] = index
+            _index_saved_at[report_type] = time.monotonic()
+
+        recent_ids = db.query(Post.id).filter(
+            Post.report_type == report_type, Post.id > index.last_post_id - MATCHING_INDEX_RESCAN_IDS
+        ).all()
+        missing = [row.id for row in recent_ids if row.id not in index.label_of]
+        new_posts = []
+        for start in range(0, len(missing), 1000):
+            new_posts.extend(db.query(Post).filter(Post.id.in_(missing[start:start + 1000])).all())
+        ids, matrix = candidate_embeddings(new_posts) if new_posts else ([], None)
+        if ids:
+            index.add(ids, matrix)
+            # Only posts actually added count; ones whose embedding failed are retried next sync
+            index.last_post_id = max(index.last_post_id, max(ids))
+            logger.info(f"Added {len(ids)} {report_type} posts to the {index.kind} index ({len(index)} total)")
+            if time.monotonic() - _index_saved_at[report_type] >= MATCHING_INDEX_SAVE_SECONDS or len(ids) > 1000:
+                try:
+                    index.save(index_path(report_type, index.kind))
+                except Exception as e:
+                    logger.error(f"Error saving {report_type} index: {str(e)}")
+                _index_saved_at[report_type] = time.monotonic()
+        return index
+
+def synced_image_index(db: Session, report_type: str, dim: int) -> AnnIndex:
+    """
+    The ANN index of report_type post photos. The image embedder adds photos
+    as it embeds them (add_to_image_indexes); each sync re-checks the photo
+    posts from MATCHING_INDEX_RESCAN_IDS below the highest indexed id, adding
+    the ones already in post_image_embeddings and queueing the rest
+    """
+    key = f"{report_type}-image"
+    with _index_lock:
+        index = image_indexes.get(report_type)
+        if index is None:
+            kind = index_kind(MATCHING_INDEX)
+            index = load_index(index_path(key, kind), kind, dim) or create_index(kind, dim)
+            image_indexes[report_type] = index
+            _index_saved_at[key] = time.monotonic()
+
+        recent = db.query(Post.id, Post.image_path).filter(
+            Post.report_type == report_type,
+            Post.image_path.isnot(None),
+            Post.id > index.last_post_id - MATCHING_INDEX_RESCAN_IDS
+        ).all()
+        missing = [row for row in recent if row.id not in index.label_of]
+        ids, matrix = post_image_embeddings.get_many(row.id for row in missing)
+        present = set(ids)
+        for row in missing:
+            if row.id not in present:
+                image_embedder.submit(row.id, row.image_path, report_type)
+        if ids:
+            index.add(ids, matrix)
+            index.last_post_id = max(index.last_post_id, max(ids))
+            _image_index_dirty.add(report_type)
+        if report_type in _image_index_dirty and time.monotonic() - _index_saved_at[key] >= MATCHING_INDEX_SAVE_SECONDS:
+            _image_index_dirty.discard(report_type)
+            try:
+                index.save(index_path(key, index.kind))
+            except Exception as e:
+                logger.error(f"Error saving {report_type} image index: {str(e)}")
+            _index_saved_at[key] = time.monotonic()
+        return index
+
+def add_to_image_indexes(report_type: str, post_ids: List[int], vectors: List[np.ndarray]) -> None:
+    """Image embedder listener: freshly embedded photos are searchable right away"""
+    with _index_lock:
+        index = image_indexes.get(report_type)
+        # Not loaded yet: the first sync finds the vectors in post_image_embeddings
+        if index is None or index.dim != len(vectors[0]):
+            return
+        index.add(post_ids, np.vstack(vectors))
+        index.last_post_id = max(index.last_post_id, max(post_ids))
+        _image_index_dirty.add(report_type)
+
+def remove_from_indexes(post_id: int) -> None:
+    for index in list(post_indexes.values()) + list(image_indexes.values()):
+        index.remove(post_id)
+
+on_post_invalidated(remove_from_indexes)
+image_embedder.on_batch(add_to_image_indexes)
+
+@timed(MATCHING_SECONDS, "matching_seconds")
 def find_matching_posts(
     db: Session, 
     post: Post, 
     threshold: float = 0.7
 ) -> List[Tuple[Post, float]]:
     """
-    Find matching posts of the opposite type (lost/found) based on embeddings
-    Returns a list of (post, similarity_score) tuples
+    Find matching posts of the opposite type (lost/found) based on embeddings,
+    text blended with photo similarity where both posts have an embedded
+    photo; with MATCH_RERANK the best of them are re-scored with location and time
+    (see utils/match_ranking.py). Returns a list of (post, score) tuples
     """
-    # Generate embedding for the current post if not in cache
+    # Always re-embed the current post, its text may have changed
     post_text = f"{post.item_name} {post.description}"
     current_embedding = generate_embedding(post_text)
     
@@ -76,56 +272,150 @@ def find_matching_posts(
         logger.warning(f"Could not generate embedding for post {post.id}")
         return []
     
-    # Cache the embedding
-    embedding_cache[post.id] = current_embedding
+    norm = np.linalg.norm(current_embedding)
+    if norm == 0:
+        return []
+    embedding_cache.put(post.id, current_embedding)
+    current_embedding = current_embedding / norm
     
     # Determine which type of posts to search for
     search_type = "found" if post.report_type.lower() == "lost" else "lost"
     
     try:
+        if MATCHING_INDEX != "exact":
+            return find_matching_posts_ann(db, post, current_embedding, search_type, threshold)
+
         # Get all posts of the opposite type
-        opposite_posts = db.query(Post).filter(Post.report_type == search_type).all()
+        opposite_posts = [
+            p for p in db.query(Post).filter(Post.report_type == search_type).all() if p.id != post.id
+        ]
         
         if not opposite_posts:
             logger.info(f"No {search_type} posts found to match against")
             return []
         
-        matches = []
-        for other_post in opposite_posts:
-            # Skip if it's the same post
-            if other_post.id == post.id:
-                continue
-                
-            # Get or generate embedding for the other post
-            if other_post.id in embedding_cache:
-                other_embedding = embedding_cache[other_post.id]
-            else:
-                other_text = f"{other_post.item_name} {other_post.description}"
-                other_embedding = generate_embedding(other_text)
-                if other_embedding is not None:
-                    embedding_cache[other_post.id] = other_embedding
-            
-            if other_embedding is None:
-                continue
-                
-            similarity = calculate_similarity(current_embedding, other_embedding)
-            
-            if similarity >= threshold:
-                matches.append((other_post, similarity))
+        by_id = {p.id: p for p in opposite_posts}
+        ids, matrix = candidate_embeddings(opposite_posts)
+        if not ids:
+            return []
+        
+        # Cosine similarity of every candidate at once; stored rows are unit length
+        similarities = fuse_image_scores(ids, matrix @ current_embedding, image_similarities(post, opposite_posts))
+        matches = [
+            (by_id[post_id], float(similarity))
+            for post_id, similarity in zip(ids, similarities)
+            if similarity >= threshold
+        ]
         
         # Sort by similarity score (highest first)
         matches.sort(key=lambda x: x[1], reverse=True)
-        return matches
+        return rerank(post, matches) if MATCH_RERANK else matches
         
     except Exception as e:
         logger.error(f"Error finding matching posts: {str(e)}")
         return []
 
+def find_matching_posts_ann(
+    db: Session,
+    post: Post,
+    current_embedding: np.ndarray,
+    search_type: str,
+    threshold: float
+) -> List[Tuple[Post, float]]:
+    """
+    Like the exact scan, but only the MATCHING_ANN_CANDIDATES nearest posts by
+    text, and as many by photo, are scored and loaded
+    """
+    index = synced_index(db, search_type, current_embedding.shape[0])
+    ids, scores = index.search(current_embedding, MATCHING_ANN_CANDIDATES)
+    text_scores = {post_id: score for post_id, score in zip(ids, scores) if post_id != post.id}
+
+    # Photo neighbours from the second index; text candidates outside them are scored on text
+    image_scores = {}
+    if post.image_path:
+        photo = post_image_embeddings.get(post.id)
+        if photo is None:
+            image_embedder.submit(post.id, post.image_path, post.report_type)
+        else:
+            photo_ids, photo_scores = synced_image_index(db, search_type, photo.shape[0]).search(
+                photo, MATCHING_ANN_CANDIDATES
+            )
+            image_scores = {post_id: score for post_id, score in zip(photo_ids, photo_scores) if post_id != post.id}
+    nearest_by_photo = list(image_scores)
+
+    # Deleted posts may still be in a reloaded index; loading by id drops them
+    wanted = set(text_scores) | set(nearest_by_photo)
+    if not wanted:
+        return []
+    posts = {p.id: p for p in db.query(Post).filter(Post.id.in_(list(wanted))).all()}
+    # Posts found by photo alone still need their text score
+    photo_only = [posts[post_id] for post_id in nearest_by_photo if post_id in posts and post_id not in text_scores]
+    if photo_only:
+        extra_ids, extra = candidate_embeddings(photo_only)
+        text_scores.update(zip(extra_ids, (extra @ current_embedding).tolist()))
+
+    ids = [post_id for post_id in text_scores if post_id in posts]
+    fused = fuse_image_scores(ids, np.array([text_scores[post_id] for post_id in ids], dtype=np.float32), image_scores)
+    matches = [(posts[post_id], float(score)) for post_id, score in zip(ids, fused) if score >= threshold]
+    matches.sort(key=lambda x: x[1], reverse=True)
+    return rerank(post, matches) if MATCH_RERANK else matches
+
+def build_match_notifications(
+    current_post: Post,
+    matched_post: Post,
+    match_score: float,
+    current_user_id: int,
+    matched_user_id: int
+) -> Tuple[Notification, Notification]:
+    """
+    The pair of unsaved match notifications for the owners of both posts;
+    match_score is the ranking score (text, location, time and photo), not
+    the text similarity alone
+    """
+    # Create notification for the current post's user
+    if current_post.report_type.lower() == "lost":
+        current_title = "Potential match for your lost item"
+        current_message = f"We found a potential match for your lost item '{current_post.item_name}'. Someone reported finding a '{matched_post.item_name}' with a {int(match_score * 100)}% match score."
+        current_type = "match_lost"
+    else:
+        current_title = "Potential match for your found item"
+        current_message = f"We found a potential match for your found item '{current_post.item_name}'. Someone reported losing a '{matched_post.item_name}' with a {int(match_score * 100)}% match score."
+        current_type = "match_found"
+        
+    current_notification = Notification(
+        user_id=current_user_id,
+        title=current_title,
+        message=current_message,
+        type=current_type,
+        is_read=False,
+        related_post_id=matched_post.id
+    )
+    
+    # Create notification for the matched post's user
+    if matched_post.report_type.lower() == "lost":
+        matched_title = "Potential match for your lost item"
+        matched_message = f"We found a potential match for your lost item '{matched_post.item_name}'. Someone reported finding a '{current_post.item_name}' with a {int(match_score * 100)}% match score."
+        matched_type = "match_lost"
+    else:
+        matched_title = "Potential match for your found item"
+        matched_message = f"We found a potential match for your found item '{matched_post.item_name}'. Someone reported losing a '{current_post.item_name}' with a {int(match_score * 100)}% match score."
+        matched_type = "match_found"
+        
+    matched_notification = Notification(
+        user_id=matched_user_id,
+        title=matched_title,
+        message=matched_message,
+        type=matched_type,
+        is_read=False,
+        related_post_id=current_post.id
+    )
+    return current_notification, matched_notification
+
 def create_match_notifications(
     db: Session, 
     current_post: Post, 
     matched_post: Post, 
-    similarity_score: float
+    match_score: float
 ) -> Tuple[Notification, Notification]:
     """
     Create notifications for both users when a match is found
@@ -133,54 +423,25 @@ def create_match_notifications(
     """
     try:
         # Get users
-        current_user = db.query(User).filter(User.id == current_post.user_id).first()
-        matched_user = db.query(User).filter(User.id == matched_post.user_id).first()
+        users = get_user_identities(db, [current_post.user_id, matched_post.user_id])
+        current_user = users.get(current_post.user_id)
+        matched_user = users.get(matched_post.user_id)
         
         if not current_user or not matched_user:
             logger.error(f"User not found for post match notification")
             return None, None
         
-        # Create notification for the current post's user
-        if current_post.report_type.lower() == "lost":
-            current_title = "Potential match for your lost item"
-            current_message = f"We found a potential match for your lost item '{current_post.item_name}'. Someone reported finding a '{matched_post.item_name}' with {int(similarity_score * 100)}% similarity."
-            current_type = "match_lost"
-        else:
-            current_title = "Potential match for your found item"
-            current_message = f"We found a potential match for your found item '{current_post.item_name}'. Someone reported losing a '{matched_post.item_name}' with {int(similarity_score * 100)}% similarity."
-            current_type = "match_found"
-            
-        current_notification = Notification(
-            user_id=current_user.id,
-            title=current_title,
-            message=current_message,
-            type=current_type,
-            is_read=False,
-            related_post_id=matched_post.id
-        )
-        
-        # Create notification for the matched post's user
-        if matched_post.report_type.lower() == "lost":
-            matched_title = "Potential match for your lost item"
-            matched_message = f"We found a potential match for your lost item '{matched_post.item_name}'. Someone reported finding a '{current_post.item_name}' with {int(similarity_score * 100)}% similarity."
-            matched_type = "match_lost"
-        else:
-            matched_title = "Potential match for your found item"
-            matched_message = f"We found a potential match for your found item '{matched_post.item_name}'. Someone reported losing a '{current_post.item_name}' with {int(similarity_score * 100)}% similarity."
-            matched_type = "match_found"
-            
-        matched_notification = Notification(
-            user_id=matched_user.id,
-            title=matched_title,
-            message=matched_message,
-            type=matched_type,
-            is_read=False,
-            related_post_id=current_post.id
+        current_notification, matched_notification = build_match_notifications(
+            current_post, matched_post, match_score, current_user.id, matched_user.id
         )
         
         # Add notifications to database
         db.add(current_notification)
         db.add(matched_notification)
+        db.flush()
+        db.execute(refresh_unread_counts(db.bind, [current_user.id, matched_user.id]))
+        for stmt in record_post_matches(db.bind, [(*lost_found_pair(current_post, matched_post), match_score)]):
+            db.execute(stmt)
         db.commit()
         
         logger.info(f"Created match notifications for users {current_user.id} and {matched_user.id}")
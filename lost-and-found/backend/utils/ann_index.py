@@ -0,0 +1,376 @@
+import os
+import json
+import importlib.util
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "exact" scores every candidate (the default), "hnsw" needs faiss-cpu, "ivf" is pure NumPy
+MATCHING_INDEX = os.getenv("MATCHING_INDEX", "exact").lower()
+MATCHING_INDEX_DIR = os.getenv(
+    "MATCHING_INDEX_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ann")
+)
+# Nearest neighbours fetched per query before the similarity threshold is applied
+MATCHING_ANN_CANDIDATES = int(os.getenv("MATCHING_ANN_CANDIDATES", "50"))
+MATCHING_INDEX_SAVE_SECONDS = float(os.getenv("MATCHING_INDEX_SAVE_SECONDS", "300"))
+# Posts this far below last_post_id are re-checked on every sync: ids are handed out
+# before commit, so a lower id can become visible after a higher one was indexed
+MATCHING_INDEX_RESCAN_IDS = int(os.getenv("MATCHING_INDEX_RESCAN_IDS", "1000"))
+
+# HNSW: more links (M) and a wider search beam (efSearch) raise recall and latency
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# IVF: nlist clusters (0 picks about 4 * sqrt(n)), nprobe of them scanned per query
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+# Below this many vectors an IVF index is a plain exact scan
+IVF_TRAIN_MIN = int(os.getenv("IVF_TRAIN_MIN", "1024"))
+
+# Rebuild once this fraction of labels belongs to deleted or re-embedded posts
+ANN_COMPACT_RATIO = float(os.getenv("ANN_COMPACT_RATIO", "0.2"))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class AnnIndex:
+    """
+    Inner-product nearest neighbour index over normalized post embeddings.
+    Vectors get sequential labels; deleting or re-adding a post only marks its
+    old label dead (HNSW graphs cannot drop nodes), dead hits are filtered at
+    search time and the index is rebuilt from its live vectors once
+    ANN_COMPACT_RATIO of the labels are dead. last_post_id is the highest post
+    id added, so a reloaded index only needs the posts after (or shortly
+    before) it.
+    """
+    kind = None
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.labels = np.zeros(0, dtype=np.int64)  # label -> post id, -1 once dead
+        self.label_of: Dict[int, int] = {}  # post id -> live label
+        self.dead = 0
+        self.last_post_id = 0
+        self._lock = threading.RLock()
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self.label_of)
+
+    @property
+    def nbytes(self) -> int:
+        return self.labels.nbytes + self._nbytes()
+
+    def add(self, post_ids: List[int], vectors: np.ndarray) -> None:
+        latest = {post_id: row for row, post_id in enumerate(post_ids)}
+        if not latest:
+            return
+        vectors = normalize(vectors)[list(latest.values())]
+        with self._lock:
+            for post_id in latest:
+                self._kill_locked(post_id)
+            start = len(self.labels)
+            self.labels = np.concatenate([self.labels, np.fromiter(latest, dtype=np.int64, count=len(latest))])
+            for offset, post_id in enumerate(latest):
+                self.label_of[post_id] = start + offset
+            self._add(vectors)
+            self._maybe_compact_locked()
+
+    def remove(self, post_id: int) -> None:
+        with self._lock:
+            if self._kill_locked(post_id):
+                self._maybe_compact_locked()
+
+    def search(self, vector: np.ndarray, k: int) -> Tuple[List[int], List[float]]:
+        """Up to k (post ids, cosine similarities), best first"""
+        query = normalize(vector)
+        with self._lock:
+            total = len(self.labels)
+            if not self.label_of or k <= 0:
+                return [], []
+            fetch = min(total, 2 * k)
+            while True:
+                scores, labels = self._search(query, fetch)
+                found = labels >= 0
+                post_ids = self.labels[labels[found]]
+                scores = scores[found]
+                live = post_ids >= 0
+                # Widen the search only when dead labels crowded out live ones
+                if live.sum() >= k or fetch >= total or len(labels) < fetch:
+                    break
+                fetch = min(total, fetch * 2)
+            return post_ids[live][:k].tolist(), scores[live][:k].tolist()
+
+    def save(self, path: str) -> None:
+        """Write the whole index to one file, replaced atomically"""
+        with self._lock:
+            payload = self._state()
+            payload["labels"] = self.labels
+            payload["meta"] = np.array(json.dumps({
+                "kind": self.kind, "dim": self.dim, "dead": self.dead, "last_post_id": self.last_post_id
+            }))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **payload)
+        os.replace(tmp_path, path)
+
+    def _kill_locked(self, post_id: int) -> bool:
+        label = self.label_of.pop(post_id, None)
+        if label is None:
+            return False
+        self.labels[label] = -1
+        self.dead += 1
+        return True
+
+    def _maybe_compact_locked(self) -> None:
+        if not self.dead or self.dead <= ANN_COMPACT_RATIO * len(self.labels):
+            return
+        live = np.flatnonzero(self.labels >= 0)
+        vectors = self._vectors(live)
+        post_ids = self.labels[live]
+        logger.info(f"Rebuilding {self.kind} index: {len(live)} live of {len(self.labels)} labels")
+        self._reset()
+        self.labels = post_ids.copy()
+        self.label_of = {post_id: label for label, post_id in enumerate(post_ids.tolist())}
+        self.dead = 0
+        if len(live):
+            self._add(vectors)
+
+    # Implemented per index type
+    def _reset(self) -> None:
+        raise NotImplementedError
+
+    def _add(self, vectors: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def _search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def _vectors(self, labels: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _nbytes(self) -> int:
+        raise NotImplementedError
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def _restore(self, data) -> None:
+        raise NotImplementedError
+
+
+class HnswIndex(AnnIndex):
+    """FAISS HNSW graph: search cost grows logarithmically with the corpus"""
+    kind = "hnsw"
+
+    def __init__(self, dim: int, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH):
+        import faiss
+        self.faiss = faiss
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        super().__init__(dim)
+
+    def _reset(self):
+        self.index = self.faiss.IndexHNSWFlat(self.dim, self.m, self.faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efConstruction = self.ef_construction
+        self.index.hnsw.efSearch = self.ef_search
+
+    def _add(self, vectors):
+        self.index.add(vectors)
+
+    def _search(self, query, k):
+        # The beam must be at least as wide as the number of results
+        self.index.hnsw.efSearch = max(self.ef_search, k)
+        scores, labels = self.index.search(query, k)
+        return scores[0], labels[0]
+
+    def _vectors(self, labels):
+        return self.index.reconstruct_n(0, self.index.ntotal)[labels]
+
+    def _nbytes(self):
+        # Vectors plus graph links, as serialized
+        return self.faiss.serialize_index(self.index).nbytes
+
+    def _state(self):
+        return {"index": self.faiss.serialize_index(self.index)}
+
+    def _restore(self, data):
+        self.index = self.faiss.deserialize_index(data["index"])
+        self.index.hnsw.efSearch = self.ef_search
+
+
+class IvfIndex(AnnIndex):
+    """
+    Pure NumPy inverted file: spherical k-means clusters, and a query scans
+    only the vectors of its nprobe closest clusters (about nprobe / nlist of
+    the corpus). Retrained when the corpus has grown 4x since training.
+    """
+    kind = "ivf"
+
+    def __init__(self, dim: int, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, train_min: int = IVF_TRAIN_MIN):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_min = train_min
+        super().__init__(dim)
+
+    def _reset(self):
+        self.data = np.zeros((1024, self.dim), dtype=np.float32)
+        self.size = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.zeros(0, dtype=np.int64)
+        self.lists: List[List[int]] = []
+        self.trained_size = 0
+
+    def _add(self, vectors):
+        if self.size + len(vectors) > len(self.data):
+            grown = np.zeros((max(2 * len(self.data), self.size + len(vectors)), self.dim), dtype=np.float32)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        start = self.size
+        self.data[start:start + len(vectors)] = vectors
+        self.size += len(vectors)
+
+        if self.centroids is None and self.size >= self.train_min or \
+                self.centroids is not None and self.size >= 4 * self.trained_size:
+            self._train()
+        elif self.centroids is not None:
+            assign = _nearest(vectors, self.centroids)
+            self.assign = np.concatenate([self.assign, assign])
+            for offset, cluster in enumerate(assign.tolist()):
+                self.lists[cluster].append(start + offset)
+
+    def _train(self):
+        vectors = self.data[:self.size]
+        nlist = self.nlist or int(4 * np.sqrt(self.size))
+        # At least ~39 training points per cluster, as FAISS recommends
+        nlist = max(1, min(nlist, self.size // 39))
+        self.centroids = _spherical_kmeans(vectors, nlist)
+        self.assign = _nearest(vectors, self.centroids)
+        self._build_lists()
+        self.trained_size = self.size
+        logger.info(f"Trained IVF index: {nlist} clusters over {self.size} vectors")
+
+    def _build_lists(self):
+        self.lists = [[] for _ in range(len(self.centroids))]
+        for label, cluster in enumerate(self.assign.tolist()):
+            self.lists[cluster].append(label)
+
+    def _search(self, query, k):
+        if self.centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            probe = np.argsort(-(self.centroids @ query[0]))[:self.nprobe]
+            candidates = np.concatenate([np.asarray(self.lists[c], dtype=np.int64) for c in probe])
+        scores = self.data[candidates] @ query[0]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top])]
+        return scores[order], candidates[order]
+
+    def _vectors(self, labels):
+        return self.data[labels]
+
+    def _nbytes(self):
+        return self.data.nbytes + self.assign.nbytes + sum(8 * len(members) for members in self.lists)
+
+    def _state(self):
+        return {
+            "vectors": self.data[:self.size],
+            "centroids": self.centroids if self.centroids is not None else np.zeros((0, self.dim), dtype=np.float32),
+            "assign": self.assign,
+            "trained_size": np.array(self.trained_size)
+        }
+
+    def _restore(self, data):
+        vectors = data["vectors"]
+        self.data = np.zeros((max(1024, 2 * len(vectors)), self.dim), dtype=np.float32)
+        self.data[:len(vectors)] = vectors
+        self.size = len(vectors)
+        self.trained_size = int(data["trained_size"])
+        if len(data["centroids"]):
+            self.centroids = data["centroids"]
+            self.assign = data["assign"]
+            self._build_lists()
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 4096) -> np.ndarray:
+    """Index of the most similar centroid per vector, in chunks to bound memory"""
+    return np.concatenate([
+        np.argmax(vectors[i:i + chunk] @ centroids.T, axis=1) for i in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+def _spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, sample: int = 50000) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = np.bincount(assign, minlength=k) > 0
+        # Empty clusters keep their previous centroid
+        centroids[filled] = normalize(sums[filled])
+    return centroids
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (HnswIndex, IvfIndex)}
+
+# Checked once here: a typo would otherwise fail every query inside the matcher's error handling
+if MATCHING_INDEX != "exact" and MATCHING_INDEX not in INDEX_TYPES:
+    logger.warning(
+        f"Unknown MATCHING_INDEX {MATCHING_INDEX!r} (expected exact, {', '.join(INDEX_TYPES)}), using exact search"
+    )
+    MATCHING_INDEX = "exact"
+
+
+def index_kind(kind: str) -> str:
+    """The index type actually used for kind: HNSW falls back to IVF without faiss"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    if kind == "hnsw" and importlib.util.find_spec("faiss") is None:
+        logger.warning("faiss is not installed, falling back to the NumPy IVF index")
+        return "ivf"
+    return kind
+
+
+def create_index(kind: str, dim: int) -> AnnIndex:
+    return INDEX_TYPES[index_kind(kind)](dim)
+
+
+def load_index(path: str, kind: str, dim: int) -> Optional[AnnIndex]:
+    """Index saved at path, or None if missing, unreadable or built for another kind/dimension"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["kind"] != kind or meta["dim"] != dim:
+                logger.info(f"Ignoring {path}: built as {meta['kind']}/{meta['dim']}")
+                return None
+            index = INDEX_TYPES[kind](dim)
+            index._restore(data)
+            index.labels = data["labels"]
+        index.label_of = {post_id: label for label, post_id in enumerate(index.labels.tolist()) if post_id >= 0}
+        index.dead = meta["dead"]
+        index.last_post_id = meta["last_post_id"]
+        logger.info(f"Loaded {kind} index from {path}: {len(index)} posts")
+        return index
+    except Exception as e:
+        logger.error(f"Error loading index {path}: {str(e)}")
+        return None
@@ -0,0 +1,73 @@
+from typing import Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+def conversation_key(user_a: int, user_b: int) -> str:
+    """Order-independent key shared by both directions of a chat"""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"{low}:{high}"
+
+def encode_cursor(message: dict) -> str:
+    """Build a pagination cursor from a message's timestamp and id"""
+    return f"{message['timestamp']}|{message['_id']}"
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, ObjectId]]:
+    """Split a cursor back into (timestamp, ObjectId), or None if malformed"""
+    try:
+        timestamp, message_id = cursor.rsplit("|", 1)
+        return timestamp, ObjectId(message_id)
+    except (ValueError, InvalidId):
+        return None
+
+async def record_message(conversations, message: dict) -> None:
+    """Fold a newly stored message into its conversation summary"""
+    sender_id = message["sender_id"]
+    receiver_id = message["receiver_id"]
+    await conversations.update_one(
+        {"_id": message["conversation_key"]},
+        {
+            "$set": {
+                "last_message": message["content"],
+                "last_sender_id": sender_id,
+                "timestamp": message["timestamp"],
+                "post_id": message.get("post_id"),
+                f"names.{sender_id}": message.get("sender_name"),
+                f"names.{receiver_id}": message.get("receiver_name"),
+            },
+            "$setOnInsert": {
+                "participants": sorted((sender_id, receiver_id)),
+                f"unread.{sender_id}": 0,
+            },
+            "$inc": {f"unread.{receiver_id}": 1},
+        },
+        upsert=True
+    )
+
+async def mark_conversation_read(conversations, user_id: int, other_user_id: int, count: int) -> None:
+    """
+    Take count messages off the user's unread counter for a conversation,
+    never below 0; messages recorded since they were marked read stay counted
+    """
+    if count <= 0:
+        return
+    unread = f"unread.{user_id}"
+    await conversations.update_one(
+        {"_id": conversation_key(user_id, other_user_id)},
+        [{"$set": {unread: {"$max": [0, {"$subtract": [{"$ifNull": [f"${unread}", 0]}, count]}]}}}]
+    )
+
+def summary_for(conversation: dict, user_id: int) -> dict:
+    """Shape a stored conversation summary as one inbox entry for user_id"""
+    other_id = next(
+        (p for p in conversation["participants"] if p != user_id),
+        user_id
+    )
+    return {
+        "_id": str(other_id),
+        "last_message": conversation.get("last_message"),
+        "timestamp": conversation.get("timestamp"),
+        "username": conversation.get("names", {}).get(str(other_id)),
+        "userId": other_id,
+        "postId": conversation.get("post_id"),
+        "unread": conversation.get("unread", {}).get(str(user_id), 0),
+    }
@@ -0,0 +1,194 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# float16 halves memory; cosine scores move by well under 0.001
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+# Hard cap on the slab; the least recently used rows are evicted beyond it
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+EMBEDDING_CACHE_INITIAL_ROWS = int(os.getenv("EMBEDDING_CACHE_INITIAL_ROWS", "1024"))
+# Memory-mapped matrix file shared by all workers on the host (utils/shared_embeddings.py);
+# unset keeps a private slab per process
+EMBEDDING_SHARED_PATH = os.getenv("EMBEDDING_SHARED_PATH")
+# Recorded in the shared file so embeddings from a different model are never mixed in
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+# Photo embeddings (utils/image_embeddings.py) are kept the same way, in a store of their own
+IMAGE_EMBEDDING_CACHE_MAX_MB = float(os.getenv("IMAGE_EMBEDDING_CACHE_MAX_MB", "64"))
+IMAGE_EMBEDDING_SHARED_PATH = os.getenv("IMAGE_EMBEDDING_SHARED_PATH")
+IMAGE_EMBEDDING_MODEL_NAME = os.getenv(
+    "IMAGE_EMBEDDING_MODEL_NAME", os.path.basename(os.getenv("IMAGE_MODEL_PATH") or "") or "image"
+)
+
+
+class EmbeddingStore:
+    """
+    Post embeddings in one contiguous (rows x dim) array instead of a dict of
+    separate arrays: an id -> row map in LRU order, a free list of rows left by
+    deletes, and growth by doubling up to a byte cap, after which the least
+    recently used row is reused. Vectors are stored L2-normalized, so cosine
+    similarity against many rows is a single matrix-vector product.
+    """
+
+    def __init__(self, dtype: str = EMBEDDING_CACHE_DTYPE, max_bytes: float = EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+                 initial_rows: int = EMBEDDING_CACHE_INITIAL_ROWS):
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.initial_rows = initial_rows
+        self.dim: Optional[int] = None
+        self._data: Optional[np.ndarray] = None
+        self._rows: "OrderedDict[int, int]" = OrderedDict()
+        self._free: List[int] = []
+        self._next_row = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @property
+    def max_rows(self) -> int:
+        return max(1, int(self.max_bytes // (self.dim * self.dtype.itemsize)))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the slab itself (the id map adds roughly 100 bytes per entry)"""
+        return 0 if self._data is None else self._data.nbytes
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, post_id: int) -> bool:
+        return post_id in self._rows
+
+    def put(self, post_id: int, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        with self._lock:
+            if self._data is None:
+                self.dim = vector.shape[0]
+                self._data = np.zeros((min(self.initial_rows, self.max_rows), self.dim), dtype=self.dtype)
+            row = self._rows.get(post_id)
+            if row is None:
+                row = self._allocate_locked()
+                self._rows[post_id] = row
+            else:
+                self._rows.move_to_end(post_id)
+            self._data[row] = vector / norm
+
+    def put_many(self, post_ids: List[int], vectors: Iterable[np.ndarray]) -> None:
+        for post_id, vector in zip(post_ids, vectors):
+            self.put(post_id, vector)
+
+    def get(self, post_id: int) -> Optional[np.ndarray]:
+        """Normalized float32 copy of one embedding, or None"""
+        with self._lock:
+            row = self._rows.get(post_id)
+            if row is None:
+                return None
+            self._rows.move_to_end(post_id)
+            return self._data[row].astype(np.float32)
+
+    def get_many(self, post_ids: Iterable[int]) -> Tuple[List[int], np.ndarray]:
+        """(ids that were present, their embeddings as a float32 matrix in that order)"""
+        with self._lock:
+            found = []
+            rows = []
+            for post_id in post_ids:
+                row = self._rows.get(post_id)
+                if row is not None:
+                    self._rows.move_to_end(post_id)
+                    found.append(post_id)
+                    rows.append(row)
+            if not rows:
+                return [], np.zeros((0, self.dim or 0), dtype=np.float32)
+            return found, self._data[rows].astype(np.float32)
+
+    def ensure_capacity(self, rows: int, dim: int) -> None:
+        """Raise the byte cap so rows embeddings fit without evictions; the slab still grows only as filled"""
+        needed = rows * dim * self.dtype.itemsize
+        with self._lock:
+            if needed > self.max_bytes:
+                logger.info(f"Raising the embedding cache cap from {self.max_bytes / 2**20:.0f} "
+                            f"to {needed / 2**20:.0f} MB for {rows} posts")
+                self.max_bytes = needed
+
+    def discard(self, post_id: int) -> None:
+        with self._lock:
+            row = self._rows.pop(post_id, None)
+            if row is not None:
+                self._free.append(row)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = None
+            self.dim = None
+            self._rows.clear()
+            self._free.clear()
+            self._next_row = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._rows),
+                "capacity_rows": 0 if self._data is None else self._data.shape[0],
+                "free_rows": len(self._free),
+                "bytes": self.nbytes,
+                "dtype": self.dtype.name,
+                "evictions": self.evictions
+            }
+
+    def _allocate_locked(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._next_row < self._data.shape[0]:
+            row = self._next_row
+            self._next_row += 1
+            return row
+        if self._data.shape[0] < self.max_rows:
+            grown = np.zeros((min(self._data.shape[0] * 2, self.max_rows), self.dim), dtype=self.dtype)
+            grown[:self._data.shape[0]] = self._data
+            self._data = grown
+            row = self._next_row
+            self._next_row += 1
+            return row
+        # At the cap: reuse the least recently used row
+        _, row = self._rows.popitem(last=False)
+        self.evictions += 1
+        return row
+
+
+def _create_store(shared_path: Optional[str], model_name: str, max_mb: float):
+    if shared_path:
+        from utils.shared_embeddings import SharedEmbeddingMatrix
+        logger.info(f"Using shared embedding matrix at {shared_path}")
+        return SharedEmbeddingMatrix(shared_path, model_name, EMBEDDING_CACHE_DTYPE)
+    return EmbeddingStore(max_bytes=max_mb * 1024 * 1024)
+
+
+post_embeddings = _create_store(EMBEDDING_SHARED_PATH, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_MB)
+post_image_embeddings = _create_store(
+    IMAGE_EMBEDDING_SHARED_PATH, IMAGE_EMBEDDING_MODEL_NAME, IMAGE_EMBEDDING_CACHE_MAX_MB
+)
+
+# Other holders of post vectors (e.g. the ANN indexes) that must forget a post too
+_invalidation_listeners: List[Callable[[int], None]] = []
+
+
+def on_post_invalidated(listener: Callable[[int], None]) -> None:
+    _invalidation_listeners.append(listener)
+
+
+def invalidate_post_embedding(post_id: int) -> None:
+    """Drop a post's cached embeddings after it is deleted or its text or photo changes"""
+    post_embeddings.discard(post_id)
+    post_image_embeddings.discard(post_id)
+    for listener in _invalidation_listeners:
+        try:
+            listener(post_id)
+        except Exception as e:
+            logger.error(f"Error invalidating post {post_id}: {str(e)}")
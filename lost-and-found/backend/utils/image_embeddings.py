@@ -0,0 +1,204 @@
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from utils.embedding_store import post_image_embeddings
+from utils.image_worker import embed_images, init_worker
+
+logger = logging.getLogger(__name__)
+
+# ONNX image encoder, e.g. the visual tower of CLIP ViT-B/32 or MobileNetV3; unset turns photo matching off
+IMAGE_MODEL_PATH = os.getenv("IMAGE_MODEL_PATH")
+IMAGE_SIZE = int(os.getenv("IMAGE_SIZE", "224"))
+# Per-channel normalization the model was trained with (ImageNet by default; CLIP uses its own)
+IMAGE_MEAN = tuple(float(v) for v in os.getenv("IMAGE_MEAN", "0.485,0.456,0.406").split(","))
+IMAGE_STD = tuple(float(v) for v in os.getenv("IMAGE_STD", "0.229,0.224,0.225").split(","))
+# Worker processes, and inference threads in each; keep workers * threads below the core count
+IMAGE_EMBEDDING_WORKERS = int(os.getenv("IMAGE_EMBEDDING_WORKERS", "1"))
+IMAGE_EMBEDDING_THREADS = int(os.getenv("IMAGE_EMBEDDING_THREADS", "2"))
+# Photos per model call, and how long the first queued photo waits for others to join it
+IMAGE_EMBEDDING_BATCH_SIZE = int(os.getenv("IMAGE_EMBEDDING_BATCH_SIZE", "16"))
+IMAGE_EMBEDDING_BATCH_WAIT_SECONDS = float(os.getenv("IMAGE_EMBEDDING_BATCH_WAIT_SECONDS", "0.25"))
+# Share of the match score taken by photo similarity when both posts have one
+IMAGE_MATCH_WEIGHT = float(os.getenv("IMAGE_MATCH_WEIGHT", "0.4"))
+# A photo that couldn't be read is not queued again for this long; at most this many are remembered
+IMAGE_EMBEDDING_RETRY_SECONDS = float(os.getenv("IMAGE_EMBEDDING_RETRY_SECONDS", "3600"))
+IMAGE_EMBEDDING_MAX_FAILED = int(os.getenv("IMAGE_EMBEDDING_MAX_FAILED", "10000"))
+
+EmbeddedCallback = Callable[[int], Awaitable[None]]
+# Called from a worker thread with (report type, post ids, vectors) after each stored batch
+BatchListener = Callable[[str, List[int], List[np.ndarray]], None]
+
+
+class ImageEmbedder:
+    """
+    Embeds post photos off the request path. Posts are queued with submit(),
+    from the event loop or any thread; a background task gathers up to
+    batch_size of them (waiting at most batch_wait for a batch to fill), runs
+    one batched ONNX call in a worker process and stores the vectors in
+    post_image_embeddings, then hands each batch to the listeners registered
+    with on_batch (the photo ANN indexes). Callbacks passed to submit() are
+    awaited once the post's embedding is stored. Photos that can't be read
+    are not queued again for IMAGE_EMBEDDING_RETRY_SECONDS.
+    """
+
+    def __init__(self, model_path: Optional[str] = IMAGE_MODEL_PATH, workers: int = IMAGE_EMBEDDING_WORKERS,
+                 batch_size: int = IMAGE_EMBEDDING_BATCH_SIZE, batch_wait: float = IMAGE_EMBEDDING_BATCH_WAIT_SECONDS):
+        self.model_path = model_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.embedded = 0
+        self.failed = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[Tuple[int, str, str]]"] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task = None
+        self._pending: Set[int] = set()
+        self._callbacks: Dict[int, List[EmbeddedCallback]] = {}
+        # Post id -> time.monotonic() after which its photo may be tried again, oldest first
+        self._failed: "OrderedDict[int, float]" = OrderedDict()
+        self._listeners: List[BatchListener] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._queue is not None
+
+    async def start(self) -> None:
+        if not self.model_path:
+            return
+        missing = [name for name in ("onnxruntime", "PIL") if importlib.util.find_spec(name) is None]
+        if missing or not os.path.exists(self.model_path):
+            logger.warning(f"Photo matching disabled: {', '.join(missing) or self.model_path} not found")
+            return
+        # Spawned, not forked: the server process has threads and model state a fork would copy
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.model_path, IMAGE_EMBEDDING_THREADS)
+        )
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Image embedding started with {self.workers} worker(s) for {self.model_path}")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._queue = None
+        if self._executor:
+            # Queued photos are dropped; matching embeds them again when it finds them missing
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def on_batch(self, listener: BatchListener) -> None:
+        self._listeners.append(listener)
+
+    def submit(self, post_id: int, image_path: str, report_type: str,
+               on_embedded: Optional[EmbeddedCallback] = None) -> bool:
+        """Queue a post's photo for embedding without blocking; False when photo matching is off"""
+        queue, loop = self._queue, self._loop
+        if queue is None or not image_path:
+            return False
+        with self._lock:
+            retry_at = self._failed.get(post_id)
+            if retry_at is not None:
+                if retry_at > time.monotonic():
+                    return False
+                del self._failed[post_id]
+            if on_embedded is not None:
+                self._callbacks.setdefault(post_id, []).append(on_embedded)
+            if post_id in self._pending:
+                return True
+            self._pending.add(post_id)
+        loop.call_soon_threadsafe(queue.put_nowait, (post_id, image_path, report_type.lower()))
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "embedded": self.embedded,
+            "failed": self.failed
+        }
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), deadline - self._loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._embed(batch)
+            except asyncio.CancelledError:
+                raise
+            except BrokenProcessPool as e:
+                logger.error(f"Image embedding workers died, photo matching disabled: {str(e)}")
+                self._queue = None
+                return
+            except Exception as e:
+                logger.error(f"Image embedding batch failed: {str(e)}")
+
+    async def _embed(self, batch: List[Tuple[int, str, str]]) -> None:
+        post_ids = [post_id for post_id, _, _ in batch]
+        try:
+            vectors = await self._loop.run_in_executor(
+                self._executor, embed_images, [path for _, path, _ in batch], IMAGE_SIZE, IMAGE_MEAN, IMAGE_STD
+            )
+        finally:
+            with self._lock:
+                self._pending.difference_update(post_ids)
+                callbacks = {post_id: self._callbacks.pop(post_id, []) for post_id in post_ids}
+
+        embedded = [(post_id, report_type, vector)
+                    for (post_id, _, report_type), vector in zip(batch, vectors) if vector is not None]
+        retry_at = time.monotonic() + IMAGE_EMBEDDING_RETRY_SECONDS
+        with self._lock:
+            for post_id in set(post_ids) - {post_id for post_id, _, _ in embedded}:
+                self._failed.pop(post_id, None)
+                self._failed[post_id] = retry_at
+            while len(self._failed) > IMAGE_EMBEDDING_MAX_FAILED:
+                self._failed.popitem(last=False)
+        self.failed += len(batch) - len(embedded)
+        if not embedded:
+            return
+        # The shared matrix takes a file lock on write, and listeners take the index lock
+        await run_in_threadpool(self._store, embedded)
+        self.embedded += len(embedded)
+        for post_id, _, _ in embedded:
+            for callback in callbacks[post_id]:
+                try:
+                    await callback(post_id)
+                except Exception as e:
+                    logger.error(f"Image embedding callback for post {post_id} failed: {str(e)}")
+
+    def _store(self, embedded: List[Tuple[int, str, np.ndarray]]) -> None:
+        post_image_embeddings.put_many([post_id for post_id, _, _ in embedded], [v for _, _, v in embedded])
+        for report_type in {report_type for _, report_type, _ in embedded}:
+            ids = [post_id for post_id, kind, _ in embedded if kind == report_type]
+            vectors = [vector for _, kind, vector in embedded if kind == report_type]
+            for listener in self._listeners:
+                try:
+                    listener(report_type, ids, vectors)
+                except Exception as e:
+                    logger.error(f"Image embedding listener failed: {str(e)}")
+
+
+image_embedder = ImageEmbedder()
@@ -0,0 +1,80 @@
+"""
+Image encoder run inside the image embedding process pool (see
+utils/image_embeddings.py). Kept free of the app's imports so spawned
+workers start quickly and never open database connections or caches.
+"""
+import logging
+from typing import List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# One ONNX session per worker process, created by init_worker
+_session = None
+_input_name = None
+
+
+def init_worker(model_path: str, threads: int) -> None:
+    global _session, _input_name
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    # Workers run side by side; each keeps to its share of the cores
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    _session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    _input_name = _session.get_inputs()[0].name
+
+
+def load_image(path: str, size: int, mean: Sequence[float], std: Sequence[float]) -> np.ndarray:
+    """(3, size, size) float32 pixels: short side resized to size, center cropped, normalized"""
+    from PIL import Image
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        scale = size / min(image.size)
+        image = image.resize(
+            (max(size, round(image.width * scale)), max(size, round(image.height * scale))), Image.BICUBIC
+        )
+        left, top = (image.width - size) // 2, (image.height - size) // 2
+        image = image.crop((left, top, left + size, top + size))
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+    pixels = (pixels - np.asarray(mean, dtype=np.float32)) / np.asarray(std, dtype=np.float32)
+    return pixels.transpose(2, 0, 1)
+
+
+def _run(batch: np.ndarray) -> np.ndarray:
+    output = _session.run(None, {_input_name: batch})[0]
+    # Feature maps from a backbone without a pooling head are average pooled
+    if output.ndim == 4:
+        output = output.mean(axis=(2, 3))
+    return output.reshape(len(batch), -1).astype(np.float32)
+
+
+def embed_images(
+    paths: List[str],
+    size: int,
+    mean: Sequence[float],
+    std: Sequence[float]
+) -> List[Optional[np.ndarray]]:
+    """Embeddings of the images at paths in one batched model call; None for unreadable images"""
+    results: List[Optional[np.ndarray]] = [None] * len(paths)
+    pixels = []
+    loaded = []
+    for i, path in enumerate(paths):
+        try:
+            pixels.append(load_image(path, size, mean, std))
+            loaded.append(i)
+        except Exception as e:
+            logger.error(f"Error loading image {path}: {str(e)}")
+    if not pixels:
+        return results
+
+    batch = np.stack(pixels)
+    try:
+        vectors = _run(batch)
+    except Exception as e:
+        # Some exported models have a fixed batch size of 1
+        logger.warning(f"Batched image inference failed, encoding one at a time: {str(e)}")
+        vectors = np.vstack([_run(batch[i:i + 1]) for i in range(len(batch))])
+    for i, vector in zip(loaded, vectors):
+        results[i] = vector
+    return results
@@ -0,0 +1,198 @@
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Candidates re-ranked per post; the rest of the text ranking is dropped
+MATCH_RERANK = os.getenv("MATCH_RERANK", "1") == "1"
+MATCH_RERANK_CANDIDATES = int(os.getenv("MATCH_RERANK_CANDIDATES", "20"))
+# Composite score a re-ranked candidate needs to stay a match
+MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.6"))
+
+# Weights of text similarity, location similarity and time proximity (normalized to sum to 1)
+MATCH_TEXT_WEIGHT = float(os.getenv("MATCH_TEXT_WEIGHT", "0.7"))
+MATCH_LOCATION_WEIGHT = float(os.getenv("MATCH_LOCATION_WEIGHT", "0.15"))
+MATCH_TIME_WEIGHT = float(os.getenv("MATCH_TIME_WEIGHT", "0.15"))
+
+# Location similarity halves about every 0.7 * scale metres between buildings
+LOCATION_SCALE_METRES = float(os.getenv("MATCH_LOCATION_SCALE_METRES", "250"))
+# Time proximity falls to 1/e this many days apart
+TIME_DECAY_DAYS = float(os.getenv("MATCH_TIME_DECAY_DAYS", "14"))
+# A found report dated this long before the lost one counts as TIME_EARLY_FACTOR times as far apart
+TIME_EARLY_GRACE_DAYS = 1.0
+TIME_EARLY_FACTOR = 4.0
+# Feature score when either post's location or date can't be read; neither helps nor hurts much
+UNKNOWN_SCORE = 0.5
+
+# UMBC buildings as (name, aliases, latitude, longitude); approximate building centres
+UMBC_BUILDINGS = (
+    ("Albin O. Kuhn Library", ("library", "kuhn library", "aok", "aok library"), 39.2565, -76.7116),
+    ("The Commons", ("commons",), 39.2550, -76.7108),
+    ("University Center", ("university center", "uc"), 39.2544, -76.7113),
+    ("ITE Building", ("ite", "information technology", "information technology and engineering"), 39.2538, -76.7142),
+    ("Engineering Building", ("engineering", "engineering building", "eng building"), 39.2545, -76.7140),
+    ("Retriever Activities Center", ("retriever activities center", "rac", "gym"), 39.2529, -76.7124),
+    ("Sherman Hall", ("sherman", "sherman hall", "academic iv"), 39.2536, -76.7135),
+    ("Math & Psychology Building", ("math", "psychology", "math psych", "math and psychology"), 39.2542, -76.7125),
+    ("Fine Arts Building", ("fine arts",), 39.2551, -76.7131),
+    ("Performing Arts and Humanities Building", ("performing arts", "pahb", "humanities"), 39.2553, -76.7153),
+    ("Sondheim Hall", ("sondheim",), 39.2534, -76.7127),
+    ("Public Policy Building", ("public policy",), 39.2554, -76.7094),
+    ("Biological Sciences Building", ("biological sciences", "biology", "bio building"), 39.2547, -76.7120),
+    ("Meyerhoff Chemistry Building", ("meyerhoff", "chemistry"), 39.2550, -76.7124),
+    ("Physics Building", ("physics",), 39.2545, -76.7096),
+    ("Interdisciplinary Life Sciences Building", ("ilsb", "life sciences"), 39.2538, -76.7108),
+    ("Administration Building", ("administration", "admin building"), 39.2530, -76.7132),
+    ("True Grit's", ("true grits", "true grit", "dining hall"), 39.2566, -76.7076),
+    ("Chesapeake Employers Insurance Arena", ("event center", "arena"), 39.2522, -76.7078),
+    ("Patapsco Hall", ("patapsco",), 39.2570, -76.7068),
+    ("Potomac Hall", ("potomac",), 39.2576, -76.7081),
+    ("Susquehanna Hall", ("susquehanna",), 39.2560, -76.7067),
+    ("Chesapeake Hall", ("chesapeake hall",), 39.2567, -76.7089),
+    ("Erickson Hall", ("erickson",), 39.2575, -76.7098),
+    ("Harbor Hall", ("harbor",), 39.2579, -76.7093),
+)
+
+_ORIGIN_LAT, _ORIGIN_LON = 39.2554, -76.7110
+# Building centres in metres east/north of the campus origin; flat at campus scale
+_BUILDING_XY = np.array([
+    ((lon - _ORIGIN_LON) * 111320.0 * np.cos(np.radians(_ORIGIN_LAT)), (lat - _ORIGIN_LAT) * 110540.0)
+    for _, _, lat, lon in UMBC_BUILDINGS
+], dtype=np.float64)
+_ALIASES = {
+    re.sub(r"[^a-z0-9]+", " ", alias.lower()).strip(): i
+    for i, (name, aliases, _, _) in enumerate(UMBC_BUILDINGS)
+    for alias in (name, *aliases)
+}
+# Longest aliases first, so "engineering building" wins over "engineering"
+_ALIAS_PATTERN = re.compile(r"\b(" + "|".join(
+    re.escape(alias) for alias in sorted(_ALIASES, key=len, reverse=True)
+) + r")\b")
+
+
+@lru_cache(maxsize=4096)
+def resolve_building(location: str) -> Optional[int]:
+    """Index into UMBC_BUILDINGS of the first building named in a free-text location"""
+    match = _ALIAS_PATTERN.search(re.sub(r"[^a-z0-9]+", " ", (location or "").lower()))
+    return _ALIASES[match.group(1)] if match else None
+
+
+def location_coordinates(locations: Iterable[str]) -> np.ndarray:
+    """(n, 2) building coordinates in metres; NaN rows for unrecognised locations"""
+    buildings = [resolve_building(location) for location in locations]
+    coords = np.full((len(buildings), 2), np.nan)
+    known = [i for i, building in enumerate(buildings) if building is not None]
+    if known:
+        coords[known] = _BUILDING_XY[[buildings[i] for i in known]]
+    return coords
+
+
+def report_day(date: str, time: str = None) -> float:
+    """Days since the epoch of a post's date ("YYYY-MM-DD") and optional time ("HH:MM"); NaN if unreadable"""
+    try:
+        day = datetime.fromisoformat((date or "").strip())
+    except ValueError:
+        return np.nan
+    try:
+        hours, minutes = (int(part) for part in (time or "").strip().split(":")[:2])
+        day = day.replace(hour=hours, minute=minutes)
+    except ValueError:
+        pass
+    return day.timestamp() / 86400.0
+
+
+def composite_scores(
+    text_scores: np.ndarray,
+    lost_xy: np.ndarray,
+    found_xy: np.ndarray,
+    lost_days: np.ndarray,
+    found_days: np.ndarray
+) -> np.ndarray:
+    """
+    Weighted sum of text similarity, location similarity and time proximity
+    for aligned (lost, found) pairs, all in [0, 1]; rows broadcast, so one
+    lost post can be scored against many found posts
+    """
+    distance = np.linalg.norm(found_xy - lost_xy, axis=-1)
+    location = np.where(np.isnan(distance), UNKNOWN_SCORE, np.exp(-np.nan_to_num(distance) / LOCATION_SCALE_METRES))
+
+    gap = np.asarray(found_days - lost_days, dtype=np.float64)
+    # A found report well before the item was lost is most likely another item
+    early = np.nan_to_num(gap) < -TIME_EARLY_GRACE_DAYS
+    days_apart = np.abs(np.nan_to_num(gap)) * np.where(early, TIME_EARLY_FACTOR, 1.0)
+    time = np.where(np.isnan(gap), UNKNOWN_SCORE, np.exp(-days_apart / TIME_DECAY_DAYS))
+
+    total = MATCH_TEXT_WEIGHT + MATCH_LOCATION_WEIGHT + MATCH_TIME_WEIGHT
+    return (
+        MATCH_TEXT_WEIGHT * np.asarray(text_scores, dtype=np.float64)
+        + MATCH_LOCATION_WEIGHT * location
+        + MATCH_TIME_WEIGHT * time
+    ) / total
+
+
+def rerank(post, matches: List[Tuple[object, float]], min_score: float = MATCH_MIN_SCORE) -> List[Tuple[object, float]]:
+    """
+    Re-score the MATCH_RERANK_CANDIDATES best (candidate, text score) matches
+    of post with location and time, best first; candidates scoring below
+    min_score are dropped
+    """
+    matches = sorted(matches, key=lambda match: match[1], reverse=True)[:MATCH_RERANK_CANDIDATES]
+    if not matches:
+        return []
+    candidates = [candidate for candidate, _ in matches]
+    post_xy = location_coordinates([post.location])[0]
+    post_day = report_day(post.date, post.time)
+    candidate_xy = location_coordinates(c.location for c in candidates)
+    candidate_days = np.array([report_day(c.date, c.time) for c in candidates])
+    text_scores = np.array([score for _, score in matches])
+
+    if post.report_type.lower() == "lost":
+        scores = composite_scores(text_scores, post_xy, candidate_xy, post_day, candidate_days)
+    else:
+        scores = composite_scores(text_scores, candidate_xy, post_xy, candidate_days, post_day)
+    ranked = [(candidate, float(score)) for candidate, score in zip(candidates, scores) if score >= min_score]
+    ranked.sort(key=lambda match: match[1], reverse=True)
+    return ranked
+
+
+def rerank_pairs(
+    pairs: Sequence[Tuple[int, int, float]],
+    posts: Dict[int, object],
+    per_post: int = 1,
+    min_score: float = MATCH_MIN_SCORE
+) -> List[Tuple[int, int, float]]:
+    """
+    Re-score (query id, candidate id, text score) pairs with location and
+    time in one vectorized pass and keep the per_post best per query at or
+    above min_score, best first. posts maps ids to rows with report_type,
+    location, date and time.
+    """
+    pairs = [pair for pair in pairs if pair[0] in posts and pair[1] in posts]
+    if not pairs:
+        return []
+    # Features once per post, then gathered per pair
+    ids = list({post_id for query_id, candidate_id, _ in pairs for post_id in (query_id, candidate_id)})
+    row = {post_id: i for i, post_id in enumerate(ids)}
+    xy = location_coordinates(posts[post_id].location for post_id in ids)
+    days = np.array([report_day(posts[post_id].date, posts[post_id].time) for post_id in ids])
+    query_rows = np.array([row[query_id] for query_id, _, _ in pairs])
+    candidate_rows = np.array([row[candidate_id] for _, candidate_id, _ in pairs])
+    query_is_lost = np.array([posts[query_id].report_type.lower() == "lost" for query_id, _, _ in pairs])
+    lost_rows = np.where(query_is_lost, query_rows, candidate_rows)
+    found_rows = np.where(query_is_lost, candidate_rows, query_rows)
+    scores = composite_scores(
+        np.array([score for _, _, score in pairs]), xy[lost_rows], xy[found_rows], days[lost_rows], days[found_rows]
+    )
+
+    kept: Dict[int, List[Tuple[int, int, float]]] = {}
+    for (query_id, candidate_id, _), score in zip(pairs, scores.tolist()):
+        if score >= min_score:
+            kept.setdefault(query_id, []).append((query_id, candidate_id, score))
+    ranked = []
+    for matches in kept.values():
+        matches.sort(key=lambda pair: pair[2], reverse=True)
+        ranked.extend(matches[:per_post])
+    ranked.sort(key=lambda pair: pair[2], reverse=True)
+    return ranked
@@ -0,0 +1,85 @@
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+# Rows per side of one score tile; a tile is TILE x TILE float32 scores (16 MiB at 2048)
+MATRIX_TILE_SIZE = int(os.getenv("MATRIX_TILE_SIZE", "2048"))
+
+
+def best_matches(
+    query_ids: Sequence[int],
+    queries: np.ndarray,
+    candidate_ids: Sequence[int],
+    candidates: np.ndarray,
+    k: int = 1,
+    threshold: float = 0.7,
+    tile_size: int = MATRIX_TILE_SIZE,
+    exclude: Optional[Dict[int, Set[int]]] = None,
+    progress: Optional[Callable[[int], None]] = None
+) -> Dict[int, List[Tuple[int, float]]]:
+    """
+    Top k candidates per query by cosine similarity, from matrix-matrix
+    products over tiles of both sides instead of one query at a time. Both
+    matrices must hold L2-normalized rows. A query never matches a candidate
+    with the same id, nor the candidate ids listed for it in exclude; queries
+    without a match at or above threshold are left out. progress is called
+    with the number of queries finished after each query tile.
+    """
+    query_ids = np.asarray(query_ids, dtype=np.int64)
+    candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+    results: Dict[int, List[Tuple[int, float]]] = {}
+    if not len(query_ids) or not len(candidate_ids) or k <= 0:
+        return results
+
+    # Excluded pairs as (query row, candidate position)
+    excluded_rows = np.zeros(0, dtype=np.int64)
+    excluded_positions = np.zeros(0, dtype=np.int64)
+    if exclude:
+        position = {candidate_id: i for i, candidate_id in enumerate(candidate_ids.tolist())}
+        pairs = [
+            (row, position[candidate_id])
+            for row, query_id in enumerate(query_ids.tolist())
+            for candidate_id in exclude.get(query_id, ())
+            if candidate_id in position
+        ]
+        if pairs:
+            excluded_rows, excluded_positions = (np.array(column, dtype=np.int64) for column in zip(*pairs))
+
+    for q_start in range(0, len(query_ids), tile_size):
+        q_ids = query_ids[q_start:q_start + tile_size]
+        q_block = queries[q_start:q_start + tile_size]
+        in_q_tile = (excluded_rows >= q_start) & (excluded_rows < q_start + len(q_ids))
+        # Running best per query: candidate positions and scores, k columns
+        best_scores = np.full((len(q_ids), k), -np.inf, dtype=np.float32)
+        best_index = np.full((len(q_ids), k), -1, dtype=np.int64)
+
+        for c_start in range(0, len(candidate_ids), tile_size):
+            c_ids = candidate_ids[c_start:c_start + tile_size]
+            scores = q_block @ candidates[c_start:c_start + tile_size].T
+            scores[q_ids[:, None] == c_ids[None, :]] = -np.inf
+            in_tile = in_q_tile & (excluded_positions >= c_start) & (excluded_positions < c_start + len(c_ids))
+            scores[excluded_rows[in_tile] - q_start, excluded_positions[in_tile] - c_start] = -np.inf
+
+            # Merge this tile's top k into the running top k
+            take = min(k, scores.shape[1])
+            tile_top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, tile_top, axis=1)], axis=1)
+            merged_index = np.concatenate([best_index, tile_top + c_start], axis=1)
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_index = np.take_along_axis(merged_index, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_index = np.take_along_axis(best_index, order, axis=1)
+        for row, query_id in enumerate(q_ids.tolist()):
+            matches = [
+                (int(candidate_ids[index]), float(score))
+                for index, score in zip(best_index[row], best_scores[row])
+                if index >= 0 and score >= threshold
+            ]
+            if matches:
+                results[query_id] = matches
+        if progress is not None:
+            progress(len(q_ids))
+    return results
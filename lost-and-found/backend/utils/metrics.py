@@ -0,0 +1,258 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pymongo import monitoring
+from sqlalchemy import event
+
+# Seconds; covers fast cache hits up to slow matching requests
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge read at scrape time from a callback returning [(labels, value)]"""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[dict, float]]]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.collect():
+            values = tuple(labels[name] for name in self.labelnames)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...], collect) -> Gauge:
+        return self._register(Gauge(name, help, labelnames, collect))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # A failing gauge callback shouldn't take down the whole scrape
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("engine",)
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), COUNT_BUCKETS
+)
+DB_SECONDS_PER_REQUEST = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per HTTP request", ("route",)
+)
+MONGO_COMMAND_SECONDS = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time", ("command",)
+)
+MONGO_COMMAND_FAILURES = registry.counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ("command",)
+)
+MONGO_COMMANDS_PER_REQUEST = registry.histogram(
+    "mongo_commands_per_request", "MongoDB commands per HTTP request", ("route",), COUNT_BUCKETS
+)
+MONGO_SECONDS_PER_REQUEST = registry.histogram(
+    "mongo_time_per_request_seconds", "Time spent in MongoDB per HTTP request", ("route",)
+)
+EMBEDDING_SECONDS = registry.histogram(
+    "embedding_duration_seconds", "Time to encode text into an embedding"
+)
+MATCHING_SECONDS = registry.histogram(
+    "matching_duration_seconds", "Time to find matches for one post"
+)
+
+
+@dataclass
+class RequestStats:
+    """Where one request's time went; filled in by the DB, Mongo and matching hooks"""
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    mongo_commands: int = 0
+    mongo_seconds: float = 0.0
+    embedding_seconds: float = 0.0
+    matching_seconds: float = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'mongo;dur={self.mongo_seconds * 1000:.1f};desc="{self.mongo_commands} commands"',
+            f"embedding;dur={self.embedding_seconds * 1000:.1f}",
+            f"matching;dur={self.matching_seconds * 1000:.1f}",
+            f"total;dur={total_seconds * 1000:.1f}"
+        ])
+
+
+# Set by the metrics middleware for the duration of each HTTP request
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def timed(histogram: Histogram, stat: str = None):
+    """Time a block into a histogram and, inside a request, into that request's stats"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None and stat:
+            setattr(stats, stat, getattr(stats, stat) + elapsed)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement run through a (sync) engine; pass async_engine.sync_engine for async"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.observe(elapsed, engine=name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """
+    Times every MongoDB command. Commands are attributed to the current request
+    when the driver runs them in the request's context.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+        self._record(event)
+
+    def _record(self, event):
+        elapsed = event.duration_micros / 1_000_000
+        MONGO_COMMAND_SECONDS.observe(elapsed, command=event.command_name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += elapsed
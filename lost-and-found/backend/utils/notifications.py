@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select, update, func, false, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.notification import Notification
+from models.notification_state import UserNotificationState
+from models.post_match import PostMatch
+from models.user import User
+
+
+# Pairs per post_matches INSERT; four parameters each, within the 999 bound parameters of older SQLite
+RECORD_MATCHES_CHUNK_SIZE = 200
+
+
+def dialect_insert(bind):
+    """INSERT construct with ON CONFLICT support for the session's database"""
+    return pg_insert if bind.dialect.name == "postgresql" else sqlite_insert
+
+
+def refresh_unread_counts(bind, user_ids: Iterable[int]):
+    """
+    Statement recomputing the stored unread counters for the given users.
+    Run it in the same transaction as any write that changes is_read or adds or
+    removes notifications; the count is an index-only scan of the partial
+    unread index, and reads of the counter become a primary-key lookup.
+    """
+    user_ids = list(set(user_ids))
+    unread = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.is_read == false())
+        .scalar_subquery()
+    )
+    insert = dialect_insert(bind)
+    stmt = insert(UserNotificationState).from_select(
+        ["user_id", "unread_count", "updated_at"],
+        select(User.id, unread, literal(datetime.utcnow())).where(User.id.in_(user_ids))
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserNotificationState.user_id],
+        set_={"unread_count": stmt.excluded.unread_count, "updated_at": stmt.excluded.updated_at}
+    )
+
+
+def record_post_matches(bind, matches: Iterable[Tuple[int, int, float]]) -> List:
+    """
+    Statements recording notified (lost post id, found post id, score) pairs
+    in post_matches, RECORD_MATCHES_CHUNK_SIZE pairs per INSERT so large
+    imports stay under the database's bound parameter limit; pairs already
+    recorded are left as they are
+    """
+    insert = dialect_insert(bind)
+    created_at = datetime.utcnow()
+    rows = [
+        {"lost_post_id": lost_id, "found_post_id": found_id, "score": score, "created_at": created_at}
+        for lost_id, found_id, score in matches
+    ]
+    return [
+        insert(PostMatch).values(rows[start:start + RECORD_MATCHES_CHUNK_SIZE]).on_conflict_do_nothing(
+            index_elements=[PostMatch.lost_post_id, PostMatch.found_post_id]
+        )
+        for start in range(0, len(rows), RECORD_MATCHES_CHUNK_SIZE)
+    ]
+
+
+def lost_found_pair(post, matched_post) -> Tuple[int, int]:
+    """(lost post id, found post id) of a matched pair, whichever side is which"""
+    if post.report_type.lower() == "lost":
+        return post.id, matched_post.id
+    return matched_post.id, post.id
+
+
+# Users known to have been welcomed; the flag never goes back, so entries never expire
+welcomed_users = set()
+
+
+def mark_welcomed(user_id: int):
+    """
+    Statement flagging a user as welcomed. Run it after refresh_unread_counts
+    in the same transaction, which guarantees the state row exists; a rowcount
+    of 0 means the user was already welcomed.
+    """
+    return (
+        update(UserNotificationState)
+        .where(UserNotificationState.user_id == user_id, UserNotificationState.welcomed_at.is_(None))
+        .values(welcomed_at=datetime.utcnow())
+    )
+
+
+def encode_cursor(notification) -> str:
+    """Keyset cursor for the notification after which the next page starts"""
+    return f"{notification.created_at.isoformat()}|{notification.id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        created_at, notification_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except ValueError:
+        return None
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+from sqlalchemy import String, cast, false, literal
+from starlette.concurrency import run_in_threadpool
+from config.mongodb import messages
+from database import SessionLocal
+from models.notification import Notification
+from utils.notifications import dialect_insert, refresh_unread_counts
+from utils.realtime import hub
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+# Safety-net poll for entries left behind by a crashed or busy worker
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# How long a worker owns a claimed batch before others may retry it
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+
+EffectHandler = Callable[[List[dict]], Awaitable[None]]
+
+
+class OutboxDispatcher:
+    """
+    Applies side effects recorded on Mongo documents (the "outbox") in batches.
+
+    A writer stores its pending effects on the document itself, as
+    `outbox: [{"type": ..., ...}]` plus `outbox_pending: True`, so the primary
+    write and the intent to run the effects are one atomic insert. The
+    dispatcher claims pending documents under a lease, runs each effect type's
+    handler once per batch, then clears the outbox fields. Delivery is
+    at-least-once: a worker that dies mid-batch leaves the lease to expire.
+    """
+
+    def __init__(self, collection, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.handlers: Dict[str, EffectHandler] = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def register(self, effect_type: str, handler: EffectHandler) -> None:
+        self.handlers[effect_type] = handler
+
+    def notify(self) -> None:
+        """Wake the dispatcher after recording new effects"""
+        self._wake.set()
+
+    async def start(self) -> None:
+        await self.collection.create_index(
+            "outbox_pending",
+            name="outbox_pending",
+            partialFilterExpression={"outbox_pending": True}
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Flush whatever this worker can before exiting
+        try:
+            await self.process_batch()
+        except Exception as e:
+            logger.error(f"Outbox flush on shutdown failed: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.process_batch() >= self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {str(e)}")
+
+    async def process_batch(self) -> int:
+        """Claim and apply one batch; returns the number of documents processed"""
+        now = time.time()
+        claimable = {
+            "outbox_pending": True,
+            "$or": [
+                {"outbox_lease": {"$exists": False}},
+                {"outbox_lease": {"$lt": now}}
+            ]
+        }
+        ids = [doc["_id"] async for doc in self.collection.find(claimable, {"_id": 1}).limit(self.batch_size)]
+        if not ids:
+            return 0
+
+        token = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"outbox_lease": now + OUTBOX_LEASE_SECONDS, "outbox_token": token}}
+        )
+        docs = [doc async for doc in self.collection.find({"outbox_token": token}, {"outbox": 1})]
+        if not docs:
+            return 0
+
+        effects_by_type = defaultdict(list)
+        for doc in docs:
+            for effect in doc.get("outbox", []):
+                effects_by_type[effect["type"]].append(effect)
+
+        for effect_type, effects in effects_by_type.items():
+            handler = self.handlers.get(effect_type)
+            if handler is None:
+                logger.warning(f"No outbox handler for effect type {effect_type}")
+                continue
+            # A failure leaves the batch claimed; it is retried once the lease expires
+            await handler(effects)
+
+        await self.collection.update_many(
+            {"outbox_token": token},
+            {"$unset": {"outbox": "", "outbox_pending": "", "outbox_lease": "", "outbox_token": ""}}
+        )
+        logger.info(f"Outbox applied {sum(len(e) for e in effects_by_type.values())} effects from {len(docs)} documents")
+        return len(docs)
+
+
+def message_notification_text(sender_name: str, count: int) -> str:
+    if count == 1:
+        return f"You received a new message from {sender_name}"
+    return f"You have {count} new messages from {sender_name}"
+
+
+def _upsert_message_notification(db, insert, row: dict, sender_name: str) -> None:
+    """Fold a sender's messages into their unread notification, or start a new one"""
+    stmt = insert(Notification).values(**row)
+    total = Notification.coalesced_count + stmt.excluded.coalesced_count
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Notification.user_id, Notification.actor_id],
+        index_where=(Notification.type == "message") & (Notification.is_read == false()),
+        set_={
+            "coalesced_count": total,
+            "message": literal("You have ") + cast(total, String) + literal(f" new messages from {sender_name}"),
+            "related_post_id": stmt.excluded.related_post_id,
+            "created_at": stmt.excluded.created_at
+        }
+    ))
+
+
+def _insert_notifications(rows: List[dict], coalesced: List[tuple]) -> None:
+    db = SessionLocal()
+    try:
+        if rows:
+            # One executemany round trip for the plain rows
+            db.execute(Notification.__table__.insert(), rows)
+        insert = dialect_insert(db.bind)
+        for row, sender_name in coalesced:
+            _upsert_message_notification(db, insert, row, sender_name)
+        user_ids = [row["user_id"] for row in rows] + [row["user_id"] for row, _ in coalesced]
+        db.execute(refresh_unread_counts(db.bind, user_ids))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def utc_naive(moment: datetime) -> datetime:
+    """Naive UTC, like every other notification timestamp (message timestamps carry an Eastern offset)"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def dispatch_notifications(effects: List[dict]) -> None:
+    """Outbox handler: batch-write notification rows and push them to their users"""
+    rows = []
+    by_sender = {}
+    for effect in effects:
+        row = {
+            "user_id": effect["user_id"],
+            "title": effect["title"],
+            "message": effect["message"],
+            "type": effect["notification_type"],
+            "related_post_id": effect.get("related_post_id"),
+            "is_read": False,
+            "created_at": utc_naive(datetime.fromisoformat(effect["created_at"]))
+        }
+        if effect.get("actor_id") is None:
+            rows.append(row)
+            continue
+        # Collapse this batch per (receiver, sender) first; the latest message wins
+        key = (effect["user_id"], effect["actor_id"])
+        latest, _, count = by_sender.get(key, (None, None, 0))
+        if latest is None or row["created_at"] >= latest["created_at"]:
+            latest = {**row, "actor_id": effect["actor_id"]}
+        by_sender[key] = (latest, effect.get("actor_name") or "", count + 1)
+
+    coalesced = []
+    for row, sender_name, count in by_sender.values():
+        row["coalesced_count"] = count
+        row["message"] = message_notification_text(sender_name, count)
+        coalesced.append((row, sender_name))
+
+    await run_in_threadpool(_insert_notifications, rows, coalesced)
+
+    for row in rows + [row for row, _ in coalesced]:
+        await hub.publish(row["user_id"], "notification.new", {
+            **row,
+            "created_at": row["created_at"].isoformat()
+        })
+
+
+message_outbox = OutboxDispatcher(messages)
+message_outbox.register("notification", dispatch_notifications)
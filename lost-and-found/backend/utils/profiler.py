@@ -0,0 +1,150 @@
+import os
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Optional
+
+# Default gap between stack samples; 5ms keeps overhead around a percent
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Fraction of requests carrying X-Profile that actually get profiled; 0 disables it
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Per-request profiles kept for later download
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+# Per-request samplers running at once; each one is a thread
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(_BASE_DIR):
+        filename = os.path.relpath(filename, _BASE_DIR)
+    elif filename.startswith(_STDLIB_DIR):
+        filename = os.path.relpath(filename, _STDLIB_DIR)
+    # ';' separates frames in the collapsed format
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread in the process from a background
+    thread via sys._current_frames(), and aggregates them into collapsed stacks
+    ("thread;outer;...;inner count") that flamegraph.pl and speedscope read.
+    Nothing is traced, so the profiled code runs at full speed between samples.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+_profile_lock = threading.Lock()
+
+
+def profile_process(seconds: float, interval: float = PROFILE_INTERVAL_SECONDS) -> SamplingProfiler:
+    """Sample the whole worker for `seconds`; blocks, so call it from a thread"""
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running in this worker")
+    try:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        time.sleep(min(seconds, PROFILE_MAX_SECONDS))
+        profiler.stop()
+        return profiler
+    finally:
+        _profile_lock.release()
+
+
+class ProfileBuffer:
+    """Ring buffer of finished per-request profiles"""
+
+    def __init__(self, size: int = PROFILE_BUFFER_SIZE):
+        self.size = size
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def try_acquire(self) -> bool:
+        """Reserve a per-request sampler slot"""
+        with self._lock:
+            if self._running >= PROFILE_MAX_CONCURRENT:
+                return False
+            self._running += 1
+            return True
+
+    def add(self, profile_id: str, method: str, path: str, profiler: SamplingProfiler) -> None:
+        with self._lock:
+            self._running -= 1
+            self._profiles[profile_id] = {
+                "id": profile_id,
+                "method": method,
+                "path": path,
+                "created_at": datetime.utcnow().isoformat(),
+                "duration_s": round(profiler.duration, 4),
+                "samples": profiler.samples,
+                "collapsed": profiler.collapsed()
+            }
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [
+                {k: v for k, v in profile.items() if k != "collapsed"}
+                for profile in reversed(self._profiles.values())
+            ]
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+request_profiles = ProfileBuffer()
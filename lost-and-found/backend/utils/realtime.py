@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Set REALTIME_BROKER_URL (e.g. redis://localhost:6379/0) when running more than one worker
+REALTIME_BROKER_URL = os.getenv("REALTIME_BROKER_URL")
+REALTIME_CHANNEL = os.getenv("REALTIME_CHANNEL", "lostfound:events")
+
+# Typing indicators expire unless the client keeps sending them
+TYPING_TTL_SECONDS = 5
+# Events buffered per connection before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    """Delivers events straight to this process's hub (single worker)"""
+
+    def __init__(self):
+        self.hub = None
+
+    async def start(self, hub: "RealtimeHub") -> None:
+        self.hub = hub
+
+    async def stop(self) -> None:
+        self.hub = None
+
+    async def publish(self, user_id: Optional[int], event: Dict[str, Any]) -> None:
+        self.hub.deliver_local(user_id, event)
+
+
+class RedisBroker:
+    """Fans events out to every worker through a Redis pub/sub channel"""
+
+    def __init__(self, url: str, channel: str = REALTIME_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self.hub = None
+        self.redis = None
+        self.pubsub = None
+        self.listener = None
+
+    async def start(self, hub: "RealtimeHub") -> None:
+        # Optional dependency, only needed for multi-worker deployments
+        import redis.asyncio as aioredis
+
+        self.hub = hub
+        self.redis = aioredis.from_url(self.url)
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self.listener = asyncio.create_task(self._listen())
+        logger.info(f"Realtime broker subscribed to {self.channel}")
+
+    async def stop(self) -> None:
+        if self.listener:
+            self.listener.cancel()
+        if self.pubsub:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.close()
+        if self.redis:
+            await self.redis.close()
+
+    async def publish(self, user_id: Optional[int], event: Dict[str, Any]) -> None:
+        await self.redis.publish(self.channel, json.dumps({"user_id": user_id, "event": event}, default=str))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for raw in self.pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    envelope = json.loads(raw["data"])
+                    self.hub.deliver_local(envelope["user_id"], envelope["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Realtime broker listener error: {str(e)}")
+                await asyncio.sleep(1)
+
+
+class Subscription:
+    """One open WebSocket/SSE connection for a user"""
+
+    def __init__(self, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        if self.queue.full():
+            # Slow consumer: drop the oldest event rather than block publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def next_event(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RealtimeHub:
+    """
+    In-process pub/sub of per-user events (new messages, read receipts, typing,
+    notifications). Publishing goes through the broker so that every worker's
+    hub delivers to the connections it holds.
+    """
+
+    def __init__(self, broker=None):
+        self.broker = broker or InProcessBroker()
+        self.subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        # receiver_id -> {sender_id: expires_at}
+        self.typing: Dict[int, Dict[int, float]] = defaultdict(dict)
+
+    async def start(self) -> None:
+        await self.broker.start(self)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        self.subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subs = self.subscribers.get(subscription.user_id)
+        if subs is None:
+            return
+        subs.discard(subscription)
+        if not subs:
+            del self.subscribers[subscription.user_id]
+
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self.subscribers.values())
+
+    async def publish(self, user_id: int, event_type: str, data: Dict[str, Any]) -> None:
+        """Send an event to every connection of user_id, on any worker"""
+        await self._publish(user_id, {"type": event_type, "data": data, "ts": time.time()})
+
+    async def broadcast(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Send an event to every connected user"""
+        await self._publish(None, {"type": event_type, "data": data, "ts": time.time()})
+
+    async def _publish(self, user_id: Optional[int], event: Dict[str, Any]) -> None:
+        try:
+            await self.broker.publish(user_id, event)
+        except Exception as e:
+            # Push is best effort; clients still reconcile over HTTP
+            logger.error(f"Error publishing realtime event {event['type']}: {str(e)}")
+
+    def deliver_local(self, user_id: Optional[int], event: Dict[str, Any]) -> None:
+        if event["type"] == "typing" and user_id is not None:
+            self.typing[user_id][event["data"]["from"]] = time.time() + TYPING_TTL_SECONDS
+
+        if user_id is None:
+            targets = [sub for subs in self.subscribers.values() for sub in subs]
+        else:
+            targets = list(self.subscribers.get(user_id, ()))
+        for subscription in targets:
+            subscription.push(event)
+
+    def typing_for(self, user_id: int) -> List[int]:
+        """Ids of users currently typing to user_id"""
+        now = time.time()
+        active = {sender: expires for sender, expires in self.typing.get(user_id, {}).items() if expires > now}
+        if active:
+            self.typing[user_id] = active
+        else:
+            self.typing.pop(user_id, None)
+        return list(active)
+
+
+def _create_broker():
+    if REALTIME_BROKER_URL:
+        return RedisBroker(REALTIME_BROKER_URL)
+    return InProcessBroker()
+
+
+hub = RealtimeHub(_create_broker())
+
+
+def notification_event(notification) -> Dict[str, Any]:
+    """Payload for a "notification.new" event from a Notification row"""
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+        "related_post_id": notification.related_post_id
+    }
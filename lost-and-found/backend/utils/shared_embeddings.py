@@ -0,0 +1,277 @@
+import os
+import mmap
+import fcntl
+import struct
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# File layout: a 128-byte header, then int64 post ids[capacity], then the
+# (capacity x dim) matrix. Rows are append-only: a newer row for the same id
+# replaces the older one, and a negative id -(post_id + 1) is a tombstone.
+MAGIC = b"LFEMB001"
+HEADER = struct.Struct("<8sIIIIQQQ64s")  # magic, format, dtype, dim, pad, capacity, count, superseded, model
+HEADER_SIZE = 128
+COUNT_OFFSET = 32
+SUPERSEDED_OFFSET = 40
+FORMAT_VERSION = 1
+DTYPE_CODES = {"float32": 0, "float16": 1}
+
+EMBEDDING_SHARED_INITIAL_ROWS = int(os.getenv("EMBEDDING_SHARED_INITIAL_ROWS", "4096"))
+
+
+class _Mapping:
+    """One open mapping of the matrix file"""
+
+    def __init__(self, path: str, writable: bool):
+        self.file = open(path, "r+b" if writable else "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, _, dtype_code, dim, _, capacity, _, _, model = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an embedding matrix")
+        self.dim = dim
+        self.capacity = capacity
+        self.dtype = np.dtype({v: k for k, v in DTYPE_CODES.items()}[dtype_code])
+        self.model = model.rstrip(b"\0").decode()
+        self.ids = np.ndarray((capacity,), dtype=np.int64, buffer=self.mm, offset=HEADER_SIZE)
+        self.data = np.ndarray((capacity, dim), dtype=self.dtype, buffer=self.mm, offset=HEADER_SIZE + 8 * capacity)
+        # Post id -> row of its live vector, as of the first `seen` rows
+        self.rows: Dict[int, int] = {}
+        self.seen = 0
+
+    @property
+    def count(self) -> int:
+        return struct.unpack_from("<Q", self.mm, COUNT_OFFSET)[0]
+
+    @property
+    def superseded(self) -> bool:
+        return struct.unpack_from("<Q", self.mm, SUPERSEDED_OFFSET)[0] != 0
+
+    def live_rows(self) -> Dict[int, int]:
+        """Post id -> row map, updated from the rows published since the last call"""
+        count = self.count
+        if count > self.seen:
+            for row, post_id in enumerate(self.ids[self.seen:count].tolist(), start=self.seen):
+                if post_id >= 0:
+                    self.rows[post_id] = row
+                else:
+                    self.rows.pop(-post_id - 1, None)
+            self.seen = count
+        return self.rows
+
+
+def _create_file(path: str, model: str, dtype: np.dtype, dim: int, capacity: int,
+                 ids: Optional[np.ndarray] = None, data: Optional[np.ndarray] = None) -> None:
+    """Write a new matrix next to path and rename it into place"""
+    count = 0 if ids is None else len(ids)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w+b") as f:
+        f.truncate(HEADER_SIZE + 8 * capacity + capacity * dim * dtype.itemsize)
+        with mmap.mmap(f.fileno(), 0) as mm:
+            HEADER.pack_into(mm, 0, MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype.name], dim, 0, capacity, count, 0,
+                             model.encode()[:64])
+            if count:
+                np.ndarray((capacity,), dtype=np.int64, buffer=mm, offset=HEADER_SIZE)[:count] = ids
+                np.ndarray((capacity, dim), dtype=dtype, buffer=mm,
+                           offset=HEADER_SIZE + 8 * capacity)[:count] = data
+            mm.flush()
+    os.replace(tmp_path, path)
+
+
+class SharedEmbeddingMatrix:
+    """
+    Post embeddings in a memory-mapped file shared by every worker on the host,
+    so their pages live once in the OS page cache instead of once per process,
+    and survive restarts. Workers read through a read-only mapping; writes from
+    any worker are serialized with flock on <path>.lock and published by
+    bumping the header's row count after the rows are written. When the file
+    fills up (or the model changes) the writer builds a compacted copy, renames
+    it over the old file and flags the old one superseded so readers remap.
+    Same interface as utils.embedding_store.EmbeddingStore.
+    """
+
+    def __init__(self, path: str, model: str, dtype: str = "float32",
+                 initial_rows: int = EMBEDDING_SHARED_INITIAL_ROWS):
+        self.path = path
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.initial_rows = initial_rows
+        self._lock = threading.Lock()
+        self._reader: Optional[_Mapping] = None
+        self._writer: Optional[_Mapping] = None
+        self._rows: Dict[int, int] = {}
+        self._seen = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mapped file; shared by all workers, not added per worker"""
+        with self._lock:
+            self._sync_locked()
+            return 0 if self._reader is None else len(self._reader.mm)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync_locked()
+            return len(self._rows)
+
+    def __contains__(self, post_id: int) -> bool:
+        with self._lock:
+            self._sync_locked()
+            return post_id in self._rows
+
+    def put(self, post_id: int, vector: np.ndarray) -> None:
+        self.put_many([post_id], [vector])
+
+    def put_many(self, post_ids: List[int], vectors: Iterable[np.ndarray]) -> None:
+        entries = []
+        for post_id, vector in zip(post_ids, vectors):
+            vector = np.asarray(vector, dtype=np.float32).ravel()
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                entries.append((post_id, vector / norm))
+        if entries:
+            self._write(entries)
+
+    def get(self, post_id: int) -> Optional[np.ndarray]:
+        ids, matrix = self.get_many([post_id])
+        return matrix[0] if ids else None
+
+    def get_many(self, post_ids: Iterable[int]) -> Tuple[List[int], np.ndarray]:
+        with self._lock:
+            self._sync_locked()
+            found = []
+            rows = []
+            for post_id in post_ids:
+                row = self._rows.get(post_id)
+                if row is not None:
+                    found.append(post_id)
+                    rows.append(row)
+            if not rows:
+                return [], np.zeros((0, 0 if self._reader is None else self._reader.dim), dtype=np.float32)
+            return found, self._reader.data[rows].astype(np.float32)
+
+    def ensure_capacity(self, rows: int, dim: int) -> None:
+        """No cap to raise: the file grows on compaction"""
+
+    def discard(self, post_id: int) -> None:
+        if post_id in self:
+            self._write([(post_id, None)])
+
+    def clear(self) -> None:
+        with self._lock, self._file_lock():
+            if os.path.exists(self.path):
+                old = _Mapping(self.path, writable=True)
+                _create_file(self.path, self.model, self.dtype, old.dim, self.initial_rows)
+                self._mark_superseded(old)
+            self._writer = None
+            self._reader = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._sync_locked()
+            reader = self._reader
+            return {
+                "entries": len(self._rows),
+                "capacity_rows": 0 if reader is None else reader.capacity,
+                "file_rows": self._seen,
+                "bytes": 0 if reader is None else len(reader.mm),
+                "dtype": self.dtype.name,
+                "evictions": 0
+            }
+
+    def _sync_locked(self) -> None:
+        """Map the current file if needed and index rows published since the last call"""
+        if self._reader is not None and self._reader.superseded:
+            self._reader = None
+        if self._reader is None:
+            self._rows = {}
+            self._seen = 0
+            if not os.path.exists(self.path):
+                return
+            reader = _Mapping(self.path, writable=False)
+            if reader.model != self.model or reader.dtype != self.dtype:
+                # Built by another model or dtype; the next write rebuilds it
+                return
+            self._reader = reader
+        self._rows = self._reader.live_rows()
+        self._seen = self._reader.seen
+
+    def _file_lock(self):
+        lock_file = open(f"{self.path}.lock", "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        return lock_file
+
+    def _write(self, entries: List[Tuple[int, Optional[np.ndarray]]]) -> None:
+        dim = next((v.shape[0] for _, v in entries if v is not None), None)
+        with self._lock, self._file_lock():
+            writer = self._writable_locked(dim)
+            if writer is None:
+                return
+            live = writer.live_rows()
+
+            # Skip rows that would not change anything, e.g. re-embedding an unchanged post
+            pending = []
+            for post_id, vector in entries:
+                row = live.get(post_id)
+                if vector is None:
+                    if row is not None:
+                        pending.append((post_id, None))
+                elif row is None or not np.allclose(writer.data[row], vector, atol=1e-3):
+                    pending.append((post_id, vector))
+            if not pending:
+                return
+
+            if writer.count + len(pending) > writer.capacity:
+                writer = self._compact_locked(writer, live, len(pending))
+
+            count = writer.count
+            for offset, (post_id, vector) in enumerate(pending):
+                if vector is None:
+                    writer.ids[count + offset] = -post_id - 1
+                else:
+                    writer.data[count + offset] = vector
+                    writer.ids[count + offset] = post_id
+            # Publish: readers only look at rows below the count
+            struct.pack_into("<Q", writer.mm, COUNT_OFFSET, count + len(pending))
+
+    def _writable_locked(self, dim: Optional[int]) -> Optional[_Mapping]:
+        """Writable mapping of the current file, (re)building it for a new model or dtype"""
+        exists = os.path.exists(self.path)
+        if self._writer is not None and (not exists or self._writer.inode != os.stat(self.path).st_ino):
+            self._writer = None
+        if self._writer is None and exists:
+            self._writer = _Mapping(self.path, writable=True)
+        writer = self._writer
+        if writer is not None and (writer.model, writer.dtype, writer.dim) == (self.model, self.dtype, dim or writer.dim):
+            return writer
+        if dim is None:
+            return None
+        logger.info(f"Creating shared embedding matrix {self.path} ({self.model}, {self.dtype.name}, dim {dim})")
+        _create_file(self.path, self.model, self.dtype, dim, self.initial_rows)
+        if writer is not None:
+            self._mark_superseded(writer)
+        self._writer = _Mapping(self.path, writable=True)
+        return self._writer
+
+    def _compact_locked(self, writer: _Mapping, live: Dict[int, int], incoming: int) -> _Mapping:
+        """Copy the live rows into a larger file and swap it in"""
+        ids = np.fromiter(live.keys(), dtype=np.int64, count=len(live))
+        rows = np.fromiter(live.values(), dtype=np.int64, count=len(live))
+        capacity = max(self.initial_rows, 2 * (len(live) + incoming))
+        _create_file(self.path, self.model, self.dtype, writer.dim, capacity, ids, writer.data[rows])
+        self._mark_superseded(writer)
+        logger.info(f"Compacted shared embedding matrix to {len(live)} rows, capacity {capacity}")
+        self._writer = _Mapping(self.path, writable=True)
+        return self._writer
+
+    @staticmethod
+    def _mark_superseded(mapping: _Mapping) -> None:
+        # Only after the replacement is in place, so readers that remap find it
+        struct.pack_into("<Q", mapping.mm, SUPERSEDED_OFFSET, 1)
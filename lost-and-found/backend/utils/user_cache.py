@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Columns needed to identify a user; avoids loading full rows and relationships. is_admin is
+# left out: invalidation only reaches this process, so a revoked admin would stay cached elsewhere
+IDENTITY_COLUMNS = (User.id, User.firebase_uid, User.username, User.email)
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    id: int
+    firebase_uid: Optional[str]
+    username: Optional[str]
+    email: Optional[str]
+
+
+class UserIdentityCache:
+    """
+    LRU cache of user identities with a TTL, addressable by id, Firebase UID
+    or email. Only hits are cached so newly created users are found at once.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_uid: Dict[str, int] = {}
+        self._by_email: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[UserIdentity]:
+        with self._lock:
+            return self._get_locked(user_id)
+
+    def get_by_firebase_uid(self, firebase_uid: str) -> Optional[UserIdentity]:
+        with self._lock:
+            user_id = self._by_uid.get(firebase_uid)
+            if user_id is None:
+                self.misses += 1
+                return None
+            return self._get_locked(user_id)
+
+    def get_by_email(self, email: str) -> Optional[UserIdentity]:
+        with self._lock:
+            user_id = self._by_email.get(email)
+            if user_id is None:
+                self.misses += 1
+                return None
+            return self._get_locked(user_id)
+
+    def put(self, identity: UserIdentity) -> None:
+        with self._lock:
+            self._remove_locked(identity.id)
+            self._entries[identity.id] = (identity, time.monotonic() + self.ttl)
+            if identity.firebase_uid:
+                self._by_uid[identity.firebase_uid] = identity.id
+            if identity.email:
+                self._by_email[identity.email] = identity.id
+            while len(self._entries) > self.max_size:
+                oldest_id = next(iter(self._entries))
+                self._remove_locked(oldest_id)
+
+    def invalidate(self, user_id: int = None, firebase_uid: str = None, email: str = None) -> None:
+        with self._lock:
+            if user_id is None and firebase_uid is not None:
+                user_id = self._by_uid.get(firebase_uid)
+            if user_id is None and email is not None:
+                user_id = self._by_email.get(email)
+            if user_id is not None:
+                self._remove_locked(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_uid.clear()
+            self._by_email.clear()
+
+    def _get_locked(self, user_id: int) -> Optional[UserIdentity]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        identity, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove_locked(user_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return identity
+
+    def _remove_locked(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        identity = entry[0]
+        if identity.firebase_uid and self._by_uid.get(identity.firebase_uid) == user_id:
+            del self._by_uid[identity.firebase_uid]
+        if identity.email and self._by_email.get(identity.email) == user_id:
+            del self._by_email[identity.email]
+
+
+user_cache = UserIdentityCache()
+
+
+def identity_from_row(row) -> UserIdentity:
+    """Build an identity from a User instance or an IDENTITY_COLUMNS row"""
+    return UserIdentity(
+        id=row.id,
+        firebase_uid=row.firebase_uid,
+        username=row.username,
+        email=row.email
+    )
+
+
+def get_user_identity(db: Session, user_id: int) -> Optional[UserIdentity]:
+    """Look up a user by primary key, from cache when possible"""
+    identity = user_cache.get(user_id)
+    if identity is None:
+        row = db.query(*IDENTITY_COLUMNS).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        identity = identity_from_row(row)
+        user_cache.put(identity)
+    return identity
+
+
+def get_user_identity_by_firebase_uid(db: Session, firebase_uid: str) -> Optional[UserIdentity]:
+    """Look up a user by Firebase UID, from cache when possible"""
+    identity = user_cache.get_by_firebase_uid(firebase_uid)
+    if identity is None:
+        row = db.query(*IDENTITY_COLUMNS).filter(User.firebase_uid == firebase_uid).first()
+        if row is None:
+            return None
+        identity = identity_from_row(row)
+        user_cache.put(identity)
+    return identity
+
+
+def get_user_identity_by_email(db: Session, email: str) -> Optional[UserIdentity]:
+    """Look up a user by email, from cache when possible"""
+    identity = user_cache.get_by_email(email)
+    if identity is None:
+        row = db.query(*IDENTITY_COLUMNS).filter(User.email == email).first()
+        if row is None:
+            return None
+        identity = identity_from_row(row)
+        user_cache.put(identity)
+    return identity
+
+
+def get_user_identities(db: Session, user_ids: Iterable[int]) -> Dict[int, UserIdentity]:
+    """Look up several users at once; cache misses are fetched in a single query"""
+    found = {}
+    missing = []
+    for user_id in set(user_ids):
+        identity = user_cache.get(user_id)
+        if identity is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = identity
+
+    if missing:
+        for row in db.query(*IDENTITY_COLUMNS).filter(User.id.in_(missing)).all():
+            identity = identity_from_row(row)
+            user_cache.put(identity)
+            found[identity.id] = identity
+    return found
+
+
+async def aget_user_identity(db: AsyncSession, user_id: int) -> Optional[UserIdentity]:
+    """Async version of get_user_identity"""
+    identity = user_cache.get(user_id)
+    if identity is None:
+        return await _aload_one(db, User.id == user_id)
+    return identity
+
+
+async def aget_user_identity_by_firebase_uid(db: AsyncSession, firebase_uid: str) -> Optional[UserIdentity]:
+    """Async version of get_user_identity_by_firebase_uid"""
+    identity = user_cache.get_by_firebase_uid(firebase_uid)
+    if identity is None:
+        return await _aload_one(db, User.firebase_uid == firebase_uid)
+    return identity
+
+
+async def aget_user_identity_by_email(db: AsyncSession, email: str) -> Optional[UserIdentity]:
+    """Async version of get_user_identity_by_email"""
+    identity = user_cache.get_by_email(email)
+    if identity is None:
+        return await _aload_one(db, User.email == email)
+    return identity
+
+
+async def aget_user_identities(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, UserIdentity]:
+    """Async version of get_user_identities"""
+    found = {}
+    missing = []
+    for user_id in set(user_ids):
+        identity = user_cache.get(user_id)
+        if identity is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = identity
+
+    if missing:
+        result = await db.execute(select(*IDENTITY_COLUMNS).where(User.id.in_(missing)))
+        for row in result.all():
+            identity = identity_from_row(row)
+            user_cache.put(identity)
+            found[identity.id] = identity
+    return found
+
+
+async def _aload_one(db: AsyncSession, condition) -> Optional[UserIdentity]:
+    result = await db.execute(select(*IDENTITY_COLUMNS).where(condition).limit(1))
+    row = result.first()
+    if row is None:
+        return None
+    identity = identity_from_row(row)
+    user_cache.put(identity)
+    return identity
+
+
+def invalidate_user(user) -> None:
+    """Drop a user from the cache after a profile change or delete"""
+    user_cache.invalidate(user_id=user.id)
+    if user.firebase_uid:
+        user_cache.invalidate(firebase_uid=user.firebase_uid)
+    if user.email:
+        user_cache.invalidate(email=user.email)
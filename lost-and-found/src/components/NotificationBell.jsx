@@ -4,12 +4,15 @@ import { FaBell } from 'react-icons/fa';
 import { useNavigate } from 'react-router-dom';
 import '../assets/notification.css';
 import api from '../utils/apiConfig'; 
+import { connectRealtime } from '../utils/realtime';
+import { playNotificationSound } from '../utils/soundEffects';
 
 const NotificationBell = () => {
   const [notifications, setNotifications] = useState([]);
   const [showNotifications, setShowNotifications] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
-  const { currentUser } = useAuth();
+  const { currentUser, dbUser } = useAuth();
+  const [realtimeConnected, setRealtimeConnected] = useState(false);
   const dropdownRef = useRef(null);
   const navigate = useNavigate();
 
@@ -20,12 +23,16 @@ const NotificationBell = () => {
     }
     
     try {
-      const response = await api.get(`/api/notifications/user/${currentUser.uid}`);
+      // The dropdown only shows the latest few; the badge reads the stored counter
+      const [response, countResponse] = await Promise.all([
+        api.get(`/api/notifications/user/${currentUser.uid}`, { params: { limit: 5 } }),
+        api.get(`/api/notifications/user/${currentUser.uid}/unread-count`)
+      ]);
       const data = response.data;
       
       if (Array.isArray(data)) {
         setNotifications(data);
-        setUnreadCount(data.filter(n => !n.is_read).length);
+        setUnreadCount(countResponse.data.unread_count || 0);
       } else {
         console.error('Expected array of notifications but got:', data);
         setNotifications([]);
@@ -41,13 +48,34 @@ const NotificationBell = () => {
   useEffect(() => {
     if (currentUser?.uid) {
       fetchNotifications();
+      // Poll only while the push channel is down
+      if (realtimeConnected) return;
       const interval = setInterval(fetchNotifications, 30000);
       return () => clearInterval(interval);
     } else {
       setNotifications([]);
       setUnreadCount(0);
     }
-  }, [currentUser?.uid]);
+  }, [currentUser?.uid, realtimeConnected]);
+
+  useEffect(() => {
+    if (!dbUser?.id) return;
+
+    const connection = connectRealtime(dbUser.id, (event) => {
+      if (event.type === 'notification.new' || event.type === 'notification.broadcast') {
+        if (event.data.id == null) {
+          // Batched inserts don't report row ids; reload to get them
+          fetchNotifications();
+        } else {
+          setNotifications(prev => [event.data, ...prev.filter(n => n.id !== event.data.id)]);
+          setUnreadCount(prev => prev + 1);
+        }
+        playNotificationSound();
+      }
+    }, setRealtimeConnected);
+
+    return () => connection.close();
+  }, [dbUser?.id]);
 
   useEffect(() => {
     const handleClickOutside = (event) => {
@@ -14,7 +14,8 @@ const Home = () => {
 
             try {
                 // Check if user already has a welcome notification
-                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/notifications/${currentUser.uid}/welcome-exists`);
+                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/notifications/welcome/${currentUser.uid}`);
+                if (!response.ok) return;
                 const { exists } = await response.json();
 
                 if (!exists) {
@@ -3,6 +3,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../contexts/AuthContext';
 import { formatMessageTime } from '../utils/dateUtils';
 import { playMessageSound, playNotificationSound } from '../utils/soundEffects';
+import { connectRealtime } from '../utils/realtime';
 import '../assets/messages.css';
 import Navbar from '../components/Navbar';
 
@@ -26,11 +27,18 @@ const MessageIcon = () => (
 );
 
 const EMOJI_LIST = ["👋", "😊", "👍", "❤️", "🙌", "🎉", "😂", "🤔", "👀", "✨"];
+const TYPING_DISPLAY_MS = 4000;
+const TYPING_SEND_INTERVAL_MS = 2000;
 
 function Messages() {
   const [conversations, setConversations] = useState([]);
   const [selectedChat, setSelectedChat] = useState(null);
   const [messages, setMessages] = useState([]);
+  // Pages before the latest one, loaded on demand through the X-Next-Cursor header
+  const [olderMessages, setOlderMessages] = useState([]);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  const olderLoadedRef = useRef(false);
   const [newMessage, setNewMessage] = useState("");
   const [showEmojis, setShowEmojis] = useState(false);
   const [isMobileListVisible, setIsMobileListVisible] = useState(true);
@@ -39,6 +47,57 @@ function Messages() {
   const [error, setError] = useState(null);
   const messagesEndRef = useRef(null);
   const emojiButtonRef = useRef(null);
+  const realtimeRef = useRef(null);
+  const selectedChatRef = useRef(null);
+  const lastTypingSentRef = useRef(0);
+  const [realtimeConnected, setRealtimeConnected] = useState(false);
+  const [conversationsVersion, setConversationsVersion] = useState(0);
+  const [messagesVersion, setMessagesVersion] = useState(0);
+  const [typingFrom, setTypingFrom] = useState(null);
+
+  useEffect(() => {
+    selectedChatRef.current = selectedChat;
+    setTypingFrom(null);
+    setOlderMessages([]);
+    setOlderCursor(null);
+    olderLoadedRef.current = false;
+  }, [selectedChat]);
+
+  // Push channel: refresh only what an event touches instead of polling
+  useEffect(() => {
+    if (!currentUser?.id) return;
+
+    let typingTimer = null;
+    const connection = connectRealtime(currentUser.id, (event) => {
+      const chat = selectedChatRef.current;
+      if (event.type === 'message.new') {
+        const msg = event.data;
+        setConversationsVersion(v => v + 1);
+        const otherId = msg.sender_id === currentUser.id ? msg.receiver_id : msg.sender_id;
+        if (chat && otherId === chat.userId) {
+          setMessagesVersion(v => v + 1);
+        }
+        if (msg.sender_id !== currentUser.id) {
+          playMessageSound();
+        }
+      } else if (event.type === 'message.read') {
+        setConversationsVersion(v => v + 1);
+      } else if (event.type === 'typing') {
+        if (chat && event.data.from === chat.userId) {
+          setTypingFrom(event.data.from);
+          clearTimeout(typingTimer);
+          typingTimer = setTimeout(() => setTypingFrom(null), TYPING_DISPLAY_MS);
+        }
+      }
+    }, setRealtimeConnected);
+    realtimeRef.current = connection;
+
+    return () => {
+      clearTimeout(typingTimer);
+      connection.close();
+      realtimeRef.current = null;
+    };
+  }, [currentUser]);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "auto" });
@@ -60,9 +119,11 @@ function Messages() {
     };
 
     fetchConversations();
+    // Fall back to polling only while the push channel is down
+    if (realtimeConnected) return;
     const interval = setInterval(fetchConversations, 5000);
     return () => clearInterval(interval);
-  }, [currentUser]);
+  }, [currentUser, realtimeConnected, conversationsVersion]);
 
   useEffect(() => {
     if (!currentUser?.id || !selectedChat?.userId) return;
@@ -72,6 +133,10 @@ function Messages() {
         const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/messages/chat/${currentUser.id}/${selectedChat.userId}`);
         const data = await response.json();
         setMessages(data);
+        // Once older pages are loaded, paging continues from the oldest of them
+        if (!olderLoadedRef.current) {
+          setOlderCursor(response.headers.get('X-Next-Cursor'));
+        }
 
         await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/messages/mark-read`, {
           method: "POST",
@@ -85,9 +150,39 @@ function Messages() {
     };
 
     fetchMessages();
+    if (realtimeConnected) return;
     const interval = setInterval(fetchMessages, 3000);
     return () => clearInterval(interval);
-  }, [currentUser, selectedChat]);
+  }, [currentUser, selectedChat, realtimeConnected, messagesVersion]);
+
+  const loadOlderMessages = async () => {
+    if (!olderCursor || loadingOlder || !selectedChat) return;
+    setLoadingOlder(true);
+    try {
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/messages/chat/${currentUser.id}/${selectedChat.userId}?before=${encodeURIComponent(olderCursor)}`);
+      if (!response.ok) throw new Error('Failed to load older messages');
+      const data = await response.json();
+      olderLoadedRef.current = true;
+      setOlderMessages(prev => [...data, ...prev]);
+      setOlderCursor(response.headers.get('X-Next-Cursor'));
+    } catch {
+      setError('Failed to load older messages');
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  const latestIds = new Set(messages.map(msg => msg._id));
+  const chatMessages = [...olderMessages.filter(msg => !latestIds.has(msg._id)), ...messages];
+
+  const handleInputChange = (e) => {
+    setNewMessage(e.target.value);
+    const now = Date.now();
+    if (selectedChat && realtimeRef.current && now - lastTypingSentRef.current > TYPING_SEND_INTERVAL_MS) {
+      lastTypingSentRef.current = now;
+      realtimeRef.current.sendTyping(selectedChat.userId);
+    }
+  };
 
   const handleChatSelect = (conv) => {
     setSelectedChat(conv);
@@ -129,6 +224,8 @@ function Messages() {
     setSelectedChat(null);
     setIsMobileListVisible(true);
     setMessages([]);
+    setOlderMessages([]);
+    setOlderCursor(null);
     setNewMessage('');
     setShowEmojis(false);
   };
@@ -170,12 +267,18 @@ function Messages() {
                 <div className="chat-header-center">
                   <div className="chat-avatar">{selectedChat.username.charAt(0).toUpperCase()}</div>
                   <div className="chat-username">{selectedChat.username}</div>
+                  {typingFrom === selectedChat.userId && <div className="chat-typing">typing…</div>}
                 </div>
                 <button className="close-chat-button" onClick={handleCloseChat}>✕</button>
               </div>
               <div className="chat-messages">
                 <div className="messages-scroll-container">
-                  {messages.map(msg => (
+                  {olderCursor && (
+                    <button className="load-older-button" onClick={loadOlderMessages} disabled={loadingOlder}>
+                      {loadingOlder ? 'Loading…' : 'Load older messages'}
+                    </button>
+                  )}
+                  {chatMessages.map(msg => (
                     <div key={msg._id} className={`message ${msg.sender_id === currentUser.id ? 'sent' : 'received'}`}>
                       <div className="message-content">
                         <div className="message-bubble">{msg.content}</div>
@@ -198,7 +301,7 @@ function Messages() {
                   className="message-input"
                   type="text"
                   value={newMessage}
-                  onChange={(e) => setNewMessage(e.target.value)}
+                  onChange={handleInputChange}
                   placeholder="Type a message..."
                   onKeyPress={(e) => handleSendMessage(e)}
                 />
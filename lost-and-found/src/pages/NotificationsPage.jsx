@@ -7,6 +7,8 @@ import { getNotifications } from '../utils/api';
 
 const NotificationsPage = () => {
   const [notifications, setNotifications] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { currentUser } = useAuth();
 
   const fetchNotifications = async () => {
@@ -14,11 +16,28 @@ const NotificationsPage = () => {
 
     try {
       // Use the getNotifications function with fallback
-      const notificationsData = await getNotifications(currentUser.uid);
-      setNotifications(notificationsData);
+      const page = await getNotifications(currentUser.uid);
+      setNotifications(page.notifications);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       console.error('Error fetching notifications:', error);
       setNotifications([]);
+      setNextCursor(null);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const page = await getNotifications(currentUser.uid, nextCursor);
+      setNotifications(prev => {
+        const seen = new Set(prev.map(n => n.id));
+        return [...prev, ...page.notifications.filter(n => !seen.has(n.id))];
+      });
+      setNextCursor(page.nextCursor);
+    } finally {
+      setLoadingMore(false);
     }
   };
 
@@ -29,7 +48,8 @@ const NotificationsPage = () => {
   const markAsRead = async (notificationId) => {
     try {
       await api.put(`/api/notifications/${notificationId}/read`);
-      await fetchNotifications();
+      // Update in place so pages loaded with "Load more" stay
+      setNotifications(prev => prev.map(n => (n.id === notificationId ? { ...n, is_read: true } : n)));
     } catch (error) {
       console.error('Error marking notification as read:', error);
     }
@@ -38,7 +58,7 @@ const NotificationsPage = () => {
   const deleteNotification = async (notificationId) => {
     try {
       await api.delete(`/api/notifications/${notificationId}`);
-      await fetchNotifications();
+      setNotifications(prev => prev.filter(n => n.id !== notificationId));
     } catch (error) {
       console.error('Error deleting notification:', error);
     }
@@ -84,6 +104,11 @@ const NotificationsPage = () => {
             </div>
           ))
         )}
+        {nextCursor && (
+          <button className="load-more-notifications" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading…' : 'Load more'}
+          </button>
+        )}
       </div>
     </div>
   );
@@ -169,20 +169,23 @@ export async function getPost(postId) {
 }
 
 // Notification API functions
-export async function getNotifications(userId) {
+// One page, newest first; pass the returned nextCursor as `before` for the next one
+export async function getNotifications(userId, before = null) {
   try {
-    const response = await api.get(`/api/notifications/user/${userId}`);
-    return response.data;
+    const response = await api.get(`/api/notifications/user/${userId}`, {
+      params: before ? { before } : undefined
+    });
+    return { notifications: response.data, nextCursor: response.headers['x-next-cursor'] || null };
   } catch (error) {
     console.error('Error fetching notifications:', error);
     
     // Use mock data as fallback when backend fails
     if (useFallbackWhenBackendFails) {
       console.log('Using mock notifications data as fallback');
-      return mockNotifications;
+      return { notifications: mockNotifications, nextCursor: null };
     }
     
-    return [];
+    return { notifications: [], nextCursor: null };
   }
 }
 
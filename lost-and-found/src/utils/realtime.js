@@ -0,0 +1,93 @@
+// Push channel for new messages, read receipts, typing indicators and notifications.
+// Uses a WebSocket and falls back to Server-Sent Events if the socket can't be opened.
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+const MAX_RETRY_DELAY = 30000;
+
+export const connectRealtime = (userId, onEvent, onStatusChange = () => {}) => {
+  let socket = null;
+  let eventSource = null;
+  let closed = false;
+  let retryDelay = 1000;
+  let retryTimer = null;
+  let socketFailures = 0;
+
+  const handle = (raw) => {
+    try {
+      const event = JSON.parse(raw);
+      if (event.type !== 'ping') onEvent(event);
+    } catch (err) {
+      console.error('Malformed realtime event:', err);
+    }
+  };
+
+  const scheduleReconnect = () => {
+    if (closed) return;
+    onStatusChange(false);
+    retryTimer = setTimeout(open, retryDelay);
+    retryDelay = Math.min(retryDelay * 2, MAX_RETRY_DELAY);
+  };
+
+  const openEventSource = () => {
+    eventSource = new EventSource(`${API_BASE_URL}/api/realtime/events/${userId}`);
+    eventSource.onopen = () => {
+      retryDelay = 1000;
+      onStatusChange(true);
+    };
+    // Named events are dispatched by type; route them all through one handler
+    ['message.new', 'message.read', 'typing', 'notification.new', 'notification.broadcast'].forEach(type => {
+      eventSource.addEventListener(type, (e) => handle(e.data));
+    });
+    eventSource.onerror = () => {
+      eventSource.close();
+      eventSource = null;
+      scheduleReconnect();
+    };
+  };
+
+  const open = () => {
+    if (closed) return;
+    if (socketFailures >= 2 || typeof WebSocket === 'undefined') {
+      openEventSource();
+      return;
+    }
+
+    const wsUrl = `${API_BASE_URL.replace(/^http/, 'ws')}/api/realtime/ws/${userId}`;
+    let opened = false;
+    socket = new WebSocket(wsUrl);
+    socket.onopen = () => {
+      opened = true;
+      socketFailures = 0;
+      retryDelay = 1000;
+      onStatusChange(true);
+    };
+    socket.onmessage = (e) => handle(e.data);
+    socket.onclose = () => {
+      socket = null;
+      if (!opened) socketFailures += 1;
+      scheduleReconnect();
+    };
+  };
+
+  open();
+
+  return {
+    sendTyping: (toUserId) => {
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'typing', to: toUserId }));
+      } else {
+        fetch(`${API_BASE_URL}/api/realtime/typing`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ from: userId, to: toUserId })
+        }).catch(() => {});
+      }
+    },
+    close: () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+      if (eventSource) eventSource.close();
+    }
+  };
+};